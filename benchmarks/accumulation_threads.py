@@ -0,0 +1,128 @@
+#! /usr/env/python
+"""
+accumulation_threads.py: speedup of the threaded drainage area accumulation
+against the number of threads.
+
+Routes flow over a noisy surface sloping to the bottom edge of the grid
+with FlowRouter, builds the accumulation schedule of
+driver_tools/parallel_accumulation.py once, and times
+``AccumulationSchedule.accumulate`` (drainage area and discharge together)
+with every number of threads asked for. Every time is the best of
+``--repeat`` runs. Speedups are relative to the run on one thread, which
+takes the serial path; the efficiency is the speedup divided by the number
+of threads. The thread counts only mean something up to the number of
+cores of the machine.
+
+Examples::
+
+    $ python accumulation_threads.py
+    $ python accumulation_threads.py --shape 2000x2000 --threads 1 2 4 8 16 \\
+          --output accumulation_threads.json
+"""
+from __future__ import print_function
+
+import os
+import sys
+import json
+import time
+import platform
+import multiprocessing
+
+import numpy as np
+
+REPO_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                        os.pardir))
+sys.path.insert(0, REPO_DIR)
+
+from driver_tools.parallel_accumulation import AccumulationSchedule
+
+_timer = getattr(time, 'perf_counter', time.time)
+
+
+def routed_surface(shape, seed=0):
+    """Receivers and stack of a noisy surface sloping to its bottom edge."""
+    from landlab import RasterModelGrid
+    from landlab.components.flow_routing.route_flow_dn import FlowRouter
+
+    np.random.seed(seed)
+    mg = RasterModelGrid(shape[0], shape[1], 10.)
+    z = mg.add_zeros('node', 'topographic__elevation')
+    z[:] = 0.01 * mg.node_y + np.random.rand(mg.number_of_nodes)
+    mg.set_closed_boundaries_at_grid_edges(True, True, True, False)
+    FlowRouter(mg).route_flow()
+    return (np.array(mg.at_node['flow_receiver']),
+            np.array(mg.at_node['upstream_node_order']))
+
+
+def time_threads(schedule, weights, threads, min_chunk, repeat=3):
+    """Best wall time of the accumulation with every number of threads."""
+    times = []
+    for n_threads in threads:
+        best = np.inf
+        for _ in range(repeat):
+            start = _timer()
+            schedule.accumulate(weights, n_threads=n_threads,
+                                min_chunk=min_chunk)
+            best = min(best, _timer() - start)
+        times.append(best)
+    return times
+
+
+def _parse_shape(text):
+    (n_rows, n_cols) = text.lower().split('x')
+    return (int(n_rows), int(n_cols))
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Time the threaded accumulation against the number of '
+        'threads')
+    parser.add_argument('--shape', type=_parse_shape, default=(1000, 1000),
+                        help='Grid shape, as ROWSxCOLS')
+    parser.add_argument('--threads', type=int, nargs='+',
+                        default=[1, 2, 4, 8, 16],
+                        help='Numbers of threads to time')
+    parser.add_argument('--min-chunk', type=int, default=8192,
+                        help='Smallest number of additions per thread')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Runs of every case; the best is kept')
+    parser.add_argument('--output', help='File to write the results to, '
+                        'as JSON')
+
+    args = parser.parse_args()
+
+    (receivers, stack) = routed_surface(args.shape)
+    schedule = AccumulationSchedule(receivers, stack)
+    weights = np.ones((len(receivers), 2))
+
+    threads = sorted(set([1] + args.threads))
+    times = time_threads(schedule, weights, threads, args.min_chunk,
+                         repeat=args.repeat)
+
+    print('%dx%d grid, %d batches, %d cores' % (
+        args.shape[0], args.shape[1], schedule.number_of_batches,
+        multiprocessing.cpu_count()))
+    print('%8s %10s %8s %11s' % ('threads', 'wall time', 'speedup',
+                                 'efficiency'))
+    for (n_threads, wall_time) in zip(threads, times):
+        speedup = times[0] / wall_time
+        print('%8d %9.4fs %8.2f %10.0f%%' % (n_threads, wall_time, speedup,
+                                             100. * speedup / n_threads))
+
+    if args.output:
+        results = {'python': platform.python_version(),
+                   'numpy': np.__version__,
+                   'machine': platform.platform(),
+                   'cores': multiprocessing.cpu_count(),
+                   'shape': list(args.shape),
+                   'min_chunk': args.min_chunk,
+                   'threads': threads,
+                   'wall_time': times}
+        with open(args.output, 'w') as fp:
+            json.dump(results, fp, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
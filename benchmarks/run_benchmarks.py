@@ -0,0 +1,290 @@
+#! /usr/env/python
+"""
+run_benchmarks.py: time the driver workloads and check them for regressions.
+
+Runs every scenario of scenarios.py at each of its grid shapes, with no
+plotting, and records for every case
+
+*  the wall time of the run (the best of ``--repeat`` runs, each on a
+   freshly set up model; setting up is not timed),
+*  its throughput, in node updates per second and, for the CellLab-CTS
+   models, transitions per second, and
+*  the peak resident memory of the process that ran it.
+
+Every case runs in a process of its own, so that the peak memory of one
+case is not that of the largest case run before it. For every scenario run
+at more than one grid shape, the results also give the scaling exponent of
+its wall time with the number of nodes, fitted on a log-log plot: 1 for a
+run that scales linearly with the grid.
+
+The results are written as JSON and, if there is a baseline file, compared
+against it. A case has regressed if its throughput has dropped, or its peak
+memory has grown, by more than the tolerance. Save a baseline on the machine
+the benchmarks run on with ``--save-baseline``; baselines from other
+machines are not comparable.
+
+Examples::
+
+    $ python run_benchmarks.py --save-baseline
+    $ python run_benchmarks.py lattice_gas rock_weathering --repeat 3
+    $ python run_benchmarks.py --sizes 100x100 200x200 --output new.json
+"""
+from __future__ import print_function
+
+import os
+import sys
+import json
+import time
+import platform
+import multiprocessing
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Components that plot at import have nothing to draw on
+os.environ.setdefault('MPLBACKEND', 'Agg')
+
+from scenarios import SCENARIOS
+
+_timer = getattr(time, 'perf_counter', time.time)
+
+#: Where the baseline is kept, by default.
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                'baseline.json')
+
+
+def _peak_rss_bytes():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes, except on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _shape_key(shape):
+    return 'native' if shape is None else '%dx%d' % tuple(shape)
+
+
+def run_case(args):
+    """Set up and run one case, *repeat* times.
+
+    Parameters
+    ----------
+    args : tuple
+        Scenario name, grid shape and number of repeats.
+
+    Returns
+    -------
+    dict
+        The measurements of the case.
+    """
+    (name, shape, repeat) = args
+    (setup, _) = SCENARIOS[name]
+    shape = None if shape is None else tuple(shape)
+    np.random.seed(0)
+
+    best = None
+    setup_time = 0.
+    for _ in range(repeat):
+        start = _timer()
+        run = setup(shape)
+        setup_time += _timer() - start
+        start = _timer()
+        work = run()
+        wall_time = _timer() - start
+        if best is None or wall_time < best[0]:
+            best = (wall_time, work)
+
+    (wall_time, work) = best
+    throughput = dict((unit + '_per_s', count / wall_time)
+                      for (unit, count) in work.items())
+    return {'scenario': name,
+            'shape': _shape_key(shape),
+            'work': work,
+            'wall_time': wall_time,
+            'setup_time': setup_time / repeat,
+            'throughput': throughput,
+            'peak_rss_bytes': _peak_rss_bytes()}
+
+
+def scaling_exponents(cases):
+    """Exponent of wall time against grid size, per scenario.
+
+    The size of a case is its number of node updates, which for a given
+    scenario is proportional to its number of nodes.
+
+    Parameters
+    ----------
+    cases : list of dict
+        Results of :func:`run_case`.
+    """
+    by_scenario = {}
+    for case in cases:
+        by_scenario.setdefault(case['scenario'], []).append(
+            (case['work']['node_updates'], case['wall_time']))
+    exponents = {}
+    for (name, points) in by_scenario.items():
+        if len(points) > 1:
+            (size, wall_time) = np.log(np.array(points, dtype=float)).T
+            exponents[name] = float(np.polyfit(size, wall_time, 1)[0])
+    return exponents
+
+
+def compare(results, baseline, tolerance=0.2, memory_tolerance=0.2):
+    """Cases that have regressed against a baseline.
+
+    Parameters
+    ----------
+    results, baseline : dict
+        Benchmark results, as written by :func:`main`.
+    tolerance : float, optional
+        Drop in throughput, as a fraction of the baseline, that counts as a
+        regression.
+    memory_tolerance : float, optional
+        Growth in peak memory, as a fraction of the baseline, that counts as
+        a regression.
+
+    Returns
+    -------
+    list of str
+        A description of every regression.
+    """
+    base_cases = dict(((case['scenario'], case['shape']), case)
+                      for case in baseline['cases'])
+    regressions = []
+    for case in results['cases']:
+        base = base_cases.get((case['scenario'], case['shape']))
+        if base is None:
+            continue
+        label = '%s (%s)' % (case['scenario'], case['shape'])
+        for (unit, rate) in sorted(case['throughput'].items()):
+            base_rate = base['throughput'].get(unit)
+            if base_rate and rate < (1. - tolerance) * base_rate:
+                regressions.append('%s: %s fell from %.4g to %.4g (%+.0f%%)'
+                                   % (label, unit, base_rate, rate,
+                                      100. * (rate / base_rate - 1.)))
+        (peak, base_peak) = (case['peak_rss_bytes'], base['peak_rss_bytes'])
+        if peak and base_peak and peak > (1. + memory_tolerance) * base_peak:
+            regressions.append('%s: peak memory grew from %.1f MB to %.1f MB'
+                               % (label, base_peak / 1e6, peak / 1e6))
+    return regressions
+
+
+def summary(results):
+    """The results as a printable table."""
+    lines = ['%-22s %-10s %10s %16s %16s %10s' % (
+        'scenario', 'shape', 'wall time', 'node updates/s', 'transitions/s',
+        'peak RSS')]
+    for case in results['cases']:
+        throughput = case['throughput']
+        transitions = throughput.get('transitions_per_s')
+        lines.append('%-22s %-10s %9.3fs %16.4g %16s %8.1fMB' % (
+            case['scenario'], case['shape'], case['wall_time'],
+            throughput['node_updates_per_s'],
+            '-' if transitions is None else '%.4g' % transitions,
+            (case['peak_rss_bytes'] or 0) / 1e6))
+    for (name, exponent) in sorted(results['scaling'].items()):
+        lines.append('Scaling of %s: wall time ~ nodes ** %.2f'
+                     % (name, exponent))
+    return '\n'.join(lines)
+
+
+def _parse_shape(text):
+    if text == 'native':
+        return None
+    (n_rows, n_cols) = text.lower().split('x')
+    return (int(n_rows), int(n_cols))
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Benchmark the driver workloads without plotting')
+    parser.add_argument('scenarios', nargs='*',
+                        help='Scenarios to run (default: all of them): %s'
+                        % ', '.join(SCENARIOS))
+    parser.add_argument('--sizes', nargs='+', type=_parse_shape,
+                        help='Grid shapes, as ROWSxCOLS, instead of those of '
+                        'every scenario (scenarios on a DEM always run on '
+                        'it)')
+    parser.add_argument('--repeat', type=int, default=1,
+                        help='Runs of every case; the best is kept')
+    parser.add_argument('--output', default='benchmark_results.json',
+                        help='File to write the results to')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE,
+                        help='Baseline to compare the results with')
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='Save the results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='Fractional drop in throughput (or growth in '
+                        'peak memory) that counts as a regression')
+
+    args = parser.parse_args()
+
+    names = args.scenarios or list(SCENARIOS)
+    unknown = sorted(set(names) - set(SCENARIOS))
+    if unknown:
+        parser.error('unknown scenarios: ' + ', '.join(unknown))
+
+    jobs = []
+    for name in names:
+        (_, sizes) = SCENARIOS[name]
+        if args.sizes and sizes != (None, ):
+            sizes = args.sizes
+        jobs.extend((name, shape, args.repeat) for shape in sizes)
+
+    # A fresh process for every case, run one at a time so that they do not
+    # compete for the processor
+    pool = multiprocessing.Pool(1, maxtasksperchild=1)
+    cases = []
+    try:
+        for case in pool.imap(run_case, jobs):
+            print('%s (%s): %.3f s' % (case['scenario'], case['shape'],
+                                       case['wall_time']))
+            cases.append(case)
+    finally:
+        pool.close()
+        pool.join()
+
+    results = {'python': platform.python_version(),
+               'numpy': np.__version__,
+               'machine': platform.platform(),
+               'cases': cases,
+               'scaling': scaling_exponents(cases)}
+
+    with open(args.output, 'w') as fp:
+        json.dump(results, fp, indent=2, sort_keys=True)
+    print()
+    print(summary(results))
+
+    regressions = []
+    if args.save_baseline:
+        with open(args.baseline, 'w') as fp:
+            json.dump(results, fp, indent=2, sort_keys=True)
+        print('\nSaved the baseline to', args.baseline)
+    elif os.path.isfile(args.baseline):
+        with open(args.baseline, 'r') as fp:
+            baseline = json.load(fp)
+        regressions = compare(results, baseline, tolerance=args.tolerance,
+                              memory_tolerance=args.tolerance)
+        print()
+        if regressions:
+            print('Regressions against', args.baseline)
+            for regression in regressions:
+                print('  ' + regression)
+        else:
+            print('No regressions against', args.baseline)
+    else:
+        print('\nNo baseline at %s to compare with; save one with '
+              '--save-baseline' % args.baseline)
+
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,408 @@
+#! /usr/env/python
+"""
+scenarios.py: the driver workloads, set up for benchmarking.
+
+Every scenario here is one of the drivers of this repository with its
+plotting and output taken out: the same components, set up in the same way
+and run through the same loop, on a grid of a given shape. Scenarios that
+read a DEM (the flow routing gully and the two overland flow basins) only
+run on that DEM. The overland flow basins are run with both landlab's
+OverlandFlow and ActiveDomainOverlandFlow (driver_tools/active_domain_flow.py),
+both in the storm and in the recession tail after it, where the active
+domain solver skips most of the drained grid.
+
+A scenario is a function that takes the grid shape (rows, columns), or None
+for the scenarios on a DEM, and sets the model up. It returns a function
+that runs the model and returns the work it did, as a dict of counts:
+
+*  ``node_updates``, the number of grid nodes (or cells) times the number of
+   model steps, and
+*  ``transitions``, for the CellLab-CTS models, the number of transitions
+   carried out.
+
+Only the run is timed. Components are imported when a scenario is set up,
+so listing the scenarios imports nothing.
+"""
+from __future__ import print_function
+
+import os
+import sys
+from collections import OrderedDict
+
+import numpy as np
+
+
+REPO_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__),
+                                        os.pardir))
+sys.path.insert(0, REPO_DIR)
+
+#: Scenarios by name, as (setup function, default grid shapes).
+SCENARIOS = OrderedDict()
+
+
+def scenario(name, sizes):
+    """Register a scenario set up by the decorated function."""
+    def register(setup):
+        SCENARIOS[name] = (setup, tuple(sizes))
+        return setup
+    return register
+
+
+def _driver_path(*parts):
+    return os.path.join(REPO_DIR, *parts)
+
+
+def _import_from(directory):
+    """Make the modules of a driver directory importable."""
+    directory = _driver_path(*directory.split('/'))
+    if directory not in sys.path:
+        sys.path.insert(0, directory)
+
+
+class _TransitionCounter(object):
+
+    """Stands in for CAPlotter, counting the transitions it is shown."""
+
+    def __init__(self):
+        self.count = 0
+
+    def update_plot(self):
+        self.count += 1
+
+
+def _run_cts(ca, run_duration, interval):
+    counter = _TransitionCounter()
+    current_time = 0.
+    while current_time < run_duration:
+        ca.run(current_time + interval, ca.node_state,
+               plot_each_transition=True, plotter=counter)
+        current_time += interval
+    return counter.count
+
+
+@scenario('scarp_diffusion', sizes=[(25, 40), (100, 160), (400, 640)])
+def scarp_diffusion(shape, n_steps=25, dt=2000.):
+    """scripts/diffusion/scarp_diffusion_with_component.py"""
+    from landlab import RasterModelGrid
+    from landlab.components.diffusion.diffusion import LinearDiffuser
+
+    mg = RasterModelGrid(shape[0], shape[1], 10.0)
+    z = mg.add_zeros('node', 'topographic__elevation')
+    fault_y = 50.0 + 0.25 * mg.node_x
+    upthrown_nodes = np.where(mg.node_y > fault_y)
+    z[upthrown_nodes] += 10.0 + 0.01 * mg.node_x[upthrown_nodes]
+    linear_diffuse = LinearDiffuser(
+        grid=mg, input_stream=_driver_path('scripts', 'diffusion',
+                                           'diffusion_input_file.txt'))
+    mg.set_closed_boundaries_at_grid_edges(False, True, False, True)
+
+    def run():
+        for _ in range(n_steps):
+            linear_diffuse.diffuse(dt)
+        return {'node_updates': mg.number_of_nodes * n_steps}
+
+    return run
+
+
+def _nonlinear_diffusion_grid(shape):
+    from landlab import RasterModelGrid
+
+    mg = RasterModelGrid(shape[0], shape[1], 100.)
+    mg.set_closed_boundaries_at_grid_edges(True, True, True, True)
+    mg.create_node_array_zeros('topographic__elevation')
+    mg.at_node['topographic__elevation'] = (
+        np.random.rand(mg.number_of_nodes) / 1000.)
+    return mg
+
+
+@scenario('perron_diffusion', sizes=[(25, 25), (50, 50), (100, 100)])
+def perron_diffusion(shape, n_steps=10, dt=1., uplift=30.):
+    """component_drivers/nonlinear_diffusion/drive_perron.py"""
+    from landlab.components.nonlinear_diffusion.Perron_nl_diffuse import (
+        PerronNLDiffuse)
+
+    mg = _nonlinear_diffusion_grid(shape)
+    diffusion_component = PerronNLDiffuse(
+        mg, _driver_path('component_drivers', 'nonlinear_diffusion',
+                         'drive_perron_params.txt'))
+    uplifted = mg.active_nodes[:mg.active_nodes.shape[0] // 2]
+
+    def run():
+        elapsed_time = 0.
+        for _ in range(n_steps):
+            diffusion_component.input_timestep(dt)
+            mg.at_node['topographic__elevation'][uplifted] += uplift * dt
+            diffusion_component.diffuse(mg, elapsed_time)
+            elapsed_time += dt
+        return {'node_updates': mg.number_of_nodes * n_steps}
+
+    return run
+
+
+@scenario('explicit_nl_diffusion', sizes=[(50, 50), (100, 100), (200, 200)])
+def explicit_nl_diffusion(shape, n_steps=30, dt=1., uplift=30.):
+    """component_drivers/nonlinear_diffusion/drive_explicit_nl.py"""
+    from landlab.components.nonlinear_diffusion.explicit_nl_diffuse import (
+        NonlinearDiffuser)
+
+    mg = _nonlinear_diffusion_grid(shape)
+    diffusion_component = NonlinearDiffuser(
+        mg, _driver_path('component_drivers', 'nonlinear_diffusion',
+                         'drive_perron_params.txt'))
+    uplifted = mg.active_nodes[:mg.active_nodes.shape[0] // 2]
+
+    def run():
+        for _ in range(n_steps):
+            mg.at_node['topographic__elevation'][uplifted] += uplift * dt
+            diffusion_component.diffuse(dt)
+        return {'node_updates': mg.number_of_nodes * n_steps}
+
+    return run
+
+
+def _route_flow_repeatedly(grid, n_routings):
+    from landlab.components.flow_routing.route_flow_dn import FlowRouter
+
+    flow_router = FlowRouter(grid)
+
+    def run():
+        for _ in range(n_routings):
+            flow_router.route_flow()
+        return {'node_updates': grid.number_of_nodes * n_routings}
+
+    return run
+
+
+@scenario('flow_routing', sizes=[(100, 100), (200, 200), (400, 400)])
+def flow_routing(shape, n_routings=5):
+    """FlowRouter on a rough plane sloping to its bottom edge."""
+    from landlab import RasterModelGrid
+
+    mg = RasterModelGrid(shape[0], shape[1], 10.)
+    z = mg.add_zeros('node', 'topographic__elevation')
+    z[:] = 0.01 * mg.node_y + np.random.rand(mg.number_of_nodes)
+    mg.set_closed_boundaries_at_grid_edges(True, True, True, False)
+    return _route_flow_repeatedly(mg, n_routings)
+
+
+def _close_nodata_nodes(grid, z, nodata_value):
+    grid.set_nodata_nodes_to_closed(z, nodata_value)
+
+
+@scenario('flow_routing_gully', sizes=[None])
+def flow_routing_gully(shape, n_routings=5):
+    """component_drivers/flow_routing/test_script_for_route_flow_dn.py"""
+    from driver_tools.dem_cache import load_preprocessed_dem
+
+    (grid, z) = load_preprocessed_dem(
+        _driver_path('component_drivers', 'flow_routing',
+                     'west_bijou_gully.asc'),
+        _close_nodata_nodes, nodata_value=0.)
+    return _route_flow_repeatedly(grid, n_routings)
+
+
+#: Rainfall intensity (m/s) and duration (s) of the overland flow drivers'
+#: storm.
+STORM_INTENSITY = 4.07222 * (10 ** -7)
+STORM_DURATION = 7200.
+
+#: DEM of each overland flow test basin.
+_BASINS = {'square': 'Square_TestBasin_Outlet100.asc',
+           'long': 'Long_TestBasin_Outlet50.asc'}
+
+
+def _overland_flow(basin, solver, n_steps, recession_start=None):
+    """Set up one of the overland flow drivers' basins.
+
+    The timed run is *n_steps* steps of *solver* ('overland_flow' for
+    landlab's OverlandFlow, 'active_domain' for ActiveDomainOverlandFlow).
+    Without a *recession_start* the steps are taken in the storm. With one,
+    the storm and the start of its recession, up to *recession_start*
+    seconds of model time, are run untimed, and the timed steps are taken
+    in the recession tail that follows.
+    """
+    from landlab.components.overland_flow.generate_overland_flow_deAlmeida \
+        import OverlandFlow
+    from driver_tools.active_domain_flow import ActiveDomainOverlandFlow
+    from driver_tools.dem_cache import load_preprocessed_dem
+    from driver_tools.basins import (set_up_basin, LONG_BASIN_OUTLET,
+                                     SQUARE_BASIN_OUTLET)
+
+    outlet = {'square': SQUARE_BASIN_OUTLET, 'long': LONG_BASIN_OUTLET}[basin]
+    (rmg, z) = load_preprocessed_dem(
+        _driver_path('component_drivers', 'overland_flow', _BASINS[basin]),
+        set_up_basin, outlets=[outlet])
+    if solver == 'active_domain':
+        of = ActiveDomainOverlandFlow(rmg, wet_depth=0.0001)
+    else:
+        of = OverlandFlow(rmg, use_fixed_links=True)
+    of.rainfall_intensity = STORM_INTENSITY
+
+    if recession_start is not None:
+        elapsed_time = 1.
+        while elapsed_time < recession_start:
+            if elapsed_time >= STORM_DURATION:
+                of.rainfall_intensity = 0.
+            of.overland_flow()
+            elapsed_time += of.dt
+        of.rainfall_intensity = 0.
+
+    def run():
+        for _ in range(n_steps):
+            of.overland_flow()
+        return {'node_updates': rmg.number_of_nodes * n_steps}
+
+    return run
+
+
+@scenario('overland_flow_square', sizes=[None])
+def overland_flow_square(shape, n_steps=500):
+    """component_drivers/overland_flow/deAlmeida_SquareBasin.py, in the
+    storm."""
+    return _overland_flow('square', 'overland_flow', n_steps)
+
+
+@scenario('overland_flow_square_active', sizes=[None])
+def overland_flow_square_active(shape, n_steps=500):
+    """overland_flow_square, with ActiveDomainOverlandFlow."""
+    return _overland_flow('square', 'active_domain', n_steps)
+
+
+@scenario('overland_flow_square_recession', sizes=[None])
+def overland_flow_square_recession(shape, n_steps=500,
+                                   recession_start=3. * STORM_DURATION):
+    """component_drivers/overland_flow/deAlmeida_SquareBasin.py, in the
+    recession tail after the storm."""
+    return _overland_flow('square', 'overland_flow', n_steps,
+                          recession_start=recession_start)
+
+
+@scenario('overland_flow_square_recession_active', sizes=[None])
+def overland_flow_square_recession_active(
+        shape, n_steps=500, recession_start=3. * STORM_DURATION):
+    """overland_flow_square_recession, with ActiveDomainOverlandFlow."""
+    return _overland_flow('square', 'active_domain', n_steps,
+                          recession_start=recession_start)
+
+
+@scenario('overland_flow_long', sizes=[None])
+def overland_flow_long(shape, n_steps=500):
+    """component_drivers/overland_flow/deAlmeida_LongBasin.py, in the
+    storm."""
+    return _overland_flow('long', 'overland_flow', n_steps)
+
+
+@scenario('overland_flow_long_active', sizes=[None])
+def overland_flow_long_active(shape, n_steps=500):
+    """overland_flow_long, with ActiveDomainOverlandFlow."""
+    return _overland_flow('long', 'active_domain', n_steps)
+
+
+@scenario('overland_flow_long_recession', sizes=[None])
+def overland_flow_long_recession(shape, n_steps=500,
+                                 recession_start=3. * STORM_DURATION):
+    """component_drivers/overland_flow/deAlmeida_LongBasin.py, in the
+    recession tail after the storm."""
+    return _overland_flow('long', 'overland_flow', n_steps,
+                          recession_start=recession_start)
+
+
+@scenario('overland_flow_long_recession_active', sizes=[None])
+def overland_flow_long_recession_active(
+        shape, n_steps=500, recession_start=3. * STORM_DURATION):
+    """overland_flow_long_recession, with ActiveDomainOverlandFlow."""
+    return _overland_flow('long', 'active_domain', n_steps,
+                          recession_start=recession_start)
+
+
+@scenario('lattice_gas', sizes=[(41, 61), (81, 121), (161, 241)])
+def lattice_gas(shape, run_duration=10., p_init=0.1):
+    """component_drivers/cellular_automata/cts_lattice_gas.py"""
+    from landlab import HexModelGrid
+    from landlab.components.cellular_automata.oriented_hex_cts import (
+        OrientedHexCTS)
+    _import_from('component_drivers/cellular_automata')
+    from cts_lattice_gas import setup_transition_list
+
+    hmg = HexModelGrid(shape[0], shape[1], 1.0, orientation='vertical',
+                       reorient_links=True)
+    ns_dict = dict((state, str(state)) for state in range(9))
+    node_state_grid = hmg.add_zeros('node', 'node_state_grid', dtype=int)
+    node_state_grid[hmg.boundary_nodes] = 8
+    core_nodes = hmg.core_nodes
+    occupied = core_nodes[np.random.rand(len(core_nodes)) < p_init]
+    node_state_grid[occupied] = np.random.randint(1, 8, len(occupied))
+    ca = OrientedHexCTS(hmg, ns_dict, setup_transition_list(),
+                        node_state_grid)
+
+    def run():
+        transitions = _run_cts(ca, run_duration, 1.)
+        return {'transitions': transitions,
+                'node_updates': hmg.number_of_nodes * int(run_duration)}
+
+    return run
+
+
+@scenario('rock_weathering', sizes=[(50, 50), (100, 100), (200, 200)])
+def rock_weathering(shape, run_duration=1., frac_spacing=10):
+    """component_drivers/cellular_automata/rock_weathering.py"""
+    from landlab import RasterModelGrid
+    from landlab.components.cellular_automata.raster_cts import RasterCTS
+    from landlab.components.fracture_grid.fracture_grid import make_frac_grid
+    _import_from('component_drivers/cellular_automata')
+    from rock_weathering import setup_transition_list
+
+    mg = RasterModelGrid(shape[0], shape[1], 1.0)
+    mg.set_closed_boundaries_at_grid_edges(True, True, True, True)
+    node_state_grid = mg.add_zeros('node', 'node_state_map', dtype=np.uint8)
+    node_state_grid[:] = make_frac_grid(frac_spacing, model_grid=mg)
+    ca = RasterCTS(mg, {0: 'rock', 1: 'saprolite'}, setup_transition_list(),
+                   node_state_grid)
+
+    def run():
+        transitions = _run_cts(ca, run_duration, 0.05)
+        return {'transitions': transitions,
+                'node_updates': mg.number_of_nodes * int(run_duration / 0.05)}
+
+    return run
+
+
+@scenario('flexure_point_load', sizes=[(50, 50), (100, 100), (200, 200)])
+def flexure_point_load(shape, n_updates=3):
+    """scripts/flexure/example_point_load.py"""
+    from landlab import RasterModelGrid
+    from landlab.components.flexure import FlexureComponent
+
+    grid = RasterModelGrid(shape[0], shape[1], 10e3)
+    flex = FlexureComponent(grid, method='flexure')
+    load = grid.field_values('node', 'lithosphere__overlying_pressure').view()
+    load.shape = grid.shape
+    load[shape[0] // 2, shape[1] // 2] = 1e9
+
+    def run():
+        for _ in range(n_updates):
+            flex.update()
+        return {'node_updates': grid.number_of_nodes * n_updates}
+
+    return run
+
+
+@scenario('ecohydrology_ca', sizes=[(50, 50), (100, 100), (200, 200)])
+def ecohydrology_ca(shape, n_years=20, seed=0):
+    """scripts/ecohydrology_flat_surface/run_driver.py, without the maps."""
+    from landlab import RasterModelGrid, load_params
+    _import_from('scripts/ecohydrology_flat_surface')
+    from ecohyd_functions_flat import create_records, run_simulation
+
+    grid1 = RasterModelGrid(shape, spacing=(5., 5.))
+    grid = RasterModelGrid((5, 4), spacing=(5., 5.))
+    data = load_params(_driver_path('scripts', 'ecohydrology_flat_surface',
+                                    'inputs_vegetation_ca.yaml'))
+    (storms, _) = create_records('veg', grid1)
+
+    def run():
+        yrs = run_simulation(data, grid, grid1, n_years, storms, None,
+                             seed=seed, verbose=False)
+        return {'node_updates': grid1.number_of_cells * yrs}
+
+    return run
@@ -12,10 +12,20 @@ _DEBUG = False
 import time
 import random
 from numpy import zeros, bincount, arange
-from pylab import subplots, plot, show, xlabel, ylabel, title, axis
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir, os.pardir))
+from driver_tools.run_config import RunConfig
+
+# Read the run configuration (headless or not, see driver_tools/run_config.py)
+# before importing landlab
+config = RunConfig.from_environment()
+
 from landlab import HexModelGrid
-from landlab.components.cellular_automata.celllab_cts import Transition, CAPlotter
-from landlab.components.cellular_automata.oriented_hex_cts import OrientedHexCTS
+from landlab.components.cellular_automata.celllab_cts import Transition
+from driver_tools.components import components
 
 
 def setup_transition_list():
@@ -125,6 +135,10 @@ def setup_transition_list():
     
 def main():
     
+    # Time the run per component; set LANDLAB_DRIVERS_PROFILE to a file name
+    # to save the breakdown as JSON
+    profiler = config.profiler()
+
     # INITIALIZE
     
     # User-defined parameters
@@ -174,10 +188,14 @@ def main():
             node_state_grid[i] = random.randint(1, 7)
     
     # Create the CA model
-    ca = OrientedHexCTS(hmg, ns_dict, xn_list, node_state_grid)
+    ca = components.create('OrientedHexCTS', hmg, ns_dict, xn_list,
+                           node_state_grid)
     
-    # Create a CAPlotter object for handling screen display
-    ca_plotter = CAPlotter(ca)
+    # Create a CAPlotter object for handling screen display (or, headless, a
+    # stand-in that saves the final node states)
+    ca_plotter = config.ca_plotter(ca, 'cts_lattice_gas')
+    profiler.wrap(ca, 'run')
+    profiler.wrap(ca_plotter, 'update_plot')
     
     # Plot the initial grid
     ca_plotter.update_plot()
@@ -212,12 +230,19 @@ def main():
     # FINALIZE
 
     # Plot
+    print(profiler.finish(components.import_times()))
     ca_plotter.finalize()
     
     # Display the numbers of each state
+    times = arange(plot_interval, run_duration+plot_interval, plot_interval)
+    if config.headless:
+        config.dump('cts_lattice_gas_nstates', time=times, nstates=nstates)
+        return
+
+    from pylab import subplots, plot, show, xlabel, ylabel, title, axis
     fig, ax = subplots()
     for i in range(1, 8):
-        plot(arange(plot_interval, run_duration+plot_interval, plot_interval), nstates[i,:], label=ns_dict[i])
+        plot(times, nstates[i,:], label=ns_dict[i])
     ax.legend()
     xlabel('Time')
     ylabel('Number of particles in state')
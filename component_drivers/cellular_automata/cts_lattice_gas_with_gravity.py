@@ -12,9 +12,20 @@ _DEBUG = False
 
 import time
 import random
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir, os.pardir))
+from driver_tools.run_config import RunConfig
+
+# Read the run configuration (headless or not, see driver_tools/run_config.py)
+# before importing landlab
+config = RunConfig.from_environment()
+
 from landlab import HexModelGrid
-from landlab.components.cellular_automata.celllab_cts import Transition, CAPlotter
-from landlab.components.cellular_automata.oriented_hex_cts import OrientedHexCTS
+from landlab.components.cellular_automata.celllab_cts import Transition
+from driver_tools.components import components
 
 
 def setup_transition_list(g=1.0):
@@ -193,6 +204,10 @@ def setup_transition_list(g=1.0):
     
 def main():
     
+    # Time the run per component; set LANDLAB_DRIVERS_PROFILE to a file name
+    # to save the breakdown as JSON
+    profiler = config.profiler()
+
     # INITIALIZE
     
     # User-defined parameters
@@ -243,10 +258,14 @@ def main():
             node_state_grid[i] = random.randint(1, 7)
     
     # Create the CA model
-    ca = OrientedHexCTS(hmg, ns_dict, xn_list, node_state_grid)
+    ca = components.create('OrientedHexCTS', hmg, ns_dict, xn_list,
+                           node_state_grid)
     
-    # Create a CAPlotter object for handling screen display
-    ca_plotter = CAPlotter(ca)
+    # Create a CAPlotter object for handling screen display (or, headless, a
+    # stand-in that saves the final node states)
+    ca_plotter = config.ca_plotter(ca, 'cts_lattice_gas_with_gravity')
+    profiler.wrap(ca, 'run')
+    profiler.wrap(ca_plotter, 'update_plot')
     
     # Plot the initial grid
     ca_plotter.update_plot()
@@ -274,6 +293,7 @@ def main():
     # FINALIZE
 
     # Plot
+    print(profiler.finish(components.import_times()))
     ca_plotter.finalize()
 
 
@@ -15,9 +15,20 @@ _DEBUG = False
 
 import time
 from numpy import where, bitwise_and
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir, os.pardir))
+from driver_tools.run_config import RunConfig
+
+# Read the run configuration (headless or not, see driver_tools/run_config.py)
+# before importing landlab
+config = RunConfig.from_environment()
+
 from landlab import RasterModelGrid
-from landlab.components.cellular_automata.celllab_cts import Transition, CAPlotter
-from landlab.components.cellular_automata.oriented_raster_cts import OrientedRasterCTS
+from landlab.components.cellular_automata.celllab_cts import Transition
+from driver_tools.components import components
 
 
 def setup_transition_list():
@@ -72,6 +83,10 @@ def setup_transition_list():
     
 def main():
     
+    # Time the run per component; set LANDLAB_DRIVERS_PROFILE to a file name
+    # to save the breakdown as JSON
+    profiler = config.profiler()
+
     # INITIALIZE
 
     # User-defined parameters
@@ -104,7 +119,8 @@ def main():
     node_state_grid[middle_rows] = 1    
     
     # Create the CA model
-    ca = OrientedRasterCTS(mg, ns_dict, xn_list, node_state_grid)
+    ca = components.create('OrientedRasterCTS', mg, ns_dict, xn_list,
+                           node_state_grid)
     
     # Debug output if needed    
     if _DEBUG:
@@ -115,8 +131,11 @@ def main():
                 print('{0:.0f}'.format(ca.node_state[n]), end=' ')
             print()
 
-    # Create a CAPlotter object for handling screen display
-    ca_plotter = CAPlotter(ca)
+    # Create a CAPlotter object for handling screen display (or, headless, a
+    # stand-in that saves the final node states)
+    ca_plotter = config.ca_plotter(ca, 'diffusion_in_gravity')
+    profiler.wrap(ca, 'run')
+    profiler.wrap(ca_plotter, 'update_plot')
     
     # Plot the initial grid
     ca_plotter.update_plot()
@@ -153,6 +172,7 @@ def main():
     # FINALIZE
 
     # Plot
+    print(profiler.finish(components.import_times()))
     ca_plotter.finalize()
 
 
@@ -12,11 +12,21 @@ from __future__ import print_function
 
 import time
 import numpy as np
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir, os.pardir))
+from driver_tools.run_config import RunConfig
+
+# Read the run configuration (headless or not, see driver_tools/run_config.py)
+# before importing landlab
+config = RunConfig.from_environment()
+
 from landlab import RasterModelGrid
-from landlab.components.cellular_automata.celllab_cts import Transition, CAPlotter
-from landlab.components.cellular_automata.raster_cts import RasterCTS
+from landlab.components.cellular_automata.celllab_cts import Transition
+from driver_tools.components import components
 from landlab.components.fracture_grid.fracture_grid import make_frac_grid
-import matplotlib
 from landlab.io.netcdf import write_netcdf
 
 
@@ -68,6 +78,10 @@ def setup_transition_list():
     
 def main():
     
+    # Time the run per component; set LANDLAB_DRIVERS_PROFILE to a file name
+    # to save the breakdown as JSON
+    profiler = config.profiler()
+
     # INITIALIZE
 
     # User-defined parameters
@@ -106,16 +120,24 @@ def main():
     node_state_grid[:] = make_frac_grid(frac_spacing, model_grid=mg)    
     
     # Create the CA model
-    ca = RasterCTS(mg, ns_dict, xn_list, node_state_grid)
-
-    # Set up the color map
-    rock_color = (0.8, 0.8, 0.8)
-    sap_color = (0.4, 0.2, 0)
-    clist = [rock_color, sap_color]
-    my_cmap = matplotlib.colors.ListedColormap(clist)
-    
-    # Create a CAPlotter object for handling screen display
-    ca_plotter = CAPlotter(ca, cmap=my_cmap)
+    ca = components.create('RasterCTS', mg, ns_dict, xn_list,
+                           node_state_grid)
+
+    # Create a CAPlotter object for handling screen display (or, headless, a
+    # stand-in that saves the final node states)
+    if config.headless:
+        ca_plotter = config.ca_plotter(ca, 'rock_weathering')
+    else:
+        import matplotlib
+
+        # Set up the color map
+        rock_color = (0.8, 0.8, 0.8)
+        sap_color = (0.4, 0.2, 0)
+        clist = [rock_color, sap_color]
+        my_cmap = matplotlib.colors.ListedColormap(clist)
+        ca_plotter = config.ca_plotter(ca, 'rock_weathering', cmap=my_cmap)
+    profiler.wrap(ca, 'run')
+    profiler.wrap(ca_plotter, 'update_plot')
     
     # Plot the initial grid
     ca_plotter.update_plot()
@@ -155,6 +177,7 @@ def main():
     # FINALIZE
 
     # Plot
+    print(profiler.finish(components.import_times()))
     ca_plotter.finalize()
 
 
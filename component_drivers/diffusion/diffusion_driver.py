@@ -7,13 +7,21 @@ Created on Fri Feb 20 11:17:52 2015
 @author: danhobley
 """
 
-from landlab.components.diffusion.diffusion import LinearDiffuser
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir, os.pardir))
+from driver_tools.run_config import RunConfig
+
+#read the run configuration (headless or not, see driver_tools/run_config.py)
+#before importing landlab
+config = RunConfig.from_environment()
+
 import numpy as np
-import pylab
-from pylab import show
 from landlab import RasterModelGrid
 from landlab import ModelParameterDictionary
-from landlab.plot.imshow import imshow_node_grid
+from driver_tools.components import components
 
 inputs = ModelParameterDictionary('./diffusion_params.txt')
 nrows = inputs.read_int('nrows')
@@ -34,7 +42,11 @@ mg['node'][ 'topographic__elevation'] = z + np.random.rand(len(z))/1000.
 mg.set_fixed_value_boundaries_at_grid_edges(True, True, True, True)
 
 #instantiate:
-dfn = LinearDiffuser(mg, './diffusion_params.txt')
+dfn = components.create('LinearDiffuser', mg, './diffusion_params.txt')
+
+#time the run per component (see driver_tools/profiling.py):
+profiler = config.profiler()
+profiler.wrap(dfn, 'diffuse')
 
 #perform the loop:
 elapsed_time = 0. #total time in simulation
@@ -47,11 +59,20 @@ while elapsed_time < time_to_run:
     mg.at_node['topographic__elevation'][mg.core_nodes] += uplift_rate*dt
     elapsed_time += dt
 
-pylab.figure(1)
-im = imshow_node_grid(mg, 'topographic__elevation')  # display a colored image
+print profiler.finish(components.import_times())
+
+elev_r = mg.node_vector_to_raster(mg.at_node['topographic__elevation'])
+if config.headless:
+    config.dump('diffusion_driver', topographic__elevation=elev_r)
+else:
+    import pylab
+    from landlab.plot.imshow import imshow_node_grid
+
+    pylab.figure(1)
+    im = imshow_node_grid(mg, 'topographic__elevation')  # display a colored image
 
-pylab.figure(2)
-im2 = pylab.plot(mg.node_vector_to_raster(mg.at_node['topographic__elevation'])[:,ncols//2])
-pylab.xlabel('Horizontal distance')
-pylab.ylabel('Elevation')
-pylab.title('Cross section')
+    pylab.figure(2)
+    im2 = pylab.plot(elev_r[:,ncols//2])
+    pylab.xlabel('Horizontal distance')
+    pylab.ylabel('Elevation')
+    pylab.title('Cross section')
@@ -5,45 +5,91 @@ test_script_for_route_flow_dn.py:
     
 Tests and illustrates use of route_flow_dn component.
 """
+from __future__ import print_function
 
-from landlab.components.flow_routing.route_flow_dn import FlowRouter
-from landlab.io import read_esri_ascii
-from landlab.plot.imshow import imshow_node_grid
 import os
-import pylab
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir, os.pardir))
+from driver_tools.run_config import RunConfig
+
+# Read the run configuration (headless or not, see driver_tools/run_config.py)
+# before importing landlab
+config = RunConfig.from_environment()
+
+from driver_tools.components import components
+from driver_tools.parallel_accumulation import find_drainage_area_and_discharge
+from driver_tools.dem_cache import load_preprocessed_dem
 
 dem_name = './west_bijou_gully.asc'
 outlet_row = 82
 outlet_column = 38
+n_threads = 4
+
+
+def close_nodata_nodes(grid, z, nodata_value):
+    grid.set_nodata_nodes_to_closed(z, nodata_value) # set nodata nodes to inactive bounds
 
-# Read in a DEM and set its boundaries
+
+# Time the run per component; set LANDLAB_DRIVERS_PROFILE to a file name to
+# save the breakdown as JSON
+profiler = config.profiler()
+find_drainage_area_and_discharge = profiler.wrap_function(
+    find_drainage_area_and_discharge, 'parallel_accumulation')
+
+# Read in a DEM and set its boundaries (from the DEM cache, after the first
+# run)
 DATA_FILE = os.path.join(os.path.dirname(__file__), dem_name)
-(grid, z) = read_esri_ascii(DATA_FILE, name='topographic__elevation')
-grid.set_nodata_nodes_to_closed(z, 0.) # set nodata nodes to inactive bounds
+with profiler.section('driver', 'load_dem'):
+    (grid, z) = load_preprocessed_dem(DATA_FILE, close_nodata_nodes,
+                                      nodata_value=0.)
 outlet_node = grid.grid_coords_to_node_id(outlet_row, outlet_column)
 
 # Route flow
-flow_router = FlowRouter(grid)
+flow_router = components.create('FlowRouter', grid)
+profiler.wrap(flow_router, 'route_flow')
 flow_router.route_flow()
 
-# Create a shaded image
-pylab.close()  # clear any pre-existing plot
-pylab.figure(1)
-im = imshow_node_grid(grid, 'water__volume_flux', cmap = pylab.cm.RdBu)
+# Accumulate drainage area and discharge again, this time level by level on
+# a pool of threads; the additions happen in the same order as in the serial
+# pass, so the results should match FlowRouter's exactly
+(area, discharge) = find_drainage_area_and_discharge(
+    grid.at_node['flow_receiver'], grid.at_node['upstream_node_order'],
+    node_cell_area=grid.dx * grid.dx, n_threads=n_threads)
+print('Largest difference from the serial drainage area:',
+      np.amax(np.abs(area - grid.at_node['drainage_area'])))
+print(profiler.finish(components.import_times()))
+
+if config.headless:
+    # Save the discharge and the DEM instead of plotting them
+    config.dump('route_flow_dn',
+                water__volume_flux=grid.node_vector_to_raster(
+                    grid.at_node['water__volume_flux']),
+                topographic__elevation=grid.node_vector_to_raster(
+                    grid.at_node['topographic__elevation']))
+else:
+    import pylab
+    from landlab.plot.imshow import imshow_node_grid
 
-# add a title and axis labels
-pylab.title('Discharge')
-pylab.xlabel('Distance (m)')
-pylab.ylabel('Distance (m)')
+    # Create a shaded image
+    pylab.close()  # clear any pre-existing plot
+    pylab.figure(1)
+    im = imshow_node_grid(grid, 'water__volume_flux', cmap = pylab.cm.RdBu)
 
-pylab.figure(2)
-im = imshow_node_grid(grid, 'topographic__elevation')
-pylab.title('DEM')
-pylab.xlabel('Distance (m)')
-pylab.ylabel('Distance (m)')
+    # add a title and axis labels
+    pylab.title('Discharge')
+    pylab.xlabel('Distance (m)')
+    pylab.ylabel('Distance (m)')
 
-# Display the plot
-pylab.show()
+    pylab.figure(2)
+    im = imshow_node_grid(grid, 'topographic__elevation')
+    pylab.title('DEM')
+    pylab.xlabel('Distance (m)')
+    pylab.ylabel('Distance (m)')
+
+    # Display the plot
+    pylab.show()
     
-import numpy as np
-print np.sum(grid.node_status!=4)
+print(np.sum(grid.node_status!=4))
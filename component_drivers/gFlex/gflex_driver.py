@@ -7,12 +7,21 @@ Created on Fri Feb 20 11:17:52 2015
 @author: danhobley
 """
 
-from landlab.components.gFlex.flexure import gFlex
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir, os.pardir))
+from driver_tools.run_config import RunConfig
+
+#read the run configuration (headless or not, see driver_tools/run_config.py)
+#before importing landlab
+config = RunConfig.from_environment()
+
 import numpy as np
-import pylab
 from landlab import RasterModelGrid
 from landlab import ModelParameterDictionary
-from landlab.plot.imshow import imshow_node_grid
+from driver_tools.components import components
 
 inputs = ModelParameterDictionary('./AW_gflex_params.txt')
 nrows = inputs.read_int('nrows')
@@ -35,7 +44,11 @@ square_qs = mg.at_node['surface_load__stress'].view().reshape((nrows,ncols))
 square_qs[10:40, 10:40] += 1.e6
     
 #instantiate:
-gf = gFlex(mg, './AW_gflex_params.txt')
+gf = components.create('gFlex', mg, './AW_gflex_params.txt')
+
+#time the run per component (see driver_tools/profiling.py):
+profiler = config.profiler()
+profiler.wrap(gf, 'flex_lithosphere')
 
 #perform the loop:
 elapsed_time = 0. #total time in simulation
@@ -47,8 +60,20 @@ while elapsed_time < time_to_run:
     gf.flex_lithosphere()
     elapsed_time += dt
 
-pylab.figure(1)
-im = imshow_node_grid(mg, 'topographic__elevation')  # display a colored image
+print profiler.finish(components.import_times())
+
+if config.headless:
+    config.dump('gflex_driver',
+                topographic__elevation=mg.node_vector_to_raster(
+                    mg.at_node['topographic__elevation']),
+                lithosphere__vertical_displacement=mg.node_vector_to_raster(
+                    mg.at_node['lithosphere__vertical_displacement']))
+else:
+    import pylab
+    from landlab.plot.imshow import imshow_node_grid
+
+    pylab.figure(1)
+    im = imshow_node_grid(mg, 'topographic__elevation')  # display a colored image
 
-pylab.figure(2)
-im = imshow_node_grid(mg, 'lithosphere__vertical_displacement')
\ No newline at end of file
+    pylab.figure(2)
+    im = imshow_node_grid(mg, 'lithosphere__vertical_displacement')
@@ -1,11 +1,18 @@
 import numpy
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir, os.pardir))
+from driver_tools.run_config import RunConfig
+
+# read the run configuration (headless or not, see
+# driver_tools/run_config.py) before importing landlab
+config = RunConfig.from_environment()
+
 from landlab import RasterModelGrid
 from landlab import ModelParameterDictionary
-from landlab.plot.imshow import imshow_node_grid
-#from landlab.components.nonlinear_diffusion.Perron_nl_diffuse import PerronNLDiffuse
-from landlab.components.nonlinear_diffusion.explicit_nl_diffuse import NonlinearDiffuser
-import pylab
-import time
+from driver_tools.components import components
 
 inputs = ModelParameterDictionary('./drive_perron_params.txt')
 nrows = inputs.read_int('nrows')
@@ -28,10 +35,14 @@ mg.at_node[ 'topographic__elevation'] = z + numpy.random.rand(len(z))/1000.
 
 # Display a message
 print( 'Running ...' )
-start_time = time.time()
+# time the run per component; set LANDLAB_DRIVERS_PROFILE to a file name to
+# save the breakdown as JSON
+profiler = config.profiler()
 
 #instantiate the component:
-diffusion_component = NonlinearDiffuser(mg, './drive_perron_params.txt')
+diffusion_component = components.create('NonlinearDiffuser', mg,
+                                        './drive_perron_params.txt')
+profiler.wrap(diffusion_component, 'diffuse')
 
 #perform the loop:
 elapsed_time = 0. #total time in simulation
@@ -43,22 +54,28 @@ while elapsed_time < time_to_run:
     mg = diffusion_component.diffuse(dt)
     elapsed_time += dt
 
-print('Total run time = '+str(time.time()-start_time)+' seconds.')
+print(profiler.finish(components.import_times()))
 
-# Clear previous plots
-pylab.figure(1)
-pylab.close()
+elev_r = mg.node_vector_to_raster(mg.at_node['topographic__elevation'])
+if config.headless:
+    config.dump('drive_explicit_nl', topographic__elevation=elev_r)
+else:
+    import pylab
+    from landlab.plot.imshow import imshow_node_grid
 
-# Plot topography
-pylab.figure(1)
-im = imshow_node_grid(mg, 'topographic__elevation')
-pylab.title('Topography')
+    # Clear previous plots
+    pylab.figure(1)
+    pylab.close()
 
-elev_r = mg.node_vector_to_raster(mg.at_node['topographic__elevation'])
-pylab.figure(2)
-im = pylab.plot(dx*numpy.arange(nrows), elev_r[:,int(ncols//2)])  # display a colored image
-pylab.title('Vertical cross section')
+    # Plot topography
+    pylab.figure(1)
+    im = imshow_node_grid(mg, 'topographic__elevation')
+    pylab.title('Topography')
+
+    pylab.figure(2)
+    im = pylab.plot(dx*numpy.arange(nrows), elev_r[:,int(ncols//2)])  # display a colored image
+    pylab.title('Vertical cross section')
 
-pylab.show()
+    pylab.show()
 
 print('Done.')
@@ -21,17 +21,31 @@ Written by Jordan M. Adams, November 2015.
 """
 from __future__ import print_function
 
-from landlab.components.overland_flow.generate_overland_flow_deAlmeida import OverlandFlow
-from landlab.io import read_esri_ascii
-from matplotlib import pyplot as plt
 import os
-import time
+import sys
 import numpy as np
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir, os.pardir))
+from driver_tools.run_config import RunConfig
 
-# This provides us with an initial time. At the end, it gives us total
-# model run time in seconds.
-start_time = time.time()
+## Read the run configuration (headless or not, see
+## driver_tools/run_config.py) before importing landlab.
+config = RunConfig.from_environment()
+
+from driver_tools.dem_cache import load_preprocessed_dem
+from driver_tools.basins import set_up_basin, outlet_gauge, LONG_BASIN_OUTLET
+from driver_tools.gauges import GaugeIndex
+from driver_tools.drainage_monitor import DrainageMonitor
+from driver_tools.active_domain_flow import ActiveDomainOverlandFlow
+from driver_tools.rainfall_frames import RainfallFrames
+from driver_tools.components import components
+
+
+# Time the run, broken down by component: the solver, the hydrograph
+# recorder and the drainage monitor (see driver_tools/profiling.py). Set
+# LANDLAB_DRIVERS_PROFILE to a file name to also save the breakdown as JSON.
+profiler = config.profiler()
 
 ## This is a steady-state landscape generated by simple stream power
 ## This is a 400 x 100 grid with an outlet at center of the bottom edge.
@@ -41,8 +55,16 @@ dem_name ='Long_TestBasin_Outlet50.asc'
 ## First, this looks for the DEM in the overland_flow folder in Landlab
 DATA_FILE = os.path.join(os.path.dirname(__file__), dem_name)
 
-## Now the ASCII is read, assuming that it is standard ESRI format.
-(rmg, z) = read_esri_ascii(DATA_FILE)
+## Now the ASCII is read, assuming that it is standard ESRI format, and the
+## fields and boundary conditions are set up by set_up_basin() (see
+## driver_tools/basins.py). The finished grid is cached on disk, keyed by the
+## DEM contents, the setup and the outlet, so later runs skip both the
+## parsing and the setup. The outlet is declared by its coordinates (x, y in
+## m); the node nearest to them is opened.
+outlet = LONG_BASIN_OUTLET
+with profiler.section('driver', 'load_dem'):
+    (rmg, z) = load_preprocessed_dem(DATA_FILE, set_up_basin,
+                                     outlets=[outlet])
 
 ## Start time 1 second
 elapsed_time = 1.0
@@ -50,35 +72,55 @@ elapsed_time = 1.0
 ## Model Run Time in seconds
 model_run_time = 500000.0
 
-## Lists for saving data
-discharge_at_outlet = []
-hydrograph_time_sec = []
-hydrograph_time_hrs = []
-
-## Setting initial fields...
-rmg['node']['topographic__elevation'] = z
-rmg['link']['water_discharge'] = np.zeros(rmg.number_of_links)
-rmg['node']['water_depth'] = np.zeros(rmg.number_of_nodes)
-
-## and fixed link boundary conditions...
-rmg.set_fixed_link_boundaries_at_grid_edges(True, True, True, True, fixed_link_value_of='water_discharge')
-
-## Setting the outlet node to OPEN_BOUNDARY
-rmg.status_at_node[50] = 1
-
-
-## Initialize the OverlandFlow() class.
-of = OverlandFlow(rmg, use_fixed_links=True)
-
-## Record the start time so we know how long it runs.
-start_time = time.time()
-
-## Link to sample at the outlet
-link_to_sample = 149
+## Initialize the OverlandFlow() class. Set use_active_domain to True to
+## use ActiveDomainOverlandFlow (driver_tools/active_domain_flow.py)
+## instead, which only updates the links next to wet nodes (deeper than
+## 0.1 mm), skipping most of the grid once the storm is over. It is a
+## separate implementation of the same scheme; the test in
+## driver_tools/tests/test_active_domain_flow.py compares its outlet
+## hydrograph with that of OverlandFlow() on this basin.
+use_active_domain = False
+if use_active_domain:
+    of = ActiveDomainOverlandFlow(rmg, wet_depth=0.0001)
+else:
+    of = components.create('OverlandFlow', rmg, use_fixed_links=True)
+profiler.wrap(of, 'overland_flow')
+
+## Gauges to sample, by coordinates: (name, 'link' or 'node', x, y). The
+## outlet gauge is the link from the outlet into the basin, placed from the
+## outlet's coordinates. Add more here (or read them from a file with
+## driver_tools.gauges.read_gauges); they are resolved to links and nodes
+## once, and all sampled together at every time step.
+gauges = GaugeIndex(rmg, [outlet_gauge(outlet, rmg.dx)])
+
+## Record the discharge (or depth) at every gauge at every time step. The
+## record is written to disk a chunk at a time, and its time integrals (at
+## the outlet, the water mass leaving the basin) are kept up to date as the
+## model runs.
+hydrograph = gauges.recorder(output_path='deAlmeida_LongBasin.hydrograph')
+profiler.wrap(hydrograph, 'record')
 
 ## Storm duration in seconds
 storm_duration = 7200.0
 
+## Spatially varying rainfall: set rainfall_file to a file of rainfall frames
+## (see driver_tools/rainfall_frames.py) to use it instead of the uniform
+## storm. The frames are read from disk as the model time reaches them, and
+## the storm lasts until the last frame.
+rainfall_file = None
+if rainfall_file is not None:
+    rainfall = RainfallFrames(rainfall_file)
+    storm_duration = rainfall.end_time
+    rainfall_at_node = np.zeros(rmg.number_of_nodes)
+
+## The run stops early once the storm is over and the basin has drained:
+## when the water stored on it (above the depth left on dry nodes) and the
+## outlet discharge have both fallen to 0.1% of their peaks.
+drainage = DrainageMonitor(rmg, storm_duration, storage_tolerance=1.e-3,
+                           discharge_tolerance=1.e-3, dry_depth=0.0001,
+                           water_depth=of.h)
+profiler.wrap(drainage, 'update')
+
 
 ## Running the overland flow component.
 while elapsed_time < model_run_time:
@@ -88,7 +130,12 @@ while elapsed_time < model_run_time:
 
     ## The storm starts when the model starts. While the elapsed time is less
     ## than the storm duration, we add water to the system as rainfall.
-    if elapsed_time < storm_duration:
+    if rainfall_file is not None:
+
+        of.rainfall_intensity = rainfall.intensity_at(elapsed_time,
+                                                      out=rainfall_at_node)
+
+    elif elapsed_time < storm_duration:
 
         of.rainfall_intensity = 4.07222 * (10 ** -7) # Rainfall intensity in m/s
 
@@ -100,31 +147,45 @@ while elapsed_time < model_run_time:
     ## Generating overland flow based on the deAlmeida solution.
     of.overland_flow()
 
-    ## Append time and discharge to their lists to save data and for plotting.
-    hydrograph_time_sec.append(elapsed_time)
-    hydrograph_time_hrs.append(round(elapsed_time/3600., 2))
-    discharge_at_outlet.append(of.q[link_to_sample])
+    ## Record time and discharge to save data and for plotting.
+    hydrograph.record(elapsed_time, link_values=of.q, node_values=of.h)
 
     ## Add the time step, repeat until elapsed time >= model_run_time
     elapsed_time += of.dt
 
-
-plt.figure(1)
-plt.plot(hydrograph_time_hrs, (np.abs(discharge_at_outlet)*rmg.dx), 'b-')
-plt.xlabel('Time (hrs)')
-plt.ylabel('Discharge (cms)')
-plt.title('Hydrograph at Outlet')
-
-calc_water_mass = round(np.abs((np.trapz(hydrograph_time_sec, (np.abs(
-                    discharge_at_outlet) * rmg.dx)))), 2)
-theoretical_water_mass = round(((rmg.number_of_core_nodes * rmg.cellarea) *
-                    (4.07222 * (10 ** -7)) * storm_duration), 2)
+    ## Stop once the basin has drained.
+    if drainage.update(elapsed_time, of.dt, of.rainfall_intensity, of.h,
+                       hydrograph.integral('outlet') * rmg.dx):
+        break
+
+## Read the whole record back (memory-mapped) for plotting.
+record = hydrograph.read()
+hydrograph_time_hrs = record[:, 0] / 3600.
+discharge_at_outlet = record[:, hydrograph.columns.index('outlet')]
+
+if config.headless:
+    config.dump('deAlmeida_LongBasin', time_hrs=hydrograph_time_hrs,
+                discharge_at_outlet=np.abs(discharge_at_outlet)*rmg.dx)
+else:
+    from matplotlib import pyplot as plt
+
+    plt.figure(1)
+    plt.plot(hydrograph_time_hrs, (np.abs(discharge_at_outlet)*rmg.dx), 'b-')
+    plt.xlabel('Time (hrs)')
+    plt.ylabel('Discharge (cms)')
+    plt.title('Hydrograph at Outlet')
+
+calc_water_mass = round(hydrograph.integral('outlet') * rmg.dx, 2)
+if rainfall_file is not None:
+    theoretical_water_mass = round(drainage.rainfall_volume, 2)
+else:
+    theoretical_water_mass = round(((rmg.number_of_core_nodes * rmg.cellarea) *
+                        (4.07222 * (10 ** -7)) * storm_duration), 2)
 percent_error = round(((np.abs(calc_water_mass) - theoretical_water_mass) /
                     theoretical_water_mass * 100), 2)
 
 print('\n', 'Total calculated water mass: ', calc_water_mass)
 print('\n', 'Theoretical water mass (Q = P * A): ', theoretical_water_mass)
 print('\n', 'Percent Error: ', percent_error, ' %')
-
-endtime = time.time()
-print('\n', 'Total run time: ', round(endtime - start_time, 2), ' seconds')
\ No newline at end of file
+print('\n', drainage.report())
+print('\n', profiler.finish(components.import_times()))
\ No newline at end of file
@@ -0,0 +1,243 @@
+#! /usr/env/python
+""" deAlmeida_StormEnsemble.py
+
+Routes an ensemble of storms across one of the test basins used by
+deAlmeida_LongBasin.py and deAlmeida_SquareBasin.py, and collects the peak
+discharge and the volume of every storm's hydrograph at the outlet into a
+single table.
+
+The storms are either read from a whitespace-delimited table with a header
+line naming its columns::
+
+    # intensity  duration
+    4.07222e-7   7200.
+    8.14444e-7   3600.
+
+(intensity in m/s, duration in s), or drawn from exponential distributions
+around mean storm parameters, by default the Hawk and Eagleson (1992)
+Poisson parameters for the Denver, CO station used by the basin drivers.
+
+The DEM is read, its boundaries are set up and the overland flow solver
+builds its link tables once, in the parent process, before the worker pool
+is started. The workers are forked from the parent, so they share all of
+that read-only topology copy-on-write; each storm resets the water depth
+and discharge to their initial values and only writes those arrays. Each
+storm runs until its basin has drained.
+
+The solver is landlab's ``OverlandFlow``, as in the basin drivers. With
+``--active-domain``, the storms are routed with ActiveDomainOverlandFlow
+instead (see driver_tools/active_domain_flow.py), which skips the dry part
+of the grid, as with the basin drivers' ``use_active_domain``.
+
+Example::
+
+    $ python deAlmeida_StormEnsemble.py --basin square --n-storms 100 \\
+          --n-procs 8 --output square_storms.txt
+"""
+from __future__ import print_function
+
+import os
+import sys
+import time
+import multiprocessing
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir, os.pardir))
+from driver_tools.dem_cache import load_preprocessed_dem
+from driver_tools.basins import (set_up_basin, outlet_gauge,
+                                 LONG_BASIN_OUTLET, SQUARE_BASIN_OUTLET)
+from driver_tools.gauges import GaugeIndex
+from driver_tools.drainage_monitor import DrainageMonitor
+from driver_tools.active_domain_flow import ActiveDomainOverlandFlow
+from driver_tools.components import components
+
+
+#: DEM and outlet (x, y, on the bottom edge) of each test basin.
+BASINS = {
+    'long': ('Long_TestBasin_Outlet50.asc', LONG_BASIN_OUTLET),
+    'square': ('Square_TestBasin_Outlet100.asc', SQUARE_BASIN_OUTLET),
+}
+
+#: Table columns written for every storm, in order.
+COLUMNS = ('storm', 'intensity', 'duration', 'peak_discharge',
+           'time_to_peak', 'outflow_volume', 'rainfall_volume',
+           'mass_balance_error', 'end_time', 'wall_time')
+
+#: Set in the parent before the pool is forked; read by the workers.
+_TEMPLATE = {}
+
+
+def read_storm_table(filename):
+    """Read a storm table into arrays of intensities and durations."""
+    with open(filename, 'r') as fp:
+        header = fp.readline().lstrip('#').split()
+    values = np.loadtxt(filename, ndmin=2)
+    columns = dict((name, values[:, col]) for (col, name) in enumerate(header))
+    return (columns['intensity'], columns['duration'])
+
+
+def draw_storms(n_storms, mean_intensity, mean_duration, seed=None):
+    """Draw storm intensities and durations from exponential distributions."""
+    rng = np.random.RandomState(seed)
+    return (rng.exponential(mean_intensity, n_storms),
+            rng.exponential(mean_duration, n_storms))
+
+
+def _run_storm(args):
+    """Route one storm across the inherited basin until it has drained."""
+    (storm, intensity, duration) = args
+    rmg = _TEMPLATE['grid']
+    of = _TEMPLATE['flow']
+    gauges = _TEMPLATE['gauges']
+    model_run_time = _TEMPLATE['model_run_time']
+
+    start_time = time.time()
+    if isinstance(of, ActiveDomainOverlandFlow):
+        of.reset()
+    else:
+        (h_init, q_init) = _TEMPLATE['initial_state']
+        of.h[:] = h_init
+        of.q[:] = q_init
+        of.rainfall_intensity = 0.
+    hydrograph = gauges.recorder(keep_record=False)
+    drainage = DrainageMonitor(rmg, duration,
+                               dry_depth=_TEMPLATE['dry_depth'],
+                               water_depth=of.h)
+
+    elapsed_time = 1.0
+    while elapsed_time < model_run_time:
+        if elapsed_time < duration:
+            of.rainfall_intensity = intensity
+        else:
+            of.rainfall_intensity = 0.0
+        of.overland_flow()
+        hydrograph.record(elapsed_time, link_values=of.q)
+        elapsed_time += of.dt
+        if drainage.update(elapsed_time, of.dt, of.rainfall_intensity, of.h,
+                           hydrograph.integral('outlet') * rmg.dx):
+            break
+
+    (time_to_peak, peak) = hydrograph.peak('outlet')
+    return (storm, intensity, duration, peak * rmg.dx, time_to_peak,
+            drainage.outflow_volume, drainage.rainfall_volume,
+            drainage.mass_balance_error, elapsed_time,
+            time.time() - start_time)
+
+
+def run_ensemble(basin, intensities, durations, n_procs=1,
+                 use_active_domain=False, wet_depth=0.0001, dry_depth=0.0001,
+                 model_run_time=500000.0):
+    """Route every storm of an ensemble across a test basin.
+
+    Parameters
+    ----------
+    basin : {'long', 'square'}
+        Which test basin to use.
+    intensities, durations : ndarray
+        Rainfall intensity (m/s) and duration (s) of every storm.
+    n_procs : int, optional
+        Number of worker processes.
+    use_active_domain : bool, optional
+        Route the storms with ActiveDomainOverlandFlow rather than
+        landlab's OverlandFlow.
+    wet_depth : float or None, optional
+        With *use_active_domain*, the depth above which a node is wet;
+        None updates the whole grid.
+    dry_depth : float, optional
+        Depth left on nodes once they have drained, whatever the solver;
+        it is not counted as stored water when checking for drainage.
+    model_run_time : float, optional
+        Longest time to run a storm for, if its basin does not drain first.
+
+    Returns
+    -------
+    ndarray
+        One row per storm, with the columns listed in :data:`COLUMNS`.
+    """
+    (dem_name, outlet) = BASINS[basin]
+    DATA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             dem_name)
+    (rmg, z) = load_preprocessed_dem(DATA_FILE, set_up_basin,
+                                     outlets=[outlet])
+
+    _TEMPLATE['grid'] = rmg
+    if use_active_domain:
+        of = ActiveDomainOverlandFlow(rmg, wet_depth=wet_depth)
+    else:
+        of = components.create('OverlandFlow', rmg, use_fixed_links=True)
+    _TEMPLATE['flow'] = of
+    _TEMPLATE['initial_state'] = (np.array(of.h), np.array(of.q))
+    _TEMPLATE['dry_depth'] = dry_depth
+    _TEMPLATE['gauges'] = GaugeIndex(rmg, [outlet_gauge(outlet, rmg.dx)])
+    _TEMPLATE['model_run_time'] = model_run_time
+
+    storms = list(zip(range(len(intensities)), intensities, durations))
+    results = np.empty((len(storms), len(COLUMNS)))
+
+    try:
+        context = multiprocessing.get_context('fork')
+    except AttributeError:  # Python 2 always forks
+        context = multiprocessing
+    pool = context.Pool(n_procs)
+    try:
+        for row in pool.imap_unordered(_run_storm, storms):
+            results[row[0]] = row
+            print('Completed storm ', row[0])
+    finally:
+        pool.close()
+        pool.join()
+
+    return results
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Route an ensemble of storms across a test basin')
+    parser.add_argument('--basin', choices=sorted(BASINS), default='square',
+                        help='Test basin to use')
+    parser.add_argument('--storms', help='Storm table (see module docstring)')
+    parser.add_argument('--n-storms', type=int, default=10,
+                        help='Number of storms to draw, without a table')
+    parser.add_argument('--mean-intensity', type=float,
+                        default=4.07222 * (10 ** -7),
+                        help='Mean storm intensity (m/s), without a table')
+    parser.add_argument('--mean-duration', type=float, default=7200.0,
+                        help='Mean storm duration (s), without a table')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='Seed for drawing storms')
+    parser.add_argument('--active-domain', action='store_true',
+                        help='Use ActiveDomainOverlandFlow instead of '
+                        'OverlandFlow')
+    parser.add_argument('--wet-depth', type=float, default=0.0001,
+                        help='Depth above which a node is wet, with '
+                        '--active-domain')
+    parser.add_argument('--dry-depth', type=float, default=0.0001,
+                        help='Depth left on drained nodes')
+    parser.add_argument('--n-procs', type=int, default=1,
+                        help='Number of processors to use')
+    parser.add_argument('--output', default='storm_ensemble.txt',
+                        help='Name of the output table')
+
+    args = parser.parse_args()
+
+    if args.storms:
+        (intensities, durations) = read_storm_table(args.storms)
+    else:
+        (intensities, durations) = draw_storms(
+            args.n_storms, args.mean_intensity, args.mean_duration,
+            seed=args.seed)
+
+    results = run_ensemble(args.basin, intensities, durations,
+                           n_procs=args.n_procs,
+                           use_active_domain=args.active_domain,
+                           wet_depth=args.wet_depth, dry_depth=args.dry_depth)
+    np.savetxt(args.output, results, fmt='%.6g', header='  '.join(COLUMNS))
+    print('Wrote ', args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,211 @@
+#! /usr/env/python
+"""
+coupled_checkpoint.py: checkpoint/restart support for coupled_driver.py.
+
+A checkpoint is a directory, ``<checkpoint_dir>/checkpoint_<step>``, holding
+
+*  one ``<group>__<field name>.npy`` file for every field on the grid,
+*  ``status_at_node.npy``, the boundary status of every node,
+*  ``rng_keys.npy``, the key array of numpy's global Mersenne Twister,
+*  ``checkpoint.json``, with the loop index, the grid shape and spacing, the
+   rest of the RNG state and the state of the model outside the grid, and
+*  ``state/``, a ``<key>.npy`` file for every array in that state.
+
+Each checkpoint is first written into a hidden temporary directory and then
+renamed into place, so a run killed partway through a write never leaves a
+half-written checkpoint behind. On restart the arrays are memory-mapped and
+copied straight into the grid's existing fields.
+"""
+from __future__ import print_function
+
+import os
+import glob
+import json
+import shutil
+
+import numpy as np
+
+
+#: Grid element groups searched for fields.
+FIELD_GROUPS = ('node', 'link', 'patch', 'corner', 'face', 'cell')
+
+_PREFIX = 'checkpoint_'
+_STATE_DIR = 'state'
+
+
+def _fields_on(grid, group):
+    try:
+        return getattr(grid, 'at_' + group)
+    except AttributeError:
+        return {}
+
+
+def _save_array(path, array):
+    with open(path, 'wb') as fp:
+        np.save(fp, array)
+        fp.flush()
+        os.fsync(fp.fileno())
+
+
+def _split_arrays(value, key, arrays):
+    """Replace the arrays in *value* by the names of their files."""
+    if isinstance(value, np.ndarray):
+        filename = key + '.npy'
+        arrays[filename] = value
+        return {'__array__': filename}
+    if isinstance(value, dict):
+        return dict((name, _split_arrays(item, key + '.' + name, arrays))
+                    for (name, item) in value.items())
+    return value
+
+
+def _join_arrays(value, state_dir):
+    """Put the arrays named in *value* back, read from *state_dir*."""
+    if isinstance(value, dict):
+        if list(value) == ['__array__']:
+            return np.load(os.path.join(state_dir, value['__array__']))
+        return dict((name, _join_arrays(item, state_dir))
+                    for (name, item) in value.items())
+    return value
+
+
+def save_checkpoint(grid, checkpoint_dir, step, state=None, keep=2):
+    """Write a checkpoint of *grid* after loop iteration *step*.
+
+    Parameters
+    ----------
+    grid : ModelGrid
+        The grid to save.
+    checkpoint_dir : str
+        Directory holding the checkpoints.
+    step : int
+        Index of the loop iteration just completed.
+    state : dict, optional
+        State of the model outside the grid: JSON-serializable values and
+        numpy arrays, in nested dicts.
+    keep : int, optional
+        Number of checkpoints to keep; older ones are deleted once the new
+        one is safely in place.
+
+    Returns
+    -------
+    str
+        Path to the new checkpoint.
+    """
+    if not os.path.isdir(checkpoint_dir):
+        os.makedirs(checkpoint_dir)
+    final_path = os.path.join(checkpoint_dir, _PREFIX + '%08d' % step)
+    tmp_path = os.path.join(checkpoint_dir, '.tmp_' + _PREFIX + '%08d' % step)
+    if os.path.isdir(tmp_path):
+        shutil.rmtree(tmp_path)
+    os.makedirs(tmp_path)
+
+    for group in FIELD_GROUPS:
+        fields = _fields_on(grid, group)
+        for name in fields:
+            _save_array(os.path.join(tmp_path, group + '__' + name + '.npy'),
+                        fields[name])
+    _save_array(os.path.join(tmp_path, 'status_at_node.npy'),
+                grid.status_at_node)
+
+    (rng_name, rng_keys, rng_pos, has_gauss, cached_gaussian) = (
+        np.random.get_state())
+    _save_array(os.path.join(tmp_path, 'rng_keys.npy'), rng_keys)
+
+    arrays = {}
+    state = _split_arrays(state or {}, 'state', arrays)
+    if arrays:
+        os.makedirs(os.path.join(tmp_path, _STATE_DIR))
+    for (filename, array) in arrays.items():
+        _save_array(os.path.join(tmp_path, _STATE_DIR, filename), array)
+
+    meta = {
+        'step': int(step),
+        'shape': [int(n) for n in grid.shape],
+        'dx': float(grid.dx),
+        'rng': [rng_name, int(rng_pos), int(has_gauss),
+                float(cached_gaussian)],
+        'state': state,
+    }
+    with open(os.path.join(tmp_path, 'checkpoint.json'), 'w') as fp:
+        json.dump(meta, fp, indent=2)
+        fp.flush()
+        os.fsync(fp.fileno())
+
+    if os.path.isdir(final_path):
+        shutil.rmtree(final_path)
+    os.rename(tmp_path, final_path)
+
+    for old_path in list_checkpoints(checkpoint_dir)[:-keep]:
+        shutil.rmtree(old_path)
+
+    return final_path
+
+
+def list_checkpoints(checkpoint_dir):
+    """List complete checkpoints in *checkpoint_dir*, oldest first."""
+    paths = glob.glob(os.path.join(checkpoint_dir, _PREFIX + '*'))
+    return sorted(path for path in paths
+                  if os.path.isfile(os.path.join(path, 'checkpoint.json')))
+
+
+def latest_checkpoint(checkpoint_dir):
+    """Path to the newest checkpoint in *checkpoint_dir*, or None."""
+    paths = list_checkpoints(checkpoint_dir)
+    if len(paths) == 0:
+        return None
+    return paths[-1]
+
+
+def restore_checkpoint(grid, path):
+    """Load the checkpoint at *path* back into *grid*.
+
+    Fields that already exist on the grid (for instance, those created by
+    components when they were instantiated) are overwritten in place, so
+    any references components hold to them remain valid. Missing fields
+    are added. The boundary status of the nodes and numpy's global random
+    state are restored as well.
+
+    Parameters
+    ----------
+    grid : ModelGrid
+        A grid with the same shape and spacing as the saved one.
+    path : str
+        Path to a checkpoint directory.
+
+    Returns
+    -------
+    dict
+        The checkpoint metadata; ``meta['step']`` is the last completed
+        loop iteration and ``meta['state']`` holds the model state, arrays
+        included, as it was saved.
+    """
+    with open(os.path.join(path, 'checkpoint.json'), 'r') as fp:
+        meta = json.load(fp)
+    if (tuple(meta['shape']) != tuple(grid.shape) or
+            meta['dx'] != float(grid.dx)):
+        raise ValueError('checkpoint %s was written for a %s grid with '
+                         'spacing %g' % (path, tuple(meta['shape']),
+                                         meta['dx']))
+
+    for filename in sorted(os.listdir(path)):
+        if '__' not in filename or not filename.endswith('.npy'):
+            continue
+        (group, name) = filename[:-len('.npy')].split('__', 1)
+        values = np.load(os.path.join(path, filename), mmap_mode='r')
+        fields = _fields_on(grid, group)
+        if name in fields:
+            fields[name][:] = values
+        else:
+            grid.add_field(group, name, np.array(values))
+
+    grid.status_at_node = np.load(os.path.join(path, 'status_at_node.npy'))
+
+    (rng_name, rng_pos, has_gauss, cached_gaussian) = meta['rng']
+    np.random.set_state((str(rng_name),
+                         np.load(os.path.join(path, 'rng_keys.npy')),
+                         rng_pos, has_gauss, cached_gaussian))
+
+    meta['state'] = _join_arrays(meta['state'], os.path.join(path,
+                                                             _STATE_DIR))
+    return meta
@@ -1,101 +1,140 @@
-from landlab.components.flow_routing.route_flow_dn import FlowRouter
-from landlab.components.stream_power.fastscape_stream_power import FastscapeEroder
-from landlab.components.nonlinear_diffusion.Perron_nl_diffuse import PerronNLDiffuse
-from landlab.components.diffusion.diffusion import LinearDiffuser
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir))
+from driver_tools.run_config import RunConfig
+
+#read the run configuration (headless or not, see driver_tools/run_config.py)
+#before importing landlab
+config = RunConfig.from_environment()
+
 from landlab import ModelParameterDictionary
-from landlab.plot import channel_profile as prf
-from landlab.plot.imshow import imshow_node_grid
+from coupled_output import ProfileOutputStage
+from coupled_checkpoint import (save_checkpoint, latest_checkpoint,
+                                restore_checkpoint)
+from coupled_model import CoupledModel, build_grid
 
-from landlab import RasterModelGrid
 import numpy as np
-import pylab
+import argparse
+
+from driver_tools.components import components
+
+parser = argparse.ArgumentParser(description='Coupled diffusion and stream '
+                                 'power landscape evolution model.')
+parser.add_argument('--restart', action='store_true', default=False,
+                    help='Resume from the newest checkpoint')
+args = parser.parse_args()
 
 #get the needed properties to build the grid:
 input_file = './coupled_params.txt'
 inputs = ModelParameterDictionary(input_file)
 nrows = inputs.read_int('nrows')
 ncols = inputs.read_int('ncols')
-dx = inputs.read_float('dx')
-leftmost_elev = inputs.read_float('leftmost_elevation')
-initial_slope = inputs.read_float('initial_slope')
-uplift_rate = inputs.read_float('uplift_rate')
-runtime = inputs.read_float('total_time')
-dt = inputs.read_float('dt')
-nt = int(runtime//dt)
-uplift_per_step = uplift_rate * dt
-
-#instantiate the grid object
-mg = RasterModelGrid(nrows, ncols, dx)
-
-##create the elevation field in the grid:
-#create the field
-mg.create_node_array_zeros('topographic__elevation')
-z = mg.create_node_array_zeros() + leftmost_elev
-z += initial_slope*np.amax(mg.node_y) - initial_slope*mg.node_y
-#put these values plus roughness into that field
-mg.at_node[ 'topographic__elevation'] = z + np.random.rand(len(z))/100000.
-
-#set up grid's boundary conditions (bottom, right, top, left is inactive)
-mg.set_closed_boundaries_at_grid_edges(False, True, False, True)
+output_interval = inputs.read_int('output_interval', 10)
+output_dir = inputs.read_string('output_dir', 'output')
+plot_profiles = inputs.read_bool('plot_profiles', False) and not config.headless
+output_in_process = inputs.read_bool('output_in_process', False)
+checkpoint_interval = inputs.read_int('checkpoint_interval', 100)
+checkpoint_dir = inputs.read_string('checkpoint_dir', 'checkpoints')
+
+#find the checkpoint to resume from, if asked to
+restart_from = None
+if args.restart:
+    restart_from = latest_checkpoint(checkpoint_dir)
+    if restart_from is None:
+        parser.error('no checkpoint found in ' + checkpoint_dir)
+
+#instantiate the grid object, with its initial topography and boundary
+#conditions (see coupled_model.py)
+mg = build_grid(inputs)
 
 # Display a message
 print 'Running ...' 
 
-#instantiate the components:
-fr = FlowRouter(mg)
-sp = FastscapeEroder(mg, input_file)
-diffuse = PerronNLDiffuse(mg, input_file)
-lin_diffuse = LinearDiffuser(grid=mg, input_stream=input_file)
+#instantiate the components, their schedule and the timestep control (see
+#coupled_model.py), timing the components too (see
+#driver_tools/profiling.py)
+profiler = config.profiler()
+model = CoupledModel(mg, input_file, profiler=profiler)
+
+#on a restart, overwrite the fields the components just set up with the
+#saved ones, and pick up the run where it left off: at the same model time
+#and step, with the same time pending for every sub-cycled process, the
+#same timestep control and the same flow routing solution
+if restart_from is not None:
+    checkpoint = restore_checkpoint(mg, restart_from)
+    model.set_state(checkpoint['state'])
+    print 'Restarting from ', restart_from
+
+#set up the output stage; this copies the state out of the loop every
+#output_interval steps and writes (and optionally plots) it in the background
+output = ProfileOutputStage(mg, interval=output_interval,
+                            output_dir=output_dir, plot_profiles=plot_profiles,
+                            use_process=output_in_process)
 
 #perform the loops:
-for i in xrange(nt):
-    #note the input arguments here are not totally standardized between modules
-    #mg = diffuse.diffuse(mg, i*dt)
-    mg = lin_diffuse.diffuse(dt)
-    mg = fr.route_flow()
-    mg = sp.erode(mg, dt)
-    mg.at_node['topographic__elevation'][mg.core_nodes] += uplift_per_step
+for (i, elapsed_time) in model.steps():
     
-    ##plot long profiles along channels
-    pylab.figure(6)
-    profile_IDs = prf.channel_nodes(mg, mg.at_node['topographic__steepest_slope'],
-            mg.at_node['drainage_area'], mg.at_node['flow_receiver'])
-    dists_upstr = prf.get_distances_upstream(mg, len(mg.at_node['topographic__steepest_slope']),
-            profile_IDs, mg.at_node['links_to_flow_receiver'])
-    prf.plot_profiles(dists_upstr, profile_IDs, mg.at_node['topographic__elevation'])
+    ##hand the state to the output stage (returns at once between outputs)
+    output.update(i, elapsed_time)
 
-    print 'Completed loop ', i
- 
-print 'Completed the simulation. Plotting...'
+    ##save a checkpoint every so often
+    if checkpoint_interval > 0 and (i+1) % checkpoint_interval == 0:
+        save_checkpoint(mg, checkpoint_dir, i, state=model.get_state())
 
+    print 'Completed loop ', i
 
-#Finalize and plot
-# Clear previous plots
-pylab.figure(1)
-pylab.close()
-pylab.figure(1)
-im = imshow_node_grid(mg, 'water__volume_flux', cmap='PuBu')  # display a colored image
-
-pylab.figure(2)
-im = imshow_node_grid(mg, 'topographic__elevation')  # display a colored image
+model.finish()
+output.finalize()
+print model.scheduler.report()
+print profiler.finish(components.import_times())
 
+if model.dt_control is not None:
+    print model.dt_control.report()
+    np.savez(os.path.join(output_dir, 'timestep_history.npz'),
+             **model.dt_control.history)
+ 
 elev = mg['node']['topographic__elevation']
 elev_r = mg.node_vector_to_raster(elev)
-pylab.figure(3)
-im = pylab.plot(mg.dx*np.arange(nrows), elev_r[:,int(ncols//2)])
-pylab.title('N-S cross_section')
-
-pylab.figure(4)
-im = pylab.plot(mg.dx*np.arange(ncols), elev_r[int(nrows//4),:])
-pylab.title('E-W cross_section')
-
 drainage_areas = mg['node']['drainage_area'][mg.get_interior_nodes()]
 steepest_slopes = mg['node']['topographic__steepest_slope'][mg.get_interior_nodes()]
-pylab.figure(5)
-pylab.loglog(drainage_areas, steepest_slopes, 'x')
-pylab.xlabel('Upstream drainage area, m^2')
-pylab.ylabel('Maximum slope')
+
+if config.headless:
+    print 'Completed the simulation. Saving...'
+    config.dump('coupled_driver', topographic__elevation=elev_r,
+                water__volume_flux=mg.node_vector_to_raster(
+                    mg.at_node['water__volume_flux']),
+                drainage_area=drainage_areas, steepest_slope=steepest_slopes)
+else:
+    print 'Completed the simulation. Plotting...'
+    import pylab
+    from landlab.plot.imshow import imshow_node_grid
+
+    #Finalize and plot
+    # Clear previous plots
+    pylab.figure(1)
+    pylab.close()
+    pylab.figure(1)
+    im = imshow_node_grid(mg, 'water__volume_flux', cmap='PuBu')  # display a colored image
+
+    pylab.figure(2)
+    im = imshow_node_grid(mg, 'topographic__elevation')  # display a colored image
+
+    pylab.figure(3)
+    im = pylab.plot(mg.dx*np.arange(nrows), elev_r[:,int(ncols//2)])
+    pylab.title('N-S cross_section')
+
+    pylab.figure(4)
+    im = pylab.plot(mg.dx*np.arange(ncols), elev_r[int(nrows//4),:])
+    pylab.title('E-W cross_section')
+
+    pylab.figure(5)
+    pylab.loglog(drainage_areas, steepest_slopes, 'x')
+    pylab.xlabel('Upstream drainage area, m^2')
+    pylab.ylabel('Maximum slope')
 
 print('Done.')
 
-pylab.show()
+if not config.headless:
+    pylab.show()
@@ -0,0 +1,181 @@
+#! /usr/env/python
+"""
+coupled_model.py: the coupled diffusion and stream power model, as run by
+coupled_driver.py and coupled_sweep.py.
+
+:class:`CoupledModel` builds the components from a parameter file, schedules
+them (see coupled_scheduler.py), picks every timestep (fixed, or adaptive,
+see coupled_timestep.py) and uplifts the core nodes after every step. The
+driver and the sweep both step the model through
+:meth:`CoupledModel.steps`, so they run exactly the same model.
+
+Everything the model carries from one step to the next outside the grid's
+fields (the model time and step, the model time pending for sub-cycled
+processes, the timestep controller and the incremental flow router) comes
+out of :meth:`CoupledModel.get_state` and goes back in with
+:meth:`CoupledModel.set_state`. Saved with a checkpoint (see
+coupled_checkpoint.py), it lets a restarted run take the same path as an
+uninterrupted one.
+"""
+from __future__ import print_function
+
+import numpy as np
+
+from landlab import RasterModelGrid, ModelParameterDictionary
+
+from coupled_timestep import StabilityTimestepController
+from coupled_scheduler import ProcessScheduler
+
+from driver_tools.incremental_routing import IncrementalFlowRouter
+from driver_tools.components import components
+
+
+def build_grid(inputs):
+    """Build the initial grid described by a parameter dictionary."""
+    nrows = inputs.read_int('nrows')
+    ncols = inputs.read_int('ncols')
+    dx = inputs.read_float('dx')
+    leftmost_elev = inputs.read_float('leftmost_elevation')
+    initial_slope = inputs.read_float('initial_slope')
+
+    mg = RasterModelGrid(nrows, ncols, dx)
+
+    #create the elevation field, and put a slope plus roughness into it
+    mg.create_node_array_zeros('topographic__elevation')
+    z = mg.create_node_array_zeros() + leftmost_elev
+    z += initial_slope*np.amax(mg.node_y) - initial_slope*mg.node_y
+    mg.at_node['topographic__elevation'] = z + np.random.rand(len(z))/100000.
+
+    #set up grid's boundary conditions (bottom, right, top, left is inactive)
+    mg.set_closed_boundaries_at_grid_edges(False, True, False, True)
+
+    return mg
+
+
+class CoupledModel(object):
+    """
+    The coupled model on a grid, set up from a parameter file.
+
+    Parameters
+    ----------
+    grid : RasterModelGrid
+        The grid to evolve.
+    input_file : str
+        The parameter file (see coupled_params.txt).
+    profiler : Profiler, optional
+        If given, the components' calls are timed with it.
+    """
+
+    def __init__(self, grid, input_file, profiler=None):
+        inputs = ModelParameterDictionary(input_file)
+        self._grid = grid
+        self.uplift_rate = inputs.read_float('uplift_rate')
+        self.dt = inputs.read_float('dt')
+        runtime = inputs.read_float('total_time')
+        self.incremental_routing = inputs.read_bool('incremental_routing',
+                                                    False)
+
+        #the components are imported here, on first use, so the ones a run
+        #does not use are never imported (see driver_tools/components.py)
+        if self.incremental_routing:
+            self.fr = IncrementalFlowRouter(grid)
+        else:
+            self.fr = components.create('FlowRouter', grid)
+        self.sp = components.create('FastscapeEroder', grid, input_file)
+        self.lin_diffuse = components.create('LinearDiffuser', grid=grid,
+                                             input_stream=input_file)
+        if profiler is not None:
+            profiler.wrap(self.fr, 'route_flow')
+            profiler.wrap(self.sp, 'erode')
+            profiler.wrap(self.lin_diffuse, 'diffuse')
+
+        #each process runs at its own cadence, and sub-cycled ones are
+        #handed all the time elapsed since they last ran
+        #note the input arguments here are not totally standardized between
+        #modules
+        self.scheduler = ProcessScheduler(grid)
+        self.scheduler.add_process(
+            'diffuse', self.lin_diffuse.diffuse,
+            every=inputs.read_int('diffuse_every', 1))
+        #to diffuse nonlinearly instead, make a PerronNLDiffuse and schedule
+        #it:
+        #diffuse = components.create('PerronNLDiffuse', grid, input_file)
+        #self.scheduler.add_process(
+        #    'nl_diffuse', lambda dt: diffuse.diffuse(grid, self.time))
+        self.scheduler.add_process(
+            'route_flow', self.fr.route_flow,
+            every=inputs.read_int('route_flow_every', 1),
+            dz_threshold=inputs.read_float('route_flow_dz_threshold', 0.),
+            takes_dt=False)
+        self.scheduler.add_process('erode',
+                                   lambda dt: self.sp.erode(grid, dt))
+
+        #with a fixed dt we stop after a whole number of steps; with an
+        #adaptive dt, the controller picks each step, and lands the last one
+        #exactly on the run time
+        if inputs.read_bool('adaptive_dt', False):
+            self.end_time = runtime
+            self.dt_control = StabilityTimestepController(
+                grid, inputs.read_float('linear_diffusivity'),
+                inputs.read_float('K_sp'), inputs.read_float('m_sp'),
+                inputs.read_float('n_sp'), dt_init=self.dt,
+                dt_max=inputs.read_float('dt_max', 10.*self.dt),
+                dt_min=inputs.read_float('dt_min', 0.),
+                max_courant_number=inputs.read_float('max_courant_number',
+                                                     0.))
+        else:
+            self.end_time = int(runtime//self.dt)*self.dt
+            self.dt_control = None
+
+        self.step = 0
+        self.time = 0.
+
+    def steps(self):
+        """Run the model to the end, one step at a time.
+
+        Yields
+        ------
+        tuple of (int, float)
+            Index of the step just completed and the model time after it.
+        """
+        mg = self._grid
+        while self.end_time - self.time > 1.e-9*self.end_time:
+            if self.dt_control is not None:
+                self.dt = self.dt_control.next_timestep(self.end_time -
+                                                        self.time)
+            self.scheduler.run_step(self.dt)
+            mg.at_node['topographic__elevation'][mg.core_nodes] += (
+                self.uplift_rate*self.dt)
+            self.time += self.dt
+            self.step += 1
+            yield (self.step - 1, self.time)
+
+    def finish(self):
+        """Run the processes that still have model time pending."""
+        self.scheduler.flush()
+
+    def get_state(self):
+        """The state of the model outside the grid, for a checkpoint."""
+        state = {'step': self.step,
+                 'time': self.time,
+                 'dt': self.dt,
+                 'scheduler': self.scheduler.get_state()}
+        if self.dt_control is not None:
+            state['timestep'] = self.dt_control.get_state()
+        if self.incremental_routing:
+            state['router'] = self.fr.get_state()
+        return state
+
+    def set_state(self, state):
+        """Restore the state saved by :meth:`get_state`.
+
+        The grid's fields are restored separately, with the checkpoint.
+        """
+        self.step = int(state['step'])
+        self.time = state['time']
+        self.dt = state['dt']
+        self.scheduler.set_state(state['scheduler'])
+        if self.dt_control is not None:
+            self.dt_control.set_state(state['timestep'])
+        if self.incremental_routing:
+            self.fr.set_state(state['router'])
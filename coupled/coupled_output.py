@@ -0,0 +1,194 @@
+#! /usr/env/python
+"""
+coupled_output.py: decimated, asynchronous output stage for coupled_driver.py.
+
+The solver loop only ever copies a handful of node arrays into a bounded
+queue; writing them to disk (and, optionally, extracting and plotting the
+channel long profiles) happens in a background thread or process.  The loop
+therefore never blocks on matplotlib or on the channel profile extraction.
+
+Each snapshot is written to ``<output_dir>/snapshot_<step>.npz``.  If profile
+plotting is switched on, ``<output_dir>/profiles_<step>.png`` is also drawn,
+using the Agg backend so that no GUI is needed.
+
+If the writer fails, it sends its traceback back to the solver, and the next
+call to :meth:`ProfileOutputStage.update` or
+:meth:`ProfileOutputStage.finalize` raises it. The solver never waits on a
+full queue that a dead writer will not empty.
+"""
+from __future__ import print_function
+
+import os
+import threading
+import traceback
+import multiprocessing
+try:
+    import queue
+except ImportError:  # Python 2
+    import Queue as queue
+
+#: Seconds between checks on the writer while waiting for room in the queue.
+POLL_INTERVAL = 1.
+
+
+#: Fields copied out of the grid at every output step.
+SNAPSHOT_FIELDS = ('topographic__elevation', 'drainage_area', 'flow_receiver')
+
+#: Extra fields needed to rebuild the channel profiles.
+PROFILE_FIELDS = ('topographic__steepest_slope', 'links_to_flow_receiver')
+
+
+class ProfileOutputStage(object):
+    """
+    Copy model state out of the solver loop and write it in the background.
+
+    Parameters
+    ----------
+    grid : ModelGrid
+        The grid being evolved by the driver.
+    interval : int, optional
+        Write a snapshot every *interval* loop iterations.
+    output_dir : str, optional
+        Directory that receives the snapshot files.
+    plot_profiles : bool, optional
+        If True, also extract and plot the channel long profiles for each
+        snapshot. Off by default, as it is by far the most expensive part.
+    use_process : bool, optional
+        Run the writer in a separate process rather than a thread. Useful
+        when profile plotting is on, as it then no longer competes with the
+        solver for the GIL.
+    max_pending : int, optional
+        Maximum number of snapshots waiting to be written. The solver only
+        waits if the writer falls this far behind.
+    """
+
+    def __init__(self, grid, interval=10, output_dir='output',
+                 plot_profiles=False, use_process=False, max_pending=4):
+        self._grid = grid
+        self._interval = max(int(interval), 1)
+        self._fields = SNAPSHOT_FIELDS
+        if plot_profiles:
+            self._fields = self._fields + PROFILE_FIELDS
+
+        if not os.path.isdir(output_dir):
+            os.makedirs(output_dir)
+
+        if use_process:
+            self._queue = multiprocessing.Queue(max_pending)
+            self._errors = multiprocessing.Queue()
+            worker = multiprocessing.Process
+        else:
+            self._queue = queue.Queue(max_pending)
+            self._errors = queue.Queue()
+            worker = threading.Thread
+        self._worker = worker(target=_write_snapshots,
+                              args=(self._queue, self._errors, grid,
+                                    output_dir, plot_profiles))
+        self._worker.daemon = True
+        self._worker.start()
+
+    def _check_writer(self):
+        """Raise the writer's error, if it has stopped."""
+        try:
+            error = self._errors.get_nowait()
+        except queue.Empty:
+            if self._worker.is_alive():
+                return
+            try:
+                # The error may still be on its way from a writer process
+                error = self._errors.get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                error = 'The writer stopped without reporting an error.'
+        raise RuntimeError('output writer failed:\n' + error)
+
+    def _put(self, item):
+        """Queue *item*, waiting for room only while the writer runs."""
+        while True:
+            self._check_writer()
+            try:
+                self._queue.put(item, timeout=POLL_INTERVAL)
+                return
+            except queue.Full:
+                pass
+
+    @property
+    def interval(self):
+        """Number of loop iterations between snapshots."""
+        return self._interval
+
+    def update(self, step, elapsed_time):
+        """Queue a copy of the current state if *step* is an output step.
+
+        Parameters
+        ----------
+        step : int
+            Index of the loop iteration just completed.
+        elapsed_time : float
+            Model time at the end of that iteration.
+        """
+        if (step + 1) % self._interval != 0:
+            return
+        snapshot = {}
+        for name in self._fields:
+            if name in self._grid.at_node:
+                snapshot[name] = self._grid.at_node[name].copy()
+        self._put((step, elapsed_time, snapshot))
+
+    def finalize(self):
+        """Flush all pending snapshots and stop the writer."""
+        self._put(None)
+        self._worker.join()
+        try:
+            error = self._errors.get_nowait()
+        except queue.Empty:
+            return
+        raise RuntimeError('output writer failed:\n' + error)
+
+
+def _write_snapshots(snapshots, errors, grid, output_dir, plot_profiles):
+    """Writer loop run in the background thread or process."""
+    import numpy as np
+
+    try:
+        while True:
+            item = snapshots.get()
+            if item is None:
+                break
+            (step, elapsed_time, fields) = item
+            np.savez(os.path.join(output_dir, 'snapshot_%08d.npz' % step),
+                     step=step, time=elapsed_time, **fields)
+            if plot_profiles:
+                _plot_profiles(grid, fields,
+                               os.path.join(output_dir,
+                                            'profiles_%08d.png' % step),
+                               elapsed_time)
+    except Exception:
+        errors.put(traceback.format_exc())
+
+
+def _plot_profiles(grid, fields, filename, elapsed_time):
+    """Extract the channel long profiles from *fields* and save a plot.
+
+    This draws on its own Agg figure rather than through pylab, so it is
+    safe to call away from the main thread.
+    """
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from landlab.plot import channel_profile as prf
+
+    slopes = fields['topographic__steepest_slope']
+    profile_IDs = prf.channel_nodes(grid, slopes, fields['drainage_area'],
+                                    fields['flow_receiver'])
+    dists_upstr = prf.get_distances_upstream(
+        grid, len(slopes), profile_IDs, fields['links_to_flow_receiver'])
+
+    elev = fields['topographic__elevation']
+    fig = Figure()
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot(111)
+    for (dists, nodes) in zip(dists_upstr, profile_IDs):
+        ax.plot(dists, elev[nodes])
+    ax.set_xlabel('Distance upstream')
+    ax.set_ylabel('Elevation')
+    ax.set_title('Channel profiles at t = %g' % elapsed_time)
+    fig.savefig(filename)
@@ -0,0 +1,170 @@
+#! /usr/env/python
+"""
+coupled_scheduler.py: operator-splitting scheduler for coupled_driver.py.
+
+Each process added to the scheduler runs at its own cadence, rather than in
+lockstep with every other process:
+
+*  ``every=N`` runs the process on every Nth model step;
+*  ``dz_threshold=h`` also runs it as soon as the elevation of any core node
+   has changed by more than *h* since the last time it ran. To run a
+   process *only* on elevation change, combine this with a large *every*,
+   which then acts as the longest interval between runs.
+
+Processes that take a timestep are handed the model time accumulated since
+they last ran, so a sub-cycled process still covers the full run time. The
+scheduler times every call, and at the end of the run it estimates the wall
+time saved by the calls it skipped.
+
+The model time pending for every process, and the rest of its cadence, are
+part of the model's state: :meth:`ProcessScheduler.get_state` and
+:meth:`ProcessScheduler.set_state` carry them through a checkpoint.
+"""
+from __future__ import print_function
+
+import time
+
+import numpy as np
+
+
+class _ScheduledProcess(object):
+
+    def __init__(self, name, func, every, dz_threshold, takes_dt):
+        self.name = name
+        self.func = func
+        self.every = max(int(every), 1)
+        self.dz_threshold = dz_threshold
+        self.takes_dt = takes_dt
+        self.steps_since_run = self.every
+        self.pending_dt = 0.
+        self.z_at_last_run = None
+        self.n_calls = 0
+        self.n_skipped = 0
+        self.wall_time = 0.
+
+
+class ProcessScheduler(object):
+    """
+    Run model processes at independent cadences.
+
+    Parameters
+    ----------
+    grid : ModelGrid
+        The grid being evolved; its ``topographic__elevation`` field is
+        used for elevation change thresholds.
+    """
+
+    def __init__(self, grid):
+        self._grid = grid
+        self._processes = []
+
+    def add_process(self, name, func, every=1, dz_threshold=0.,
+                    takes_dt=True):
+        """Add a process; processes run in the order they are added.
+
+        Parameters
+        ----------
+        name : str
+            Name used in the report.
+        func : callable
+            Called as ``func(dt)`` if *takes_dt*, otherwise as ``func()``.
+        every : int, optional
+            Run the process at least every this many steps.
+        dz_threshold : float, optional
+            If positive, also run the process once the largest change in
+            core node elevation since its last run reaches this value.
+        takes_dt : bool, optional
+            Whether *func* takes the (accumulated) timestep.
+        """
+        self._processes.append(
+            _ScheduledProcess(name, func, every, dz_threshold, takes_dt))
+
+    def _is_due(self, process):
+        if process.steps_since_run >= process.every:
+            return True
+        if process.dz_threshold > 0. and process.z_at_last_run is not None:
+            core = self._grid.core_nodes
+            z = self._grid.at_node['topographic__elevation'][core]
+            dz = np.amax(np.abs(z - process.z_at_last_run))
+            return dz >= process.dz_threshold
+        return False
+
+    def _run(self, process):
+        start = time.time()
+        if process.takes_dt:
+            process.func(process.pending_dt)
+        else:
+            process.func()
+        process.wall_time += time.time() - start
+        process.n_calls += 1
+        process.steps_since_run = 0
+        process.pending_dt = 0.
+        if process.dz_threshold > 0.:
+            core = self._grid.core_nodes
+            process.z_at_last_run = (
+                self._grid.at_node['topographic__elevation'][core].copy())
+
+    def get_state(self):
+        """The cadence of every process, by name, for a checkpoint."""
+        state = {}
+        for process in self._processes:
+            state[process.name] = {
+                'steps_since_run': process.steps_since_run,
+                'pending_dt': process.pending_dt,
+                'z_at_last_run': process.z_at_last_run,
+                'n_calls': process.n_calls,
+                'n_skipped': process.n_skipped,
+                'wall_time': process.wall_time,
+            }
+        return state
+
+    def set_state(self, state):
+        """Restore the cadence of every process from :meth:`get_state`."""
+        for process in self._processes:
+            saved = state[process.name]
+            process.steps_since_run = int(saved['steps_since_run'])
+            process.pending_dt = saved['pending_dt']
+            if saved['z_at_last_run'] is None:
+                process.z_at_last_run = None
+            else:
+                process.z_at_last_run = np.array(saved['z_at_last_run'])
+            process.n_calls = int(saved['n_calls'])
+            process.n_skipped = int(saved['n_skipped'])
+            process.wall_time = saved['wall_time']
+
+    def run_step(self, dt):
+        """Advance every process by one model step of length *dt*."""
+        for process in self._processes:
+            process.steps_since_run += 1
+            process.pending_dt += dt
+            if self._is_due(process):
+                self._run(process)
+            else:
+                process.n_skipped += 1
+
+    def flush(self):
+        """Run every process that still has model time pending.
+
+        Call this at the end of the run, so that sub-cycled processes cover
+        the whole run time.
+        """
+        for process in self._processes:
+            if process.takes_dt and process.pending_dt > 0.:
+                self._run(process)
+
+    def report(self):
+        """Calls, skips and wall time per process, as a printable string."""
+        lines = ['%-12s %8s %8s %12s %14s' % ('process', 'calls', 'skipped',
+                                              'wall time', 'est. saved')]
+        total_saved = 0.
+        for process in self._processes:
+            if process.n_calls > 0:
+                saved = process.n_skipped * process.wall_time / process.n_calls
+            else:
+                saved = 0.
+            total_saved += saved
+            lines.append('%-12s %8d %8d %11.2fs %13.2fs' % (
+                process.name, process.n_calls, process.n_skipped,
+                process.wall_time, saved))
+        lines.append('Estimated wall time saved: %.2f s' % total_saved)
+        return '\n'.join(lines)
@@ -0,0 +1,223 @@
+#! /usr/bin/env python
+"""
+coupled_sweep.py: run the coupled diffusion/stream power model over a table
+of parameter values.
+
+The sweep table is a whitespace-delimited text file whose header line names
+the parameters to vary, for instance::
+
+    # K_sp  m_sp  uplift_rate  linear_diffusivity
+    0.3     0.5   0.001        0.0001
+    0.2     0.5   0.001        0.0001
+
+Any parameter not in the table is taken from the base parameter file
+(coupled_params.txt by default). Swept values are written into each
+member's parameter file in the form of the base file's value for the same
+parameter, so a parameter read as an integer (``diffuse_every``, say) gets
+an integer even if the table gives ``2.0``; a column of integers is kept as
+integers for parameters the base file does not set.
+
+The grid, its initial topography and its boundary conditions are built once,
+in the parent process, before the worker pool is started. The workers are
+forked from the parent and never rebuild it. Each member runs on a fresh copy
+of that template grid, so that no field left over by the member a worker ran
+before can change its result, whichever worker the pool gives it to. Members
+run the same model as coupled_driver.py, through
+:class:`~coupled_model.CoupledModel`, with its scheduling and timestep
+options. All results are gathered into a single .npz file with one array per
+column: the member index, every swept parameter, summary statistics of the
+final topography, and the final elevation field of every member (one row
+per member).
+"""
+from __future__ import print_function
+
+import os
+import sys
+import copy
+import shutil
+import tempfile
+import multiprocessing
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir))
+from landlab import ModelParameterDictionary
+
+from coupled_model import CoupledModel, build_grid
+
+
+#: Set in the parent before the pool is forked; read by the workers.
+_TEMPLATE = {}
+
+
+def read_sweep_table(filename):
+    """Read a sweep table into a dict of column name -> array of values.
+
+    Columns of integers are read as integers, and all others as floats.
+    """
+    with open(filename, 'r') as fp:
+        header = fp.readline().lstrip('#').split()
+    values = np.loadtxt(filename, ndmin=2, dtype=str)
+    if values.shape[1] != len(header):
+        raise ValueError('%s: header names %d columns but rows have %d' %
+                         (filename, len(header), values.shape[1]))
+    table = {}
+    for (col, name) in enumerate(header):
+        try:
+            table[name] = np.array([int(value) for value in values[:, col]])
+        except ValueError:
+            table[name] = values[:, col].astype(float)
+    return table
+
+
+def format_value(value, template=None):
+    """Format a swept value for a parameter file.
+
+    Parameters
+    ----------
+    value : int, float or bool
+        The value.
+    template : str, optional
+        The base file's value for the same parameter, whose form (integer,
+        boolean or float) the value is given.
+
+    Returns
+    -------
+    str
+        The value, as it is written to the parameter file.
+    """
+    if template is not None:
+        template = str(template).strip()
+        if template in ('True', 'False'):
+            return str(bool(value))
+        try:
+            int(template)
+        except ValueError:
+            return repr(float(value))
+        if value != int(value):
+            raise ValueError('expected an integer, not %r' % (value, ))
+        return '%d' % value
+    if isinstance(value, (bool, np.bool_)):
+        return str(bool(value))
+    if isinstance(value, (int, np.integer)):
+        return '%d' % value
+    return repr(float(value))
+
+
+def write_params(filename, params):
+    """Write a dict of parameters in ModelParameterDictionary format."""
+    with open(filename, 'w') as fp:
+        for key in sorted(params):
+            fp.write('%s:\n%s\n' % (key, params[key]))
+
+
+def _run_member(args):
+    """Run one member of the sweep on a copy of the inherited template."""
+    (member, overrides) = args
+    params = dict(_TEMPLATE['params'])
+    params.update((key, format_value(value, params.get(key)))
+                  for (key, value) in overrides.items())
+    input_file = os.path.join(_TEMPLATE['param_dir'],
+                              'member_%06d.txt' % member)
+    write_params(input_file, params)
+
+    # Start from the initial state, on a grid of the member's own: the
+    # components add their fields to it, and these must not carry over to
+    # the next member this worker runs.
+    mg = copy.deepcopy(_TEMPLATE['grid'])
+
+    model = CoupledModel(mg, input_file)
+    for _ in model.steps():
+        pass
+    model.finish()
+
+    z = mg.at_node['topographic__elevation']
+    return (member, z.copy(), mg.at_node['drainage_area'].copy())
+
+
+def run_sweep(base_file, table, n_procs=1):
+    """Run every member of a sweep.
+
+    Parameters
+    ----------
+    base_file : str
+        Parameter file providing every value not in the sweep table.
+    table : dict
+        Column name -> values, as returned by :func:`read_sweep_table`.
+    n_procs : int, optional
+        Number of worker processes.
+
+    Returns
+    -------
+    dict
+        Column name -> array of results, ready to pass to ``np.savez``.
+    """
+    inputs = ModelParameterDictionary(base_file)
+    n_members = len(list(table.values())[0])
+
+    _TEMPLATE['grid'] = build_grid(inputs)
+    _TEMPLATE['params'] = dict((key, str(inputs[key])) for key in inputs)
+    _TEMPLATE['param_dir'] = tempfile.mkdtemp(prefix='coupled_sweep_')
+
+    table = dict((name, np.asarray(values)) for (name, values) in
+                 table.items())
+    members = [(member, dict((name, table[name][member].item())
+                             for name in table))
+               for member in range(n_members)]
+
+    mg = _TEMPLATE['grid']
+    core = mg.core_nodes
+    results = dict((name, np.asarray(table[name])) for name in table)
+    results['member'] = np.arange(n_members)
+    results['topographic__elevation'] = np.empty((n_members,
+                                                  mg.number_of_nodes))
+    results['mean_elevation'] = np.empty(n_members)
+    results['max_elevation'] = np.empty(n_members)
+    results['relief'] = np.empty(n_members)
+    results['max_drainage_area'] = np.empty(n_members)
+
+    try:
+        context = multiprocessing.get_context('fork')
+    except AttributeError:  # Python 2 always forks
+        context = multiprocessing
+    pool = context.Pool(n_procs)
+    try:
+        for (member, z, area) in pool.imap_unordered(_run_member, members):
+            results['topographic__elevation'][member] = z
+            results['mean_elevation'][member] = np.mean(z[core])
+            results['max_elevation'][member] = np.amax(z[core])
+            results['relief'][member] = np.amax(z[core]) - np.amin(z)
+            results['max_drainage_area'][member] = np.amax(area)
+            print('Completed member ', member)
+    finally:
+        pool.close()
+        pool.join()
+        shutil.rmtree(_TEMPLATE['param_dir'])
+
+    return results
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Run the coupled model over a table of parameters')
+    parser.add_argument('table', help='Sweep table (see module docstring)')
+    parser.add_argument('--params', default='./coupled_params.txt',
+                        help='Base parameter file')
+    parser.add_argument('--n-procs', type=int, default=1,
+                        help='Number of processors to use')
+    parser.add_argument('--output', default='sweep_results.npz',
+                        help='Name of the output file')
+
+    args = parser.parse_args()
+
+    results = run_sweep(args.params, read_sweep_table(args.table),
+                        n_procs=args.n_procs)
+    np.savez(args.output, **results)
+    print('Wrote ', args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+#! /usr/env/python
+"""
+coupled_timestep.py: adaptive, stability-aware timestep control for
+coupled_driver.py.
+
+Before every iteration the controller estimates a timestep limit for each
+process from the current state of the grid:
+
+*  linear diffusion is explicit, so its step is held below the diffusive
+   stability limit, ``diffusive_factor * dx**2 / D``;
+*  stream power erosion travels upstream as a kinematic wave with celerity
+   ``K * A**m * S**(n - 1)``. The controller tracks the corresponding Courant
+   number ``celerity * dt / dx`` every step. FastscapeEroder is implicit, so
+   a Courant number above one does not make it unstable and the limit is
+   only enforced if ``max_courant_number`` is set;
+*  the step may grow by at most ``growth_factor`` from one iteration to the
+   next, and never beyond ``dt_max``.
+
+The largest step satisfying all of these is used. The controller records
+the step, the process that limited it and the Courant number of every
+iteration, so the evolution of the step size can be reported after the run.
+The current step and that record are restored from a checkpoint with
+:meth:`StabilityTimestepController.set_state`, so that a restarted run grows
+its step from where it left off.
+"""
+from __future__ import print_function
+
+import numpy as np
+
+
+class StabilityTimestepController(object):
+    """
+    Choose the largest stable global timestep for the coupled model.
+
+    Parameters
+    ----------
+    grid : RasterModelGrid
+        The grid being evolved.
+    linear_diffusivity : float
+        Hillslope diffusivity, D.
+    K_sp, m_sp, n_sp : float
+        Stream power coefficient and exponents.
+    dt_init : float
+        Step used for the first iteration.
+    dt_max : float
+        Largest step ever allowed.
+    dt_min : float, optional
+        Smallest step ever used (other than to land exactly at the end of
+        the run).
+    diffusive_factor : float, optional
+        Safety factor applied to the diffusive limit dx**2 / D.
+    max_courant_number : float, optional
+        Largest stream power Courant number allowed. Zero (the default)
+        means the Courant number is only recorded.
+    growth_factor : float, optional
+        Largest ratio between consecutive steps.
+    """
+
+    def __init__(self, grid, linear_diffusivity, K_sp, m_sp, n_sp=1.,
+                 dt_init=1., dt_max=np.inf, dt_min=0., diffusive_factor=0.2,
+                 max_courant_number=0., growth_factor=1.2):
+        self._grid = grid
+        self._K = K_sp
+        self._m = m_sp
+        self._n = n_sp
+        self._dt_max = dt_max
+        self._dt_min = dt_min
+        self._max_courant = max_courant_number
+        self._growth_factor = growth_factor
+        if linear_diffusivity > 0.:
+            self._dt_diffusion = (diffusive_factor * grid.dx ** 2 /
+                                  linear_diffusivity)
+        else:
+            self._dt_diffusion = np.inf
+
+        self.dt = min(dt_init, self._dt_diffusion, dt_max)
+        self._first_step = True
+        self._dts = []
+        self._courant_numbers = []
+        self._limited_by = []
+
+    def _courant_rate(self):
+        """Largest stream power celerity divided by the node spacing."""
+        at_node = self._grid.at_node
+        if 'drainage_area' not in at_node:
+            return 0.
+        core = self._grid.core_nodes
+        celerity = self._K * at_node['drainage_area'][core] ** self._m
+        if self._n != 1.:
+            slope = at_node['topographic__steepest_slope'][core]
+            celerity *= slope ** (self._n - 1.)
+        return np.amax(celerity) / self._grid.dx
+
+    def next_timestep(self, time_remaining):
+        """Choose the step for the next iteration.
+
+        Parameters
+        ----------
+        time_remaining : float
+            Model time left until the end of the run; the step never
+            overshoots it.
+
+        Returns
+        -------
+        float
+            The timestep to use.
+        """
+        courant_rate = self._courant_rate()
+
+        if self._first_step:
+            limits = {'initial': self.dt}
+            self._first_step = False
+        else:
+            limits = {'growth': self.dt * self._growth_factor,
+                      'maximum': self._dt_max}
+        limits['diffusion'] = self._dt_diffusion
+        if self._max_courant > 0. and courant_rate > 0.:
+            limits['stream power'] = self._max_courant / courant_rate
+
+        limited_by = min(limits, key=limits.get)
+        dt = max(limits[limited_by], self._dt_min)
+        if dt >= time_remaining:
+            (dt, limited_by) = (time_remaining, 'end of run')
+        else:
+            self.dt = dt
+
+        self._dts.append(dt)
+        self._courant_numbers.append(courant_rate * dt)
+        self._limited_by.append(limited_by)
+        return dt
+
+    def get_state(self):
+        """The current step and the record so far, for a checkpoint."""
+        return {'dt': self.dt,
+                'first_step': self._first_step,
+                'dts': np.array(self._dts),
+                'courant_numbers': np.array(self._courant_numbers),
+                'limited_by': list(self._limited_by)}
+
+    def set_state(self, state):
+        """Restore the step and the record from :meth:`get_state`."""
+        self.dt = state['dt']
+        self._first_step = bool(state['first_step'])
+        self._dts = np.asarray(state['dts']).tolist()
+        self._courant_numbers = np.asarray(state['courant_numbers']).tolist()
+        self._limited_by = [str(name) for name in state['limited_by']]
+
+    @property
+    def history(self):
+        """Step, Courant number and limiting process of every iteration."""
+        return {'dt': np.array(self._dts),
+                'courant_number': np.array(self._courant_numbers),
+                'limited_by': np.array(self._limited_by)}
+
+    def report(self):
+        """Summarize how the step size evolved, as a printable string."""
+        dts = np.array(self._dts)
+        if len(dts) == 0:
+            return 'No steps taken.'
+        lines = ['Steps taken: %d' % len(dts),
+                 'Timestep min / mean / max: %g / %g / %g' % (
+                     dts.min(), dts.mean(), dts.max()),
+                 'Largest stream power Courant number: %g' % max(
+                     self._courant_numbers),
+                 'Steps limited by:']
+        for process in sorted(set(self._limited_by)):
+            lines.append('    %-14s %d' % (process,
+                                           self._limited_by.count(process)))
+        return '\n'.join(lines)
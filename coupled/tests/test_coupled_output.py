@@ -0,0 +1,53 @@
+"""
+The output stage must raise the errors of its writer, not hang on them.
+"""
+import os
+import sys
+import shutil
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir))
+
+from coupled_output import ProfileOutputStage
+
+
+class _Grid(object):
+
+    def __init__(self, n_nodes=16):
+        self.at_node = {'topographic__elevation': np.arange(n_nodes, 0, -1.)}
+
+
+@pytest.mark.parametrize('use_process', [False, True])
+def test_writes_snapshots(tmpdir, use_process):
+    output = ProfileOutputStage(_Grid(), interval=2, output_dir=str(tmpdir),
+                                use_process=use_process)
+    for step in range(6):
+        output.update(step, 0.5 * (step + 1))
+    output.finalize()
+
+    assert sorted(os.listdir(str(tmpdir))) == [
+        'snapshot_00000001.npz', 'snapshot_00000003.npz',
+        'snapshot_00000005.npz']
+    snapshot = np.load(str(tmpdir.join('snapshot_00000003.npz')))
+    assert snapshot['time'] == 2.
+    np.testing.assert_array_equal(snapshot['topographic__elevation'],
+                                  np.arange(16, 0, -1.))
+
+
+@pytest.mark.parametrize('use_process', [False, True])
+def test_raises_writer_error(tmpdir, use_process):
+    output_dir = str(tmpdir.join('output'))
+    output = ProfileOutputStage(_Grid(), interval=1, output_dir=output_dir,
+                                use_process=use_process, max_pending=1)
+    # Writing the snapshots now fails, and stops the writer
+    shutil.rmtree(output_dir)
+
+    with pytest.raises(RuntimeError) as error:
+        for step in range(100):
+            output.update(step, float(step))
+        output.finalize()
+    assert 'output writer failed' in str(error.value)
+    assert 'snapshot_00000000.npz' in str(error.value)
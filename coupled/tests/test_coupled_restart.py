@@ -0,0 +1,155 @@
+"""
+A run restarted from a checkpoint must take the same path as an
+uninterrupted one.
+"""
+import os
+import sys
+
+import numpy as np
+import pytest
+
+COUPLED_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           os.pardir)
+sys.path.insert(0, os.path.join(COUPLED_DIR, os.pardir))
+sys.path.insert(0, COUPLED_DIR)
+
+from coupled_checkpoint import save_checkpoint, restore_checkpoint
+from coupled_scheduler import ProcessScheduler
+from coupled_timestep import StabilityTimestepController
+
+
+class _Grid(object):
+
+    """The little of a raster grid the scheduler and checkpoints use."""
+
+    def __init__(self, n_nodes=12):
+        self.shape = (3, n_nodes // 3)
+        self.dx = 1.
+        self.core_nodes = np.arange(1, n_nodes - 1)
+        self.status_at_node = np.zeros(n_nodes, dtype=int)
+        self.at_node = {'topographic__elevation': np.linspace(1., 2.,
+                                                              n_nodes)}
+
+
+class _Processes(object):
+
+    """A sub-cycled and a threshold-triggered process on a grid."""
+
+    def __init__(self, grid):
+        self.grid = grid
+        self.calls = []
+        self.scheduler = ProcessScheduler(grid)
+        self.scheduler.add_process('lower', self.lower, every=3)
+        self.scheduler.add_process('count', self.count, every=50,
+                                   dz_threshold=0.05, takes_dt=False)
+        self.dt_control = StabilityTimestepController(
+            grid, 0.5, 0., 0.5, dt_init=0.01, dt_max=0.5, growth_factor=1.3)
+        self.time = 0.
+
+    def lower(self, dt):
+        self.calls.append(('lower', dt))
+        self.grid.at_node['topographic__elevation'][self.grid.core_nodes] \
+            -= 0.1 * dt
+
+    def count(self):
+        self.calls.append(('count', self.time))
+
+    def run(self, n_steps):
+        for _ in range(n_steps):
+            dt = self.dt_control.next_timestep(100.)
+            self.scheduler.run_step(dt)
+            self.time += dt
+
+    def get_state(self):
+        return {'time': self.time,
+                'scheduler': self.scheduler.get_state(),
+                'timestep': self.dt_control.get_state()}
+
+    def set_state(self, state):
+        self.time = state['time']
+        self.scheduler.set_state(state['scheduler'])
+        self.dt_control.set_state(state['timestep'])
+
+
+def test_scheduler_and_timestep_survive_restart(tmpdir):
+    uninterrupted = _Processes(_Grid())
+    uninterrupted.run(40)
+
+    first = _Processes(_Grid())
+    first.run(17)
+    save_checkpoint(first.grid, str(tmpdir), 16, state=first.get_state())
+
+    second = _Processes(_Grid())
+    checkpoint = restore_checkpoint(
+        second.grid, os.path.join(str(tmpdir), 'checkpoint_00000016'))
+    second.set_state(checkpoint['state'])
+    second.run(23)
+
+    assert first.calls + second.calls == uninterrupted.calls
+    assert second.time == uninterrupted.time
+    np.testing.assert_array_equal(
+        second.grid.at_node['topographic__elevation'],
+        uninterrupted.grid.at_node['topographic__elevation'])
+    for (name, values) in uninterrupted.dt_control.history.items():
+        np.testing.assert_array_equal(second.dt_control.history[name],
+                                      values)
+
+
+_PARAMS = {
+    'nrows': 20, 'ncols': 20, 'dx': 0.02, 'leftmost_elevation': 1.,
+    'initial_slope': 0., 'dt': 0.1, 'total_time': 6., 'uplift_rate': 0.001,
+    'K_sp': 0.3, 'm_sp': 0.5, 'n_sp': 1., 'rock_density': 2.7,
+    'sed_density': 2.7, 'kappa': 0.0001, 'S_crit': 0.56,
+    'linear_diffusivity': 0.0001, 'adaptive_dt': 'True', 'dt_max': 1.,
+    'dt_min': 0., 'max_courant_number': 0., 'diffuse_every': 3,
+    'route_flow_every': 4, 'route_flow_dz_threshold': 0.001,
+    'incremental_routing': 'True',
+}
+
+
+def _model(input_file):
+    from landlab import ModelParameterDictionary
+    from coupled_model import CoupledModel, build_grid
+
+    np.random.seed(0)
+    mg = build_grid(ModelParameterDictionary(input_file))
+    return (mg, CoupledModel(mg, input_file))
+
+
+def test_restarted_run_matches_uninterrupted(tmpdir):
+    pytest.importorskip('landlab')
+
+    input_file = str(tmpdir.join('params.txt'))
+    with open(input_file, 'w') as fp:
+        for key in sorted(_PARAMS):
+            fp.write('%s:\n%s\n' % (key, _PARAMS[key]))
+
+    (mg, model) = _model(input_file)
+    for _ in model.steps():
+        pass
+    model.finish()
+
+    checkpoint_dir = str(tmpdir.join('checkpoints'))
+    (first_mg, first) = _model(input_file)
+    for (i, _) in first.steps():
+        if i == 10:
+            save_checkpoint(first_mg, checkpoint_dir, i,
+                            state=first.get_state())
+            break
+
+    (restarted_mg, restarted) = _model(input_file)
+    checkpoint = restore_checkpoint(
+        restarted_mg, os.path.join(checkpoint_dir, 'checkpoint_00000010'))
+    restarted.set_state(checkpoint['state'])
+    for _ in restarted.steps():
+        pass
+    restarted.finish()
+
+    assert restarted.step == model.step
+    assert restarted.time == model.time
+    for name in ('topographic__elevation', 'drainage_area',
+                 'water__volume_flux', 'flow_receiver'):
+        np.testing.assert_array_equal(restarted_mg.at_node[name],
+                                      mg.at_node[name])
+    np.testing.assert_array_equal(restarted.dt_control.history['dt'],
+                                  model.dt_control.history['dt'])
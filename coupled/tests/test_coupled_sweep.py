@@ -0,0 +1,96 @@
+"""
+Swept values must reach each member's parameter file in the form the model
+reads them, integers included, and each member must match a run of the
+model on its own.
+"""
+import os
+import sys
+
+import numpy as np
+import pytest
+
+pytest.importorskip('landlab')
+
+COUPLED_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           os.pardir)
+sys.path.insert(0, os.path.join(COUPLED_DIR, os.pardir))
+sys.path.insert(0, COUPLED_DIR)
+
+from coupled_sweep import (read_sweep_table, format_value, write_params,
+                           run_sweep)
+
+_PARAMS = {
+    'nrows': 15, 'ncols': 15, 'dx': 0.02, 'leftmost_elevation': 1.,
+    'initial_slope': 0., 'dt': 0.1, 'total_time': 3., 'uplift_rate': 0.001,
+    'K_sp': 0.3, 'm_sp': 0.5, 'n_sp': 1., 'rock_density': 2.7,
+    'sed_density': 2.7, 'kappa': 0.0001, 'S_crit': 0.56,
+    'linear_diffusivity': 0.001, 'adaptive_dt': 'False', 'dt_max': 1.,
+    'dt_min': 0., 'max_courant_number': 0., 'diffuse_every': 1,
+    'route_flow_every': 1, 'route_flow_dz_threshold': 0.,
+    'incremental_routing': 'False',
+}
+
+
+def test_format_value():
+    assert format_value(3, '1') == '3'
+    assert format_value(3., '1') == '3'
+    assert format_value(np.float64(2.), '10') == '2'
+    with pytest.raises(ValueError):
+        format_value(2.5, '1')
+    assert format_value(1, 'False') == 'True'
+    assert format_value(0.3, '0.1') == repr(0.3)
+    assert format_value(3, '0.1') == '3.0'
+    assert format_value(np.int64(4)) == '4'
+    assert format_value(0.25) == '0.25'
+
+
+def test_read_sweep_table_keeps_integers(tmpdir):
+    table_file = tmpdir.join('table.txt')
+    table_file.write('# diffuse_every  K_sp  route_flow_every\n'
+                     '1  0.3  2.0\n'
+                     '3  0.2  4\n')
+    table = read_sweep_table(str(table_file))
+    assert table['diffuse_every'].dtype.kind == 'i'
+    np.testing.assert_array_equal(table['diffuse_every'], [1, 3])
+    assert table['K_sp'].dtype.kind == 'f'
+    assert table['route_flow_every'].dtype.kind == 'f'
+
+
+def _run_alone(base_file, overrides, param_file):
+    from landlab import ModelParameterDictionary
+    from coupled_model import CoupledModel, build_grid
+
+    params = dict((key, str(value)) for (key, value) in _PARAMS.items())
+    params.update(overrides)
+    write_params(param_file, params)
+    np.random.seed(0)
+    mg = build_grid(ModelParameterDictionary(param_file))
+    model = CoupledModel(mg, param_file)
+    for _ in model.steps():
+        pass
+    model.finish()
+    return np.array(mg.at_node['topographic__elevation'])
+
+
+def test_sweep_with_integer_parameter(tmpdir):
+    base_file = str(tmpdir.join('params.txt'))
+    write_params(base_file, _PARAMS)
+    table_file = tmpdir.join('table.txt')
+    # The second member gives the integer parameter as a float
+    table_file.write('# diffuse_every  route_flow_every\n'
+                     '1  1\n'
+                     '3.0  2\n')
+
+    np.random.seed(0)
+    results = run_sweep(base_file, read_sweep_table(str(table_file)))
+
+    np.testing.assert_array_equal(results['diffuse_every'], [1., 3.])
+    np.testing.assert_array_equal(results['route_flow_every'], [1, 2])
+    z = results['topographic__elevation']
+    assert not np.array_equal(z[0], z[1])
+    for (member, overrides) in enumerate(
+            ({'diffuse_every': '1', 'route_flow_every': '1'},
+             {'diffuse_every': '3', 'route_flow_every': '2'})):
+        alone = _run_alone(base_file, overrides,
+                           str(tmpdir.join('member_%d.txt' % member)))
+        np.testing.assert_array_equal(z[member], alone)
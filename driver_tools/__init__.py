@@ -0,0 +1,7 @@
+"""
+Tools shared by the drivers in this repository.
+
+The drivers are run as scripts from their own directories, so each one that
+uses these tools puts the top of the repository on ``sys.path`` before
+importing them.
+"""
@@ -0,0 +1,277 @@
+#! /usr/env/python
+"""
+active_domain_flow.py: de Almeida overland flow restricted to the wet domain.
+
+``OverlandFlow`` updates the discharge on every link and the depth at every
+node at every step. Through the long recession after a storm, though, only
+a narrow channel network carries any water, and almost all of that work goes
+on links whose discharge stays at zero.
+
+:class:`ActiveDomainOverlandFlow` uses the same scheme (de Almeida et al.,
+2012, as implemented by ``OverlandFlow``), and the same names for its state
+(``h``, ``q``, ``dt`` and ``rainfall_intensity``), so the drivers can use
+either one. Like ``OverlandFlow``, it keeps the water depth and discharge in
+the grid's ``water_depth`` node field and ``water_discharge`` link field.
+Given a *wet_depth*, it only updates
+
+*  the discharge on the links that have a wet node (one with a water depth
+   above *wet_depth*) at either end, and
+*  the depth at the core nodes at the ends of those links,
+
+plus the rainfall, which is added to every core node while it falls. The
+rainfall intensity may be a single value or an array with a value for every
+node. The set of wet nodes is kept up to date incrementally: only the nodes
+whose depth changed are checked, and only the links at nodes that changed
+state are added to or removed from the active set. A link that leaves the
+set has its discharge set to zero, so no water moves through the dry part
+of the grid.
+
+With ``wet_depth=None`` every active link and every core node is updated at
+every step. That is the full-grid solution that the active domain mode
+approximates; the two differ only by the water moved between nodes that are
+both shallower than *wet_depth*.
+
+Only links with an active status are ever updated, so fixed links keep their
+values, as with ``OverlandFlow(use_fixed_links=True)``.
+"""
+from __future__ import print_function
+
+import numpy as np
+
+
+ACTIVE_LINK = 0
+
+
+class ActiveDomainOverlandFlow(object):
+    """
+    de Almeida overland flow, optionally restricted to the wet domain.
+
+    Parameters
+    ----------
+    grid : RasterModelGrid
+        The grid; it must have ``topographic__elevation`` and
+        ``water_depth`` node fields. The discharge is kept in its
+        ``water_discharge`` link field, which is added if missing.
+    h_init : float, optional
+        Smallest water depth, in m.
+    alpha : float, optional
+        Time step coefficient.
+    mannings_n : float, optional
+        Manning's roughness coefficient.
+    g : float, optional
+        Gravitational acceleration, in m/s^2.
+    theta : float, optional
+        Weighting factor of the discharge on a link against the discharge
+        on its neighbors.
+    wet_depth : float or None, optional
+        Depth above which a node is wet. If None, the whole grid is updated
+        at every step.
+    """
+
+    def __init__(self, grid, h_init=0.00001, alpha=0.7, mannings_n=0.03,
+                 g=9.81, theta=0.8, wet_depth=0.0001):
+        self._grid = grid
+        self.h_init = h_init
+        self.alpha = alpha
+        self.mannings_n = mannings_n
+        self.g = g
+        self.theta = theta
+        self.wet_depth = wet_depth
+        self.rainfall_intensity = 0.
+        self.dt = 0.
+
+        n_nodes = grid.number_of_nodes
+        self._dx = grid.dx
+        self._z = grid.at_node['topographic__elevation']
+        self.h = grid.at_node['water_depth']
+        self.h[self.h < h_init] = h_init
+        self._core = np.asarray(grid.core_nodes)
+
+        tail = np.asarray(grid.node_at_link_tail)
+        head = np.asarray(grid.node_at_link_head)
+        n_links = len(tail)
+        self._tail = tail
+        self._head = head
+
+        if 'water_discharge' not in grid.at_link:
+            grid.add_zeros('link', 'water_discharge')
+        self.q = grid.at_link['water_discharge']
+
+        # The links at every node, and the sign of a discharge on each of
+        # them leaving the node. Missing links are given as link 0, with a
+        # sign of zero.
+        ends = np.concatenate((tail, head))
+        order = np.argsort(ends, kind='mergesort')
+        ends = ends[order]
+        slot = np.arange(2 * n_links) - np.searchsorted(ends, ends)
+        self._links_at_node = np.zeros((n_nodes, 4), dtype=int)
+        self._links_at_node[ends, slot] = np.tile(np.arange(n_links), 2)[order]
+        self._out_sign = np.zeros((n_nodes, 4))
+        self._out_sign[ends, slot] = np.repeat([1., -1.], n_links)[order]
+
+        # The parallel links before and after every link, for the weighting
+        # of the discharge; a link with no neighbor uses its own discharge.
+        horizontal = head - tail == 1
+        (self._before, self._after) = (np.arange(n_links), np.arange(n_links))
+        for is_direction in (horizontal, ~horizontal):
+            links = np.where(is_direction)[0]
+            link_at_tail = np.full(n_nodes, -1, dtype=int)
+            link_at_tail[tail[links]] = links
+            link_at_head = np.full(n_nodes, -1, dtype=int)
+            link_at_head[head[links]] = links
+            before = link_at_head[tail[links]]
+            after = link_at_tail[head[links]]
+            self._before[links[before >= 0]] = before[before >= 0]
+            self._after[links[after >= 0]] = after[after >= 0]
+
+        self._is_core = np.zeros(n_nodes, dtype=bool)
+        self._is_core[self._core] = True
+        self._is_active = np.asarray(grid.status_at_link) == ACTIVE_LINK
+        self._grid_active_links = np.where(self._is_active)[0]
+
+        self._find_active_domain()
+
+    def _find_active_domain(self):
+        """Find the wet nodes and active links from scratch."""
+        if self.wet_depth is None:
+            self._links = self._grid_active_links
+            self._nodes = self._core
+            return
+        (tail, head) = (self._tail, self._head)
+        self._is_wet = self.h > self.wet_depth
+        self._n_wet_ends = (self._is_wet[tail].astype(int) +
+                            self._is_wet[head])
+        self._in_domain = (self._n_wet_ends > 0) & self._is_active
+        self._links = np.where(self._in_domain)[0]
+        self._n_links_at_node = (
+            np.bincount(tail[self._links], minlength=len(self.h)) +
+            np.bincount(head[self._links], minlength=len(self.h)))
+        self._nodes = np.where((self._n_links_at_node > 0) &
+                               self._is_core)[0]
+
+    def reset(self):
+        """Drain the grid, ready for a new storm.
+
+        Every depth is set back to *h_init* and the discharge on every
+        active link to zero; fixed links keep their values.
+        """
+        self.h[:] = self.h_init
+        self.q[self._grid_active_links] = 0.
+        self.rainfall_intensity = 0.
+        self.dt = 0.
+        self._find_active_domain()
+
+    @property
+    def active_links(self):
+        """Links updated at the next step."""
+        return self._links
+
+    def _is_raining(self):
+        return np.any(np.asarray(self.rainfall_intensity) > 0.)
+
+    def calc_time_step(self):
+        """Largest stable time step, from the deepest updated node."""
+        if len(self._nodes) > 0:
+            h_max = np.amax(self.h[self._nodes])
+        else:
+            h_max = 0.
+        if self._is_raining() or self.wet_depth is None:
+            h_max = max(h_max, np.amax(self.h[self._core]))
+        h_max = max(h_max, self.wet_depth or self.h_init)
+        return self.alpha * self._dx / np.sqrt(self.g * h_max)
+
+    def overland_flow(self, dt=None):
+        """Advance the water depth and discharge by one time step.
+
+        Parameters
+        ----------
+        dt : float, optional
+            Time step; if not given, the largest stable step is used.
+        """
+        if dt is None:
+            dt = self.calc_time_step()
+        self.dt = dt
+        (g, h, q, dx) = (self.g, self.h, self.q, self._dx)
+
+        links = self._links
+        (tail, head) = (self._tail[links], self._head[links])
+        (z_tail, z_head) = (self._z[tail], self._z[head])
+        (w_tail, w_head) = (z_tail + h[tail], z_head + h[head])
+
+        # Water depth available for flow on each link, and the slope of the
+        # water surface along it.
+        h_links = (np.maximum(w_tail, w_head) - np.maximum(z_tail, z_head))
+        h_links[h_links < self.h_init] = self.h_init
+        water_surface_slope = (w_head - w_tail) / dx
+
+        q_link = q[links]
+        q_mean = 0.5 * (q[self._before[links]] + q[self._after[links]])
+        q_new = ((self.theta * q_link + (1. - self.theta) * q_mean -
+                  g * h_links * dt * water_surface_slope) /
+                 (1. + g * dt * self.mannings_n ** 2. * np.abs(q_link) /
+                  h_links ** (7. / 3.)))
+
+        # Keep the flow subcritical, and stop a link from draining more
+        # than a share of the water available to it in one step.
+        froude_limit = h_links * np.sqrt(g * h_links)
+        q_new = np.clip(q_new, -froude_limit, froude_limit)
+        courant_limit = h_links * dx / 4. / dt
+        too_fast = np.abs(q_new) > courant_limit
+        q_new[too_fast] = (np.sign(q_new[too_fast]) * h_links[too_fast] *
+                           dx / 5. / dt)
+        q[links] = q_new
+
+        nodes = self._nodes
+        divergence = np.sum(q[self._links_at_node[nodes]] *
+                            self._out_sign[nodes], axis=1) / dx
+        h[nodes] -= divergence * dt
+        if self._is_raining():
+            rainfall_intensity = self.rainfall_intensity
+            if np.ndim(rainfall_intensity) > 0:
+                rainfall_intensity = rainfall_intensity[self._core]
+            h[self._core] += rainfall_intensity * dt
+            changed = self._core
+        else:
+            changed = nodes
+        dry = changed[h[changed] < self.h_init]
+        h[dry] = self.h_init
+
+        if self.wet_depth is not None:
+            self._update_active_domain(changed)
+
+    def _update_active_domain(self, candidates):
+        """Update the wet nodes and active links after *candidates* changed."""
+        now_wet = self.h[candidates] > self.wet_depth
+        flipped = now_wet != self._is_wet[candidates]
+        if not np.any(flipped):
+            return
+        changed = candidates[flipped]
+        is_wet = now_wet[flipped]
+        self._is_wet[changed] = is_wet
+
+        # Count the wet ends of the links at the nodes that changed state.
+        links = self._links_at_node[changed]
+        change = np.repeat(np.where(is_wet, 1, -1), links.shape[1]).reshape(
+            links.shape)
+        real = self._out_sign[changed] != 0.
+        (links, change) = (links[real], change[real])
+        affected = np.unique(links)
+        was_active = self._n_wet_ends[affected] > 0
+        np.add.at(self._n_wet_ends, links, change)
+        now_active = self._n_wet_ends[affected] > 0
+
+        is_active = self._is_active[affected]
+        added = affected[now_active & ~was_active & is_active]
+        removed = affected[was_active & ~now_active & is_active]
+        self.q[removed] = 0.
+        self._in_domain[added] = True
+        self._in_domain[removed] = False
+        for (links, change) in ((added, 1), (removed, -1)):
+            np.add.at(self._n_links_at_node, self._tail[links], change)
+            np.add.at(self._n_links_at_node, self._head[links], change)
+
+        # Scanning the masks is much cheaper than updating sorted index
+        # arrays, and keeps the updates in grid order.
+        self._links = np.where(self._in_domain)[0]
+        self._nodes = np.where((self._n_links_at_node > 0) &
+                               self._is_core)[0]
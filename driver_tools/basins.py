@@ -0,0 +1,70 @@
+#! /usr/env/python
+"""
+basins.py: boundary setup of the overland flow test basins.
+
+deAlmeida_LongBasin.py, deAlmeida_SquareBasin.py, deAlmeida_StormEnsemble.py
+and the overland flow benchmarks all set their basin up with
+:func:`set_up_basin`. The DEM cache (see dem_cache.py) keys its entries on
+the source of the setup function, so sharing this one function keeps them
+all on the same cache entries, and editing it invalidates them all.
+
+Outlets are declared by coordinates, like the gauges of gauges.py, and
+resolved to nodes with the same lookup, so a driver declares its outlet
+once and places the outlet gauge from the same coordinates.
+"""
+import numpy as np
+
+from .gauges import nearest_nodes
+
+
+#: Outlet of each test basin, as (x, y) in m, at the middle of its bottom
+#: edge.
+LONG_BASIN_OUTLET = (1500., 0.)
+SQUARE_BASIN_OUTLET = (3000., 0.)
+
+
+def outlet_gauge(outlet, dx, name='outlet'):
+    """The gauge on the link from an outlet into the basin above it.
+
+    Parameters
+    ----------
+    outlet : tuple of (float, float)
+        x and y coordinates of an outlet on the bottom edge of a grid.
+    dx : float
+        Node spacing of the grid.
+    name : str, optional
+        Name of the gauge.
+
+    Returns
+    -------
+    tuple
+        The gauge, as ``(name, 'link', x, y)`` for a
+        :class:`~driver_tools.gauges.GaugeIndex`.
+    """
+    return (name, 'link', outlet[0], outlet[1] + 0.5 * dx)
+
+
+def set_up_basin(rmg, z, outlets):
+    """Set up the fields and boundaries of a test basin.
+
+    Parameters
+    ----------
+    rmg : RasterModelGrid
+        The grid read from the basin's DEM.
+    z : ndarray
+        Elevations read from the DEM.
+    outlets : sequence of (float, float)
+        x and y coordinates of every outlet; the node nearest to each is
+        opened.
+    """
+    ## Setting initial fields...
+    rmg['node']['topographic__elevation'] = z
+    rmg['link']['water_discharge'] = np.zeros(rmg.number_of_links)
+    rmg['node']['water_depth'] = np.zeros(rmg.number_of_nodes)
+
+    ## and fixed link boundary conditions...
+    rmg.set_fixed_link_boundaries_at_grid_edges(
+        True, True, True, True, fixed_link_value_of='water_discharge')
+
+    ## Setting the nodes nearest to the outlets to OPEN_BOUNDARY
+    rmg.status_at_node[nearest_nodes(rmg, outlets)] = 1
@@ -0,0 +1,131 @@
+#! /usr/env/python
+"""
+components.py: landlab components, imported the first time they are used.
+
+Drivers used to import every component they might need at the top, whether
+or not the run used it (coupled_driver.py, for one, imported PerronNLDiffuse
+and never ran it). For short ensemble jobs that import time makes up a good
+share of each job. A :class:`ComponentRegistry` knows which module every
+component lives in, and only imports it when the driver first asks for the
+component, with :meth:`~ComponentRegistry.get` or
+:meth:`~ComponentRegistry.create`::
+
+    from driver_tools.components import components
+
+    fr = components.create('FlowRouter', mg)
+
+It also times every import it does, so that :meth:`~ComponentRegistry.report`
+shows what the components of a run cost to import. The time of an import
+includes that of whatever the module imported that was not loaded yet, so
+the first component of a run also pays for loading landlab's component
+machinery.
+"""
+from __future__ import print_function
+
+import sys
+import time
+import importlib
+
+_timer = getattr(time, 'perf_counter', time.time)
+
+#: Module of every component the drivers use, by component name.
+COMPONENT_MODULES = {
+    'LinearDiffuser': 'landlab.components.diffusion.diffusion',
+    'PerronNLDiffuse':
+        'landlab.components.nonlinear_diffusion.Perron_nl_diffuse',
+    'NonlinearDiffuser':
+        'landlab.components.nonlinear_diffusion.explicit_nl_diffuse',
+    'FlowRouter': 'landlab.components.flow_routing.route_flow_dn',
+    'FastscapeEroder':
+        'landlab.components.stream_power.fastscape_stream_power',
+    'OverlandFlow':
+        'landlab.components.overland_flow.generate_overland_flow_deAlmeida',
+    'gFlex': 'landlab.components.gFlex.flexure',
+    'FlexureComponent': 'landlab.components.flexure',
+    'OrientedHexCTS': 'landlab.components.cellular_automata.oriented_hex_cts',
+    'OrientedRasterCTS':
+        'landlab.components.cellular_automata.oriented_raster_cts',
+    'RasterCTS': 'landlab.components.cellular_automata.raster_cts',
+    'CAPlotter': 'landlab.components.cellular_automata.celllab_cts',
+    'Radiation': 'landlab.components.radiation',
+    'PotentialEvapotranspiration': 'landlab.components.pet',
+    'SoilMoisture': 'landlab.components.soil_moisture',
+    'Vegetation': 'landlab.components.vegetation_dynamics',
+}
+
+
+class ComponentRegistry(object):
+    """
+    Components by name, imported on first use.
+
+    Parameters
+    ----------
+    modules : dict, optional
+        Module of every component, by component name.
+    """
+
+    def __init__(self, modules=None):
+        self._modules = dict(modules or {})
+        self._classes = {}
+        self._import_times = {}
+
+    def register(self, name, module):
+        """Add component *name*, found in *module*."""
+        if name in self._classes:
+            raise ValueError('%s is already imported' % name)
+        self._modules[name] = module
+
+    @property
+    def names(self):
+        """Names of the components that can be used."""
+        return sorted(self._modules)
+
+    def get(self, name):
+        """The component class called *name*, imported if need be."""
+        try:
+            return self._classes[name]
+        except KeyError:
+            pass
+        try:
+            module_name = self._modules[name]
+        except KeyError:
+            raise KeyError('%s: unknown component (known components are %s)'
+                           % (name, ', '.join(self.names)))
+
+        already_loaded = module_name in sys.modules
+        start = _timer()
+        module = importlib.import_module(module_name)
+        self._import_times[name] = (0. if already_loaded
+                                    else _timer() - start)
+        self._classes[name] = getattr(module, name)
+        return self._classes[name]
+
+    def create(self, name, *args, **kwds):
+        """An instance of the component called *name*.
+
+        The arguments are passed on to the component.
+        """
+        return self.get(name)(*args, **kwds)
+
+    def import_times(self):
+        """Time taken to import every component used so far (seconds).
+
+        Components whose module had already been imported count as taking
+        no time.
+        """
+        return dict(self._import_times)
+
+    def report(self):
+        """The import times as a printable table."""
+        lines = ['%-28s %11s' % ('component', 'import time')]
+        for (name, seconds) in sorted(self._import_times.items(),
+                                      key=lambda item: -item[1]):
+            lines.append('%-28s %10.3fs' % (name, seconds))
+        lines.append('Components imported: %d of %d (%.3f s)'
+                     % (len(self._import_times), len(self._modules),
+                        sum(self._import_times.values())))
+        return '\n'.join(lines)
+
+
+#: The registry of the drivers' components.
+components = ComponentRegistry(COMPONENT_MODULES)
@@ -0,0 +1,240 @@
+#! /usr/env/python
+"""
+dem_cache.py: an on-disk cache of DEMs with their boundary setup done.
+
+Drivers that read a DEM also spend a good part of their startup setting up
+its boundaries (closing nodata nodes, fixing the links along the grid
+edges, opening an outlet). :class:`DEMCache` runs that setup once for each
+combination of DEM and setup options. It saves the result: the grid shape
+and spacing, the node and link fields, the status of every node, and the
+status of every link (used to check the restored grid). Later runs memory-map
+the saved arrays and only restore the node status, skipping both the parsing
+and the setup.
+
+Entries are keyed by the SHA-1 of the DEM's contents together with the
+source of the setup function and its options, so editing any of them
+invalidates the entry. Only the setup function itself is hashed: editing a
+function it calls does not invalidate anything, so keep the setup in one
+function (see basins.py for the overland flow test basins). Hashes of DEM
+files are remembered by path, size and modification time, so unchanged DEMs
+are not re-read just to be hashed. When the cache grows beyond its size
+limit, the least recently used entries are evicted.
+
+The setup function is called as ``setup(grid, z, **options)`` on a freshly
+read grid, and should do everything that depends only on the DEM and the
+options.
+"""
+from __future__ import print_function
+
+import os
+import json
+import shutil
+import hashlib
+import inspect
+
+import numpy as np
+
+from .dem_io import read_dem
+
+
+#: Default cache location; override with the LANDLAB_DRIVERS_CACHE variable.
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache',
+                                 'landlab_drivers', 'dems')
+
+#: Default cache size limit, in bytes.
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+
+_HASH_INDEX = 'file_hashes.json'
+
+
+def _setup_source(setup):
+    """Source of a setup function or, if it is not available, its code."""
+    try:
+        return inspect.getsource(setup)
+    except (IOError, OSError, TypeError):
+        code = setup.__code__
+        return repr((code.co_code, code.co_consts, code.co_names))
+
+
+def _directory_size(path):
+    return sum(os.path.getsize(os.path.join(path, name))
+               for name in os.listdir(path))
+
+
+class DEMCache(object):
+    """
+    Cache of DEMs with their boundary setup already done.
+
+    Parameters
+    ----------
+    cache_dir : str, optional
+        Where to keep the cache.
+    max_bytes : int, optional
+        Size above which least recently used entries are evicted.
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=DEFAULT_MAX_BYTES):
+        self._cache_dir = cache_dir or os.environ.get(
+            'LANDLAB_DRIVERS_CACHE', DEFAULT_CACHE_DIR)
+        self._max_bytes = max_bytes
+        if not os.path.isdir(self._cache_dir):
+            os.makedirs(self._cache_dir)
+
+    def file_hash(self, path):
+        """SHA-1 of the contents of *path*, remembered between runs."""
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        index_path = os.path.join(self._cache_dir, _HASH_INDEX)
+        try:
+            with open(index_path, 'r') as fp:
+                index = json.load(fp)
+        except (IOError, OSError, ValueError):
+            index = {}
+        entry = index.get(path)
+        if entry and entry[:2] == [stat.st_size, stat.st_mtime]:
+            return entry[2]
+
+        sha = hashlib.sha1()
+        with open(path, 'rb') as fp:
+            for chunk in iter(lambda: fp.read(1 << 20), b''):
+                sha.update(chunk)
+        index[path] = [stat.st_size, stat.st_mtime, sha.hexdigest()]
+        with open(index_path + '.tmp', 'w') as fp:
+            json.dump(index, fp)
+        os.rename(index_path + '.tmp', index_path)
+        return sha.hexdigest()
+
+    def key(self, dem_path, setup, options):
+        """Cache key for a DEM, a setup function and its options."""
+        sha = hashlib.sha1()
+        sha.update(self.file_hash(dem_path).encode('ascii'))
+        sha.update(json.dumps([setup.__name__, options],
+                              sort_keys=True).encode('utf-8'))
+        sha.update(_setup_source(setup).encode('utf-8'))
+        return sha.hexdigest()
+
+    def load(self, dem_path, setup, **options):
+        """Read a DEM and set it up, using the cache when possible.
+
+        Parameters
+        ----------
+        dem_path : str
+            The ESRI ASCII DEM.
+        setup : callable
+            Called as ``setup(grid, z, **options)`` to set up the grid on a
+            cache miss.
+        options : keywords
+            JSON-serializable options passed on to *setup*.
+
+        Returns
+        -------
+        tuple of (RasterModelGrid, ndarray)
+            The grid and its elevation field.
+        """
+        entry = os.path.join(self._cache_dir, self.key(dem_path, setup,
+                                                       options))
+        if os.path.isfile(os.path.join(entry, 'meta.json')):
+            loaded = self._restore(entry)
+            if loaded is not None:
+                os.utime(entry, None)
+                return loaded
+
+        (grid, z) = read_dem(dem_path, name='topographic__elevation')
+        setup(grid, z, **options)
+        self._store(entry, grid, dem_path, setup, options)
+        self._evict()
+        return (grid, grid.at_node['topographic__elevation'])
+
+    def _store(self, entry, grid, dem_path, setup, options):
+        tmp_entry = entry + '.tmp'
+        if os.path.isdir(tmp_entry):
+            shutil.rmtree(tmp_entry)
+        os.makedirs(tmp_entry)
+
+        fields = {}
+        for group in ('node', 'link'):
+            at_group = getattr(grid, 'at_' + group)
+            fields[group] = sorted(at_group.keys())
+            for name in fields[group]:
+                np.save(os.path.join(tmp_entry, group + '__' + name + '.npy'),
+                        at_group[name])
+        np.save(os.path.join(tmp_entry, 'status_at_node.npy'),
+                grid.status_at_node)
+        np.save(os.path.join(tmp_entry, 'status_at_link.npy'),
+                grid.status_at_link)
+
+        meta = {'shape': [int(n) for n in grid.shape],
+                'dx': float(grid.dx),
+                'fields': fields,
+                'source': os.path.abspath(dem_path),
+                'setup': setup.__name__,
+                'options': options}
+        with open(os.path.join(tmp_entry, 'meta.json'), 'w') as fp:
+            json.dump(meta, fp, indent=2)
+
+        if os.path.isdir(entry):
+            shutil.rmtree(entry)
+        os.rename(tmp_entry, entry)
+
+    def _restore(self, entry):
+        from landlab import RasterModelGrid
+
+        with open(os.path.join(entry, 'meta.json'), 'r') as fp:
+            meta = json.load(fp)
+        grid = RasterModelGrid(meta['shape'][0], meta['shape'][1],
+                               meta['dx'])
+        for group in ('node', 'link'):
+            for name in meta['fields'][group]:
+                values = np.load(os.path.join(entry, group + '__' + name +
+                                              '.npy'), mmap_mode='c')
+                grid.add_field(group, name, values)
+        grid.status_at_node = np.load(os.path.join(entry,
+                                                   'status_at_node.npy'))
+
+        status_at_link = np.load(os.path.join(entry, 'status_at_link.npy'))
+        if not np.array_equal(grid.status_at_link, status_at_link):
+            print('Cached link status does not match; rebuilding', entry)
+            shutil.rmtree(entry)
+            return None
+
+        return (grid, grid.at_node['topographic__elevation'])
+
+    def _evict(self):
+        """Remove least recently used entries until under the size limit."""
+        entries = [os.path.join(self._cache_dir, name)
+                   for name in os.listdir(self._cache_dir)]
+        entries = [path for path in entries if os.path.isdir(path) and
+                   not path.endswith('.tmp')]
+        entries.sort(key=os.path.getmtime)
+        total = sum(_directory_size(path) for path in entries)
+        while total > self._max_bytes and len(entries) > 1:
+            oldest = entries.pop(0)
+            total -= _directory_size(oldest)
+            shutil.rmtree(oldest)
+
+
+def load_preprocessed_dem(dem_path, setup, cache_dir=None,
+                          max_bytes=DEFAULT_MAX_BYTES, **options):
+    """Read a DEM and set it up, through a :class:`DEMCache`.
+
+    Parameters
+    ----------
+    dem_path : str
+        The ESRI ASCII DEM.
+    setup : callable
+        Called as ``setup(grid, z, **options)`` to set up the grid on a
+        cache miss.
+    cache_dir : str, optional
+        Where to keep the cache.
+    max_bytes : int, optional
+        Cache size limit, in bytes.
+    options : keywords
+        JSON-serializable options passed on to *setup*.
+
+    Returns
+    -------
+    tuple of (RasterModelGrid, ndarray)
+        The grid and its elevation field.
+    """
+    cache = DEMCache(cache_dir=cache_dir, max_bytes=max_bytes)
+    return cache.load(dem_path, setup, **options)
@@ -0,0 +1,203 @@
+#! /usr/bin/env python
+"""
+dem_io.py: a compact binary DEM format that loads without parsing.
+
+Parsing an ESRI ASCII DEM takes most of the startup time of the drivers
+that read one. This module converts a DEM, once, into
+
+*  ``<name>.dem``, the elevations as raw, little-endian binary values,
+   already in landlab node order (bottom row first), and
+*  ``<name>.dem.json``, a sidecar header with the grid shape, spacing,
+   origin, nodata value, data type, and the size and modification time of
+   the ASCII file it was made from.
+
+:func:`read_binary_dem` memory-maps the binary file copy-on-write and
+attaches the map directly to the grid as the elevation field. Nothing is
+parsed or copied at startup; pages are read from disk as they are touched,
+and are only copied if the model writes to them, so the file on disk never
+changes.
+
+:func:`read_dem` is a drop-in replacement for ``read_esri_ascii`` that
+converts the ASCII file the first time it is used (or whenever it has
+changed since it was converted) and loads the binary version from then on.
+
+To convert a DEM ahead of time, run::
+
+    $ python dem_io.py path/to/dem.asc
+"""
+from __future__ import print_function
+
+import os
+import json
+
+import numpy as np
+
+
+_HEADER_KEYS = ('ncols', 'nrows', 'xllcorner', 'xllcenter', 'yllcorner',
+                'yllcenter', 'cellsize', 'nodata_value')
+
+
+def binary_dem_path(asc_path):
+    """Name of the binary DEM made from *asc_path*."""
+    return os.path.splitext(asc_path)[0] + '.dem'
+
+
+def _source_fingerprint(asc_path):
+    stat = os.stat(asc_path)
+    return {'source_size': stat.st_size, 'source_mtime': stat.st_mtime}
+
+
+def read_esri_ascii_header(fp):
+    """Read the header of an ESRI ASCII file.
+
+    Returns
+    -------
+    tuple of (dict, str)
+        The header, with lower-case keys, and the first line of data.
+    """
+    header = {}
+    while True:
+        line = fp.readline()
+        tokens = line.split()
+        if len(tokens) == 2 and tokens[0].lower() in _HEADER_KEYS:
+            header[tokens[0].lower()] = float(tokens[1])
+        else:
+            return (header, line)
+
+
+def convert_esri_ascii(asc_path, dem_path=None, dtype='<f8'):
+    """Convert an ESRI ASCII DEM to the binary format.
+
+    Parameters
+    ----------
+    asc_path : str
+        The ESRI ASCII file.
+    dem_path : str, optional
+        The binary file to write; by default, *asc_path* with a ``.dem``
+        extension. The header goes to the same name plus ``.json``.
+    dtype : str, optional
+        Data type of the binary values.
+
+    Returns
+    -------
+    str
+        Path to the binary DEM.
+    """
+    dem_path = dem_path or binary_dem_path(asc_path)
+    with open(asc_path, 'r') as fp:
+        (header, first_line) = read_esri_ascii_header(fp)
+        values = np.array((first_line + fp.read()).split(), dtype=float)
+
+    (nrows, ncols) = (int(header['nrows']), int(header['ncols']))
+    if values.size != nrows * ncols:
+        raise ValueError('%s: expected %d values, found %d' %
+                         (asc_path, nrows * ncols, values.size))
+
+    # ESRI files start with the top row; landlab numbers nodes from the
+    # bottom row up.
+    values = np.flipud(values.reshape((nrows, ncols))).astype(dtype)
+
+    meta = {
+        'nrows': nrows,
+        'ncols': ncols,
+        'dx': header['cellsize'],
+        'xllcorner': header.get('xllcorner', header.get('xllcenter', 0.)),
+        'yllcorner': header.get('yllcorner', header.get('yllcenter', 0.)),
+        'nodata_value': header.get('nodata_value'),
+        'dtype': np.dtype(dtype).str,
+        'source': os.path.basename(asc_path),
+    }
+    meta.update(_source_fingerprint(asc_path))
+
+    tmp_path = dem_path + '.tmp'
+    values.tofile(tmp_path)
+    with open(tmp_path + '.json', 'w') as fp:
+        json.dump(meta, fp, indent=2)
+    os.rename(tmp_path, dem_path)
+    os.rename(tmp_path + '.json', dem_path + '.json')
+
+    return dem_path
+
+
+def read_binary_dem_header(dem_path):
+    """Read the sidecar header of a binary DEM."""
+    with open(dem_path + '.json', 'r') as fp:
+        return json.load(fp)
+
+
+def read_binary_dem(dem_path, name='topographic__elevation'):
+    """Create a grid from a binary DEM, memory-mapping the elevations.
+
+    Parameters
+    ----------
+    dem_path : str
+        The binary DEM.
+    name : str, optional
+        Name of the node field to attach the elevations to.
+
+    Returns
+    -------
+    tuple of (RasterModelGrid, ndarray)
+        The grid and the memory-mapped elevation field.
+    """
+    from landlab import RasterModelGrid
+
+    meta = read_binary_dem_header(dem_path)
+    grid = RasterModelGrid(meta['nrows'], meta['ncols'], meta['dx'])
+    z = np.memmap(dem_path, dtype=np.dtype(meta['dtype']), mode='c',
+                  shape=(meta['nrows'] * meta['ncols'], ))
+    grid.add_field('node', name, z)
+
+    return (grid, z)
+
+
+def read_dem(asc_path, name='topographic__elevation'):
+    """Drop-in replacement for ``read_esri_ascii`` that caches in binary.
+
+    The first time an ASCII DEM is read (or after it has changed) it is
+    converted to the binary format next to it; after that the binary
+    version is memory-mapped instead.
+
+    Parameters
+    ----------
+    asc_path : str
+        The ESRI ASCII DEM.
+    name : str, optional
+        Name of the node field to attach the elevations to.
+
+    Returns
+    -------
+    tuple of (RasterModelGrid, ndarray)
+        The grid and the elevation field.
+    """
+    dem_path = binary_dem_path(asc_path)
+    fingerprint = _source_fingerprint(asc_path)
+    try:
+        meta = read_binary_dem_header(dem_path)
+        up_to_date = os.path.isfile(dem_path) and all(
+            meta[key] == fingerprint[key] for key in fingerprint)
+    except (IOError, OSError, ValueError, KeyError):
+        up_to_date = False
+    if not up_to_date:
+        convert_esri_ascii(asc_path, dem_path)
+
+    return read_binary_dem(dem_path, name=name)
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Convert ESRI ASCII DEMs to memory-mappable binary files')
+    parser.add_argument('files', nargs='+', help='ESRI ASCII files')
+    parser.add_argument('--dtype', default='<f8',
+                        help='Data type of the binary values')
+
+    args = parser.parse_args()
+
+    for asc_path in args.files:
+        print('Wrote', convert_esri_ascii(asc_path, dtype=args.dtype))
+
+
+if __name__ == '__main__':
+    main()
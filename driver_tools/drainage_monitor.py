@@ -0,0 +1,165 @@
+#! /usr/env/python
+"""
+drainage_monitor.py: stop an overland flow run once the basin has drained.
+
+The overland flow drivers run for a fixed model time that is long enough for
+the slowest storm to drain, so most runs spend much of their wall time
+routing next to nothing. :class:`DrainageMonitor` keeps a running water
+budget for the basin, made up of
+
+*  the rainfall added to the core nodes,
+*  the water stored on them (the sum of the water depths times the cell
+   area), and
+*  the water that has left through the outlet,
+
+and reports the basin drained once the rainfall has stopped, the storage has
+dropped below a fraction of its peak and the outlet discharge has dropped
+below a fraction of its own peak. The storage and discharge are only summed
+every few steps, as that takes a pass over every node.
+
+Solvers leave a thin film of water on every node (and the wet domain solver
+leaves up to its wet depth on dry nodes) that never drains, so only the
+water above a *dry_depth* counts towards the storage used to decide when
+the basin has drained.
+
+A storm that never wets the basin past the dry depth leaves nothing to
+drain, so it is reported drained at the first check after the rainfall
+stops.
+
+When the run stops, :meth:`DrainageMonitor.report` gives the budget at that
+point, including the mass balance error: the rainfall that is neither stored
+nor accounted for at the outlet.
+"""
+from __future__ import print_function
+
+import numpy as np
+
+
+class DrainageMonitor(object):
+    """
+    Decide when an overland flow run has drained.
+
+    Parameters
+    ----------
+    grid : ModelGrid
+        The grid the water is routed over.
+    storm_duration : float
+        Time at which the rainfall stops; the basin is never reported
+        drained before then.
+    storage_tolerance : float, optional
+        The basin is drained once its storage is below this fraction of the
+        peak storage...
+    discharge_tolerance : float, optional
+        ...and the outlet discharge is below this fraction of its peak.
+    check_every : int, optional
+        Check the storage every this many steps.
+    dry_depth : float, optional
+        Depth of water that a node holds when it has drained.
+    water_depth : ndarray, optional
+        Water depth at every node at the start of the run, if not zero.
+        The water already there is left out of the budget.
+    """
+
+    def __init__(self, grid, storm_duration, storage_tolerance=1.e-3,
+                 discharge_tolerance=1.e-3, check_every=10, dry_depth=0.,
+                 water_depth=None):
+        self._core = np.asarray(grid.core_nodes)
+        self._core_area = grid.number_of_core_nodes * grid.dx * grid.dx
+        self._cell_area = grid.dx * grid.dx
+        self._storm_duration = storm_duration
+        self._storage_tolerance = storage_tolerance
+        self._discharge_tolerance = discharge_tolerance
+        self._check_every = max(int(check_every), 1)
+        self._dry_depth = dry_depth
+        if water_depth is not None:
+            self._initial_volume = (np.sum(water_depth[self._core]) *
+                                    self._cell_area)
+        else:
+            self._initial_volume = 0.
+
+        self._n_steps = 0
+        self.time = 0.
+        self.rainfall_volume = 0.
+        self.outflow_volume = 0.
+        self.stored_volume = 0.
+        self.draining_volume = 0.
+        self.peak_storage = 0.
+        self.discharge = 0.
+        self.peak_discharge = 0.
+        self._last_check_time = None
+        self._last_check_outflow = 0.
+        self.drained = False
+
+    def update(self, time, dt, rainfall_intensity, water_depth,
+               outflow_volume):
+        """Bring the budget up to date after a step.
+
+        Parameters
+        ----------
+        time : float
+            Model time at the end of the step.
+        dt : float
+            Length of the step.
+        rainfall_intensity : float or ndarray
+            Rainfall rate during the step, everywhere or at every node.
+        water_depth : ndarray
+            Water depth at every node.
+        outflow_volume : float
+            Total volume of water that has left through the outlet so far.
+
+        Returns
+        -------
+        bool
+            True once the basin has drained.
+        """
+        self._n_steps += 1
+        self.time = time
+        if np.ndim(rainfall_intensity) > 0:
+            self.rainfall_volume += (np.sum(rainfall_intensity[self._core]) *
+                                     dt * self._cell_area)
+        else:
+            self.rainfall_volume += rainfall_intensity * dt * self._core_area
+        self.outflow_volume = outflow_volume
+        if self._n_steps % self._check_every != 0:
+            return False
+
+        depth = water_depth[self._core]
+        self.stored_volume = (np.sum(depth) * self._cell_area -
+                              self._initial_volume)
+        draining = np.sum(np.maximum(depth - self._dry_depth, 0.))
+        self.draining_volume = draining * self._cell_area
+        self.peak_storage = max(self.peak_storage, self.draining_volume)
+        if self._last_check_time is not None and time > self._last_check_time:
+            self.discharge = ((outflow_volume - self._last_check_outflow) /
+                              (time - self._last_check_time))
+            self.peak_discharge = max(self.peak_discharge, self.discharge)
+        self._last_check_time = time
+        self._last_check_outflow = outflow_volume
+
+        self.drained = bool(
+            time >= self._storm_duration and
+            self.draining_volume <= self._storage_tolerance *
+            self.peak_storage and
+            self.discharge <= self._discharge_tolerance * self.peak_discharge)
+        return self.drained
+
+    @property
+    def mass_balance_error(self):
+        """Rainfall neither stored nor drained, as a percentage of rainfall."""
+        if self.rainfall_volume == 0.:
+            return 0.
+        return 100. * ((self.rainfall_volume - self.stored_volume -
+                        self.outflow_volume) / self.rainfall_volume)
+
+    def report(self):
+        """The water budget, as a printable string."""
+        if self.drained:
+            status = 'Basin drained at t = %.1f s' % self.time
+        else:
+            status = 'Basin not drained at t = %.1f s' % self.time
+        lines = [status,
+                 'Rainfall volume: %.2f' % self.rainfall_volume,
+                 'Outflow volume: %.2f' % self.outflow_volume,
+                 'Stored volume: %.2f' % self.stored_volume,
+                 'Mass balance error: %.3f %%' % self.mass_balance_error]
+        return '\n'.join(lines)
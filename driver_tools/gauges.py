@@ -0,0 +1,136 @@
+#! /usr/env/python
+"""
+gauges.py: stream gauges declared by coordinates.
+
+Calibration runs sample the overland flow at dozens of gauges per basin.
+:class:`GaugeIndex` takes the gauges as ``(name, kind, x, y)``, where *kind*
+is ``'link'`` (for a discharge) or ``'node'`` (for a depth), and resolves
+them once to the nearest link midpoint or node of the grid. The result is a
+pair of index arrays, so a whole set of gauges is sampled with one gather
+per element kind and step, for instance by the
+:class:`~driver_tools.hydrograph.HydrographRecorder` returned by
+:meth:`GaugeIndex.recorder`.
+
+Other points declared by coordinates, such as the outlets of a basin (see
+basins.py), are resolved to nodes with :func:`nearest_nodes`, the lookup
+the node gauges use, so an outlet and its gauge can be declared by the same
+coordinates.
+
+Gauges can also be listed in a whitespace-delimited text file, one per line::
+
+    # name    kind  x      y
+    outlet    link  500.   5.
+    upper     node  500.   2500.
+"""
+from __future__ import print_function
+
+import numpy as np
+
+from .hydrograph import HydrographRecorder
+
+
+def read_gauges(filename):
+    """Read gauges from a text file, as a list of (name, kind, x, y)."""
+    gauges = []
+    with open(filename, 'r') as fp:
+        for line in fp:
+            tokens = line.split('#')[0].split()
+            if tokens:
+                (name, kind, x, y) = tokens
+                gauges.append((name, kind, float(x), float(y)))
+    return gauges
+
+
+def _nearest(x, y, at_x, at_y):
+    """Index of the point of (at_x, at_y) nearest to every (x, y)."""
+    nearest = np.empty(len(x), dtype=int)
+    for (i, (xi, yi)) in enumerate(zip(x, y)):
+        nearest[i] = np.argmin((at_x - xi) ** 2 + (at_y - yi) ** 2)
+    return nearest
+
+
+def nearest_nodes(grid, points):
+    """The node nearest to every point.
+
+    Parameters
+    ----------
+    grid : ModelGrid
+        The grid.
+    points : sequence of (float, float)
+        x and y coordinates of every point.
+
+    Returns
+    -------
+    ndarray of int
+        The node nearest to every point, in order.
+    """
+    points = list(points)
+    return _nearest([point[0] for point in points],
+                    [point[1] for point in points],
+                    np.asarray(grid.node_x), np.asarray(grid.node_y))
+
+
+class GaugeIndex(object):
+    """
+    Gauges declared by coordinates, resolved to links and nodes.
+
+    Parameters
+    ----------
+    grid : ModelGrid
+        The grid the gauges are on.
+    gauges : sequence of tuple
+        ``(name, kind, x, y)`` for every gauge, with *kind* either
+        ``'link'`` or ``'node'``.
+    """
+
+    def __init__(self, grid, gauges):
+        gauges = list(gauges)
+        for (name, kind, x, y) in gauges:
+            if kind not in ('link', 'node'):
+                raise ValueError('%s: gauge kind must be link or node, not %s'
+                                 % (name, kind))
+        link_gauges = [gauge for gauge in gauges if gauge[1] == 'link']
+        node_gauges = [gauge for gauge in gauges if gauge[1] == 'node']
+
+        node_x = np.asarray(grid.node_x)
+        node_y = np.asarray(grid.node_y)
+        tail = np.asarray(grid.node_at_link_tail)
+        head = np.asarray(grid.node_at_link_head)
+
+        self._names = ([gauge[0] for gauge in link_gauges] +
+                       [gauge[0] for gauge in node_gauges])
+        self.links = _nearest([gauge[2] for gauge in link_gauges],
+                              [gauge[3] for gauge in link_gauges],
+                              0.5 * (node_x[tail] + node_x[head]),
+                              0.5 * (node_y[tail] + node_y[head]))
+        self.nodes = nearest_nodes(grid, [gauge[2:] for gauge in node_gauges])
+
+    @property
+    def names(self):
+        """Gauge names, link gauges first, in the order they are sampled."""
+        return list(self._names)
+
+    def element(self, name):
+        """The link or node of the gauge called *name*."""
+        index = self._names.index(name)
+        if index < len(self.links):
+            return self.links[index]
+        return self.nodes[index - len(self.links)]
+
+    def sample(self, link_values=None, node_values=None, out=None):
+        """Values at every gauge, in the order of :attr:`names`."""
+        if out is None:
+            out = np.empty(len(self._names))
+        n_links = len(self.links)
+        if n_links > 0:
+            out[:n_links] = link_values[self.links]
+        if len(self.nodes) > 0:
+            out[n_links:] = node_values[self.nodes]
+        return out
+
+    def recorder(self, output_path=None, chunk_size=8192, keep_record=True):
+        """A hydrograph recorder that samples every gauge."""
+        return HydrographRecorder(links=self.links, nodes=self.nodes,
+                                  output_path=output_path,
+                                  chunk_size=chunk_size, names=self._names,
+                                  keep_record=keep_record)
@@ -0,0 +1,207 @@
+#! /usr/env/python
+"""
+hydrograph.py: a bounded-memory hydrograph recorder for long-running drivers.
+
+The overland flow drivers take hundreds of thousands of adaptive timesteps,
+and used to append the time and the outlet discharge to Python lists at
+every one of them. :class:`HydrographRecorder` samples any set of links and
+nodes into a preallocated array instead. When the array fills up it is
+either written out to disk as a chunk, if the recorder has an output file,
+or grown, if it keeps the record in memory. Only a recorder with an output
+file, or one that keeps no record at all (``keep_record=False``), runs in
+bounded memory whatever the length of the run; an in-memory record grows
+with it.
+
+The recorder also integrates the absolute value of every sampled series over
+time with the trapezoidal rule as it goes, and keeps the largest absolute
+value of every series and the time it was reached, so the mass balance
+check and the peak discharge at the end of a run need no pass over the
+record. A recorder that keeps no record has only those.
+
+The output file holds the raw, little-endian rows ``(time, link values...,
+node values...)``; a JSON sidecar with the same name plus ``.json`` lists
+the columns. :meth:`HydrographRecorder.read` memory-maps it back.
+"""
+from __future__ import print_function
+
+import os
+import json
+
+import numpy as np
+
+
+class HydrographRecorder(object):
+    """
+    Record values at links and nodes at every timestep.
+
+    Parameters
+    ----------
+    links : sequence of int, optional
+        Links to sample.
+    nodes : sequence of int, optional
+        Nodes to sample.
+    output_path : str, optional
+        File that receives the record, a chunk at a time. If not given, the
+        whole record is kept in memory, unless *keep_record* is False.
+    chunk_size : int, optional
+        Number of timesteps held in memory before a chunk is written out
+        (or, with no output file, the initial size of the record).
+    names : sequence of str, optional
+        Names of the sampled links and then nodes, used as column names;
+        by default ``link_<id>`` and ``node_<id>``.
+    keep_record : bool, optional
+        If False, and there is no output file, only the integrals and peaks
+        are kept, and the record cannot be read back.
+    """
+
+    def __init__(self, links=(), nodes=(), output_path=None, chunk_size=8192,
+                 names=None, keep_record=True):
+        self._links = np.asarray(links, dtype=int)
+        self._nodes = np.asarray(nodes, dtype=int)
+        if names is None:
+            names = (['link_%d' % link for link in self._links] +
+                     ['node_%d' % node for node in self._nodes])
+        self._columns = ['time'] + list(names)
+        n_columns = len(self._columns)
+
+        self._output_path = output_path
+        self._keep_record = keep_record or output_path is not None
+        if not self._keep_record:
+            chunk_size = 1
+        self._buffer = np.empty((max(int(chunk_size), 1), n_columns))
+        self._n_buffered = 0
+        self._n_written = 0
+        if output_path is not None:
+            with open(output_path + '.json', 'w') as fp:
+                json.dump({'columns': self._columns, 'dtype': '<f8'}, fp,
+                          indent=2)
+            open(output_path, 'wb').close()
+
+        self._integrals = np.zeros(n_columns - 1)
+        self._peaks = np.full(n_columns - 1, -1.)
+        self._peak_times = np.zeros(n_columns - 1)
+        self._last_row = None
+
+    @property
+    def columns(self):
+        """Names of the recorded columns, starting with ``time``."""
+        return list(self._columns)
+
+    @property
+    def number_of_samples(self):
+        """Number of timesteps recorded so far."""
+        return self._n_written + self._n_buffered
+
+    def record(self, time, link_values=None, node_values=None):
+        """Sample the values at the recorder's links and nodes.
+
+        Parameters
+        ----------
+        time : float
+            Model time of the sample.
+        link_values : ndarray, optional
+            Values at every link; required if the recorder samples links.
+        node_values : ndarray, optional
+            Values at every node; required if the recorder samples nodes.
+        """
+        if self._n_buffered == len(self._buffer):
+            if self._output_path is not None:
+                self._flush()
+            elif self._keep_record:
+                self._buffer = np.concatenate(
+                    (self._buffer, np.empty_like(self._buffer)))
+            else:
+                self._n_written += self._n_buffered
+                self._n_buffered = 0
+
+        row = self._buffer[self._n_buffered]
+        row[0] = time
+        n_links = len(self._links)
+        if n_links > 0:
+            row[1:1 + n_links] = link_values[self._links]
+        if len(self._nodes) > 0:
+            row[1 + n_links:] = node_values[self._nodes]
+        self._n_buffered += 1
+
+        values = np.abs(row[1:])
+        is_peak = values > self._peaks
+        self._peaks[is_peak] = values[is_peak]
+        self._peak_times[is_peak] = time
+
+        if self._last_row is not None:
+            self._integrals += (0.5 * (time - self._last_row[0]) *
+                                (np.abs(row[1:]) + np.abs(self._last_row[1:])))
+            self._last_row[:] = row
+        else:
+            self._last_row = row.copy()
+
+    def _flush(self):
+        with open(self._output_path, 'ab') as fp:
+            self._buffer[:self._n_buffered].astype('<f8').tofile(fp)
+        self._n_written += self._n_buffered
+        self._n_buffered = 0
+
+    def close(self):
+        """Write out whatever is still held in memory."""
+        if self._output_path is not None and self._n_buffered > 0:
+            self._flush()
+
+    def integral_at_link(self, link):
+        """Time integral of the absolute value recorded at *link*."""
+        column = int(np.where(self._links == link)[0][0])
+        return self._integrals[column]
+
+    def integral_at_node(self, node):
+        """Time integral of the absolute value recorded at *node*."""
+        column = len(self._links) + int(np.where(self._nodes == node)[0][0])
+        return self._integrals[column]
+
+    def integral(self, name):
+        """Time integral of the absolute value in the column *name*."""
+        return self._integrals[self._columns.index(name) - 1]
+
+    def peak(self, name):
+        """Largest absolute value in the column *name*, and its time.
+
+        Returns
+        -------
+        tuple of (float, float)
+            The time of the first sample with the largest absolute value,
+            and that value.
+        """
+        column = self._columns.index(name) - 1
+        return (self._peak_times[column], max(self._peaks[column], 0.))
+
+    def read(self):
+        """The whole record, one row per timestep.
+
+        Returns
+        -------
+        ndarray
+            Array of shape (number of samples, number of columns); a
+            read-only memory map of the output file, if there is one.
+        """
+        if not self._keep_record:
+            raise ValueError('the recorder keeps no record')
+        if self._output_path is None:
+            return self._buffer[:self._n_buffered]
+        self.close()
+        return read_hydrograph(self._output_path)
+
+
+def read_hydrograph(output_path):
+    """Memory-map a record written by :class:`HydrographRecorder`.
+
+    Returns
+    -------
+    ndarray
+        Array of shape (number of samples, number of columns).
+    """
+    with open(output_path + '.json', 'r') as fp:
+        meta = json.load(fp)
+    n_columns = len(meta['columns'])
+    n_rows = os.path.getsize(output_path) // (8 * n_columns)
+    if n_rows == 0:
+        return np.empty((0, n_columns))
+    return np.memmap(output_path, dtype=np.dtype(meta['dtype']), mode='r',
+                     shape=(n_rows, n_columns))
@@ -0,0 +1,280 @@
+#! /usr/env/python
+"""
+incremental_routing.py: D8 flow routing that reuses the previous solution.
+
+:class:`IncrementalFlowRouter` is a drop-in replacement for
+``FlowRouter.route_flow`` on a RasterModelGrid for drivers that route flow
+over and over on a slowly changing surface. Its first call routes flow from
+scratch. Each later call
+
+1. recomputes the steepest-descent receivers (a single vectorized pass),
+2. finds the nodes whose receiver changed since the previous call, and
+3. for each of them, subtracts that node's upstream totals from the nodes
+   along its old flow path, adds them along its new one, and moves its
+   subtree to just after its new receiver in the upstream ordering.
+
+Only the flow paths below the changed nodes are touched, so the cost of the
+update is proportional to the amount of change rather than to the size of
+the grid. If more than a given fraction of the receivers change, it simply
+rebuilds everything. A rebuild walks the drainage network level by level,
+from the base level nodes up, with one set of whole-array operations per
+level, so it takes as many numpy calls as the longest flow path has nodes.
+
+The upstream ordering is kept as a depth-first (pre-order) stack, in which
+the subtree above every node is stored contiguously, right after the node
+itself. That is what makes moving a subtree a matter of two slice copies.
+The router keeps its own copy of the receivers, the stack and the upstream
+node counts, and rewrites every output field in full at every call, so
+other code may overwrite the output fields between calls.
+
+Changed nodes are processed in order of increasing elevation. This
+guarantees that a node's new receiver is never inside its own, not yet
+updated, subtree, so no intermediate state contains a loop.
+
+Results are written to the same fields ``FlowRouter`` uses in these
+drivers: ``flow_receiver``, ``topographic__steepest_slope``,
+``links_to_flow_receiver``, ``upstream_node_order``, ``drainage_area`` and
+``water__volume_flux``. Ties between equally steep neighbors go to the
+first neighbor in the order E, N, W, S, NE, NW, SW, SE, which is also the
+order of ``grid.d8s_at_node``. As with ``FlowRouter``, every node contributes
+the area of a cell to the drainage area, except closed boundary nodes,
+which contribute none. No flow is ever routed to a closed node, so that
+only leaves their own drainage area and discharge at zero.
+"""
+from __future__ import print_function
+
+import numpy as np
+
+from .parallel_accumulation import _concatenate_ranges
+
+
+CLOSED_BOUNDARY = 4
+UNDEFINED_INDEX = -1
+
+
+class IncrementalFlowRouter(object):
+    """
+    Route flow over a raster by steepest descent, updating incrementally.
+
+    Parameters
+    ----------
+    grid : RasterModelGrid
+        The grid; it must have a ``topographic__elevation`` node field.
+    runoff_rate : float, optional
+        Runoff per unit area, used to compute ``water__volume_flux``.
+    rebuild_fraction : float, optional
+        Route from scratch if more than this fraction of the core nodes
+        change receiver in one call.
+    """
+
+    def __init__(self, grid, runoff_rate=1., rebuild_fraction=0.05):
+        self._grid = grid
+        self._runoff_rate = runoff_rate
+        self._rebuild_fraction = rebuild_fraction
+
+        n_nodes = grid.number_of_nodes
+        ncols = grid.shape[1]
+        self._core = np.asarray(grid.core_nodes)
+        offsets = np.array([1, ncols, -1, -ncols,
+                            ncols + 1, ncols - 1, -ncols - 1, -ncols + 1])
+        self._neighbors = self._core[:, np.newaxis] + offsets
+        self._links = np.asarray(grid.d8s_at_node)[self._core]
+        self._distances = np.array([grid.dx] * 4 + [grid.dx * np.sqrt(2.)] * 4)
+        self._cell_area = grid.dx * grid.dx
+
+        for (name, dtype) in (('flow_receiver', int),
+                              ('links_to_flow_receiver', int),
+                              ('upstream_node_order', int),
+                              ('topographic__steepest_slope', float),
+                              ('drainage_area', float),
+                              ('water__volume_flux', float)):
+            if name not in grid.at_node:
+                grid.add_zeros('node', name, dtype=dtype)
+
+        self._receiver = np.arange(n_nodes)
+        self._n_upstream = np.ones(n_nodes, dtype=int)
+        self._stack = np.arange(n_nodes)
+        self._position = np.arange(n_nodes)
+        self._needs_rebuild = True
+        self.n_changed = 0
+
+    @property
+    def stack(self):
+        """Node IDs ordered so that every node comes after its receiver."""
+        return self._stack
+
+    def get_state(self):
+        """The receivers, upstream counts and stack, for a checkpoint."""
+        return {'receiver': self._receiver,
+                'n_upstream': self._n_upstream,
+                'stack': self._stack,
+                'needs_rebuild': self._needs_rebuild}
+
+    def set_state(self, state):
+        """Restore the solution from :meth:`get_state`, to update it."""
+        self._receiver = np.array(state['receiver'], dtype=int)
+        self._n_upstream = np.array(state['n_upstream'], dtype=int)
+        self._stack = np.array(state['stack'], dtype=int)
+        self._position = np.empty(len(self._stack), dtype=int)
+        self._position[self._stack] = np.arange(len(self._stack))
+        self._needs_rebuild = bool(state['needs_rebuild'])
+
+    def _steepest_descent(self):
+        """Compute receivers, slopes and links to receivers from scratch."""
+        z = self._grid.at_node['topographic__elevation']
+        core = self._core
+        slopes = (z[core, np.newaxis] - z[self._neighbors]) / self._distances
+        closed = self._grid.status_at_node[self._neighbors] == CLOSED_BOUNDARY
+        slopes[closed] = -np.inf
+
+        steepest = np.argmax(slopes, axis=1)
+        rows = np.arange(len(core))
+        max_slope = slopes[rows, steepest]
+        downhill = max_slope > 0.
+
+        receiver = np.arange(self._grid.number_of_nodes)
+        receiver[core[downhill]] = self._neighbors[rows, steepest][downhill]
+        slope = np.zeros(self._grid.number_of_nodes)
+        slope[core[downhill]] = max_slope[downhill]
+        link = np.full(self._grid.number_of_nodes, UNDEFINED_INDEX, dtype=int)
+        link[core[downhill]] = self._links[rows, steepest][downhill]
+
+        return (receiver, slope, link)
+
+    def _rebuild(self, receiver):
+        """Rebuild the stack and the upstream node counts from scratch.
+
+        The stack is that of a depth-first walk from every base level node
+        in turn, lowest ID first, that visits the donors of every node
+        highest ID first.
+        """
+        n_nodes = len(receiver)
+        nodes = np.arange(n_nodes)
+        is_base = receiver == nodes
+        donors = np.lexsort((-nodes, receiver))
+        donors_start = np.searchsorted(receiver[donors],
+                                       np.arange(n_nodes + 1))
+
+        # The nodes one step further upstream at every level, grouped by
+        # receiver in the order of the level below.
+        levels = [np.where(is_base)[0]]
+        while len(levels[-1]) > 0:
+            level = donors[_concatenate_ranges(donors_start[levels[-1]],
+                                               donors_start[levels[-1] + 1])]
+            levels.append(level[~is_base[level]])
+        levels.pop()
+
+        n_upstream = np.ones(n_nodes, dtype=int)
+        for level in levels[:0:-1]:
+            np.add.at(n_upstream, receiver[level], n_upstream[level])
+
+        # Every tree takes up a block of the stack as long as its number of
+        # nodes. Within the block of a node, the node comes first, and then
+        # the blocks of its donors, one after the other.
+        position = np.empty(n_nodes, dtype=int)
+        bases = levels[0]
+        position[bases] = np.cumsum(n_upstream[bases]) - n_upstream[bases]
+        for level in levels[1:]:
+            parent = receiver[level]
+            before = np.cumsum(n_upstream[level]) - n_upstream[level]
+            first = np.ones(len(level), dtype=bool)
+            first[1:] = parent[1:] != parent[:-1]
+            first_in_group = np.maximum.accumulate(
+                np.where(first, np.arange(len(level)), 0))
+            position[level] = (position[parent] + 1 + before -
+                               before[first_in_group])
+
+        self._receiver = receiver.copy()
+        self._n_upstream = n_upstream
+        self._position = position
+        self._stack = np.empty(n_nodes, dtype=int)
+        self._stack[position] = nodes
+
+    def _add_along_path(self, node, n_upstream):
+        """Add upstream totals to *node* and every node below it."""
+        receiver = self._receiver
+        while True:
+            self._n_upstream[node] += n_upstream
+            if receiver[node] == node:
+                break
+            node = receiver[node]
+
+    def _move_subtree(self, node, new_receiver):
+        """Move the stack block above *node* to just after *new_receiver*."""
+        stack = self._stack
+        start = self._position[node]
+        size = self._n_upstream[node]
+        target = self._position[new_receiver]
+        block = stack[start:start + size].copy()
+        if target < start:
+            stack[target + 1 + size:start + size] = stack[target + 1:start]
+            stack[target + 1:target + 1 + size] = block
+            (lo, hi) = (target + 1, start + size)
+        else:
+            stack[start:target + 1 - size] = stack[start + size:target + 1]
+            stack[target + 1 - size:target + 1] = block
+            (lo, hi) = (start, target + 1)
+        self._position[stack[lo:hi]] = np.arange(lo, hi)
+
+    def _update(self, receiver, changed):
+        """Apply the receiver changes at nodes *changed* incrementally."""
+        z = self._grid.at_node['topographic__elevation']
+        for node in changed[np.argsort(z[changed], kind='mergesort')]:
+            new_receiver = receiver[node]
+            start = self._position[node]
+            if new_receiver != node and start <= self._position[
+                    new_receiver] < start + self._n_upstream[node]:
+                return False
+            n_upstream = self._n_upstream[node]
+            old_receiver = self._receiver[node]
+            if old_receiver != node:
+                self._add_along_path(old_receiver, -n_upstream)
+            self._receiver[node] = new_receiver
+            if new_receiver != node:
+                self._add_along_path(new_receiver, n_upstream)
+                self._move_subtree(node, new_receiver)
+            else:
+                self._move_to_end(node)
+        return True
+
+    def _move_to_end(self, node):
+        """Move the stack block above *node* to the end, as a new tree."""
+        stack = self._stack
+        start = self._position[node]
+        size = self._n_upstream[node]
+        block = stack[start:start + size].copy()
+        stack[start:-size] = stack[start + size:]
+        stack[-size:] = block
+        self._position[stack[start:]] = np.arange(start, len(stack))
+
+    def route_flow(self):
+        """Route flow over the current topography.
+
+        Returns
+        -------
+        ModelGrid
+            The grid, for consistency with ``FlowRouter.route_flow``.
+        """
+        (receiver, slope, link) = self._steepest_descent()
+        at_node = self._grid.at_node
+
+        changed = np.where(receiver != self._receiver)[0]
+        self.n_changed = len(changed)
+        rebuild = (self._needs_rebuild or self.n_changed >
+                   self._rebuild_fraction * len(self._core))
+        if not rebuild and self.n_changed > 0:
+            rebuild = not self._update(receiver, changed)
+        if rebuild:
+            self._rebuild(receiver)
+            self._needs_rebuild = False
+
+        is_closed = self._grid.status_at_node == CLOSED_BOUNDARY
+        area = np.where(is_closed, 0., self._cell_area * self._n_upstream)
+        at_node['drainage_area'][:] = area
+        at_node['water__volume_flux'][:] = self._runoff_rate * area
+        at_node['flow_receiver'][:] = receiver
+        at_node['topographic__steepest_slope'][:] = slope
+        at_node['links_to_flow_receiver'][:] = link
+        at_node['upstream_node_order'][:] = self._stack
+
+        return self._grid
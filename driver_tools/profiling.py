@@ -0,0 +1,271 @@
+#! /usr/env/python
+"""
+profiling.py: a per-component breakdown of where a driver spends its time.
+
+Drivers used to time themselves with a single ``time.time()`` (or
+``time.clock()``) around the whole run. A :class:`Profiler` wraps the calls
+that do the work instead, such as ``diffuse``, ``route_flow``, ``erode``,
+``overland_flow``, ``update`` or ``run``, and records for every one of them
+the number of calls and their wall time. Blocks of driver code can be timed
+as well, with :meth:`Profiler.section`.
+
+With memory tracing on, the profiler also records how much memory every call
+allocates, using :mod:`tracemalloc` (Python 3.4 and later; NumPy reports its
+array allocations to it). Tracing slows a run down noticeably, so it is off
+by default.
+
+At the end of a run, :meth:`Profiler.finish` returns a printable table and,
+if the profiler has a report file, writes the same breakdown there as JSON.
+Drivers make their profiler with :meth:`Profiler.from_environment`, so a run
+is profiled into a file by setting, for instance::
+
+    $ LANDLAB_DRIVERS_PROFILE=perron.json python drive_perron.py
+
+and with memory tracing by also setting ``LANDLAB_DRIVERS_PROFILE_MEMORY=1``.
+"""
+from __future__ import print_function
+
+import os
+import json
+import time
+import functools
+from contextlib import contextmanager
+
+try:
+    import tracemalloc
+except ImportError:  # Python 2
+    tracemalloc = None
+
+_timer = getattr(time, 'perf_counter', time.time)
+
+
+class _CallStats(object):
+
+    def __init__(self, component, method):
+        self.component = component
+        self.method = method
+        self.calls = 0
+        self.wall_time = 0.
+        self.max_time = 0.
+        self.peak_alloc_bytes = 0
+        self.net_alloc_bytes = 0
+
+    def as_dict(self, total_time, trace_memory):
+        stats = {'component': self.component,
+                 'method': self.method,
+                 'calls': self.calls,
+                 'wall_time': self.wall_time,
+                 'mean_time': self.wall_time / max(self.calls, 1),
+                 'max_time': self.max_time,
+                 'fraction': self.wall_time / total_time if total_time else 0.}
+        if trace_memory:
+            stats['peak_alloc_bytes'] = self.peak_alloc_bytes
+            stats['net_alloc_bytes'] = self.net_alloc_bytes
+        return stats
+
+
+class Profiler(object):
+    """
+    Record calls, wall time and allocations per component.
+
+    Parameters
+    ----------
+    report_path : str, optional
+        File that :meth:`finish` writes the JSON report to.
+    trace_memory : bool, optional
+        Also record the memory allocated by every call; ignored where
+        :mod:`tracemalloc` is not available.
+    """
+
+    def __init__(self, report_path=None, trace_memory=False):
+        self._report_path = report_path
+        self._trace_memory = bool(trace_memory) and tracemalloc is not None
+        self._stats = {}
+        self._order = []
+        self._stack = []
+        self._top_level_time = 0.
+        if self._trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self._start = _timer()
+
+    @classmethod
+    def from_environment(cls):
+        """A profiler configured by environment variables.
+
+        ``LANDLAB_DRIVERS_PROFILE`` names the report file, and
+        ``LANDLAB_DRIVERS_PROFILE_MEMORY`` turns on memory tracing if set
+        to anything but ``0``.
+        """
+        return cls(report_path=os.environ.get('LANDLAB_DRIVERS_PROFILE'),
+                   trace_memory=os.environ.get(
+                       'LANDLAB_DRIVERS_PROFILE_MEMORY', '0') != '0')
+
+    def _stats_for(self, component, method):
+        key = (component, method)
+        if key not in self._stats:
+            self._stats[key] = _CallStats(component, method)
+            self._order.append(key)
+        return self._stats[key]
+
+    def _enter(self):
+        frame = {'start': _timer()}
+        if self._trace_memory:
+            (current, peak) = tracemalloc.get_traced_memory()
+            if self._stack:
+                parent = self._stack[-1]
+                parent['peak'] = max(parent['peak'], peak)
+            if hasattr(tracemalloc, 'reset_peak'):
+                tracemalloc.reset_peak()
+            frame['memory'] = current
+            frame['peak'] = current
+        self._stack.append(frame)
+
+    def _exit(self, stats):
+        frame = self._stack.pop()
+        elapsed = _timer() - frame['start']
+        stats.calls += 1
+        stats.wall_time += elapsed
+        stats.max_time = max(stats.max_time, elapsed)
+        if not self._stack:
+            self._top_level_time += elapsed
+        if self._trace_memory:
+            (current, peak) = tracemalloc.get_traced_memory()
+            peak = max(peak, frame['peak'])
+            stats.peak_alloc_bytes = max(stats.peak_alloc_bytes,
+                                         peak - frame['memory'])
+            stats.net_alloc_bytes += current - frame['memory']
+            if self._stack:
+                parent = self._stack[-1]
+                parent['peak'] = max(parent['peak'], peak)
+
+    def wrap_function(self, func, component, method=None):
+        """A version of *func* whose calls are recorded.
+
+        Parameters
+        ----------
+        func : callable
+            The function to time.
+        component : str
+            Name of the component the calls are reported under.
+        method : str, optional
+            Name of the call in the report; by default that of *func*.
+        """
+        stats = self._stats_for(component,
+                                method or getattr(func, '__name__', 'call'))
+
+        @functools.wraps(func)
+        def recorded(*args, **kwds):
+            self._enter()
+            try:
+                return func(*args, **kwds)
+            finally:
+                self._exit(stats)
+
+        return recorded
+
+    def wrap(self, component, *methods, **kwds):
+        """Record calls to methods of a component.
+
+        The methods are replaced on the component instance only, so the
+        component is used exactly as before.
+
+        Parameters
+        ----------
+        component : object
+            A landlab component (or any other object).
+        methods : str
+            Names of the methods to record.
+        name : str, optional
+            Name of the component in the report; by default its class name.
+
+        Returns
+        -------
+        object
+            The component.
+        """
+        name = kwds.pop('name', None) or type(component).__name__
+        for method in methods:
+            setattr(component, method,
+                    self.wrap_function(getattr(component, method), name,
+                                       method))
+        return component
+
+    @contextmanager
+    def section(self, component, method):
+        """Record a block of code, as ``with profiler.section(...):``."""
+        stats = self._stats_for(component, method)
+        self._enter()
+        try:
+            yield
+        finally:
+            self._exit(stats)
+
+    def report(self, import_times=None):
+        """The breakdown so far, as a JSON-serializable dict.
+
+        Calls are listed by decreasing wall time. A call made from within
+        another recorded call counts towards both, so only the time outside
+        any recorded call is reported as unaccounted for.
+
+        Parameters
+        ----------
+        import_times : dict, optional
+            Import time of every component, as from
+            :meth:`~driver_tools.components.ComponentRegistry.import_times`,
+            to include in the report.
+        """
+        total_time = _timer() - self._start
+        calls = [self._stats[key].as_dict(total_time, self._trace_memory)
+                 for key in self._order]
+        calls.sort(key=lambda stats: stats['wall_time'], reverse=True)
+        report = {'wall_time': total_time,
+                  'unaccounted_time': total_time - self._top_level_time,
+                  'memory_traced': self._trace_memory,
+                  'calls': calls}
+        if import_times is not None:
+            report['import_times'] = dict(import_times)
+        return report
+
+    def summary(self, report=None):
+        """The breakdown as a printable table."""
+        report = report or self.report()
+        header = '%-24s %-18s %8s %11s %11s %7s' % (
+            'component', 'method', 'calls', 'wall time', 'per call', '%')
+        if report['memory_traced']:
+            header += ' %12s' % 'peak alloc'
+        lines = [header]
+        for stats in report['calls']:
+            line = '%-24s %-18s %8d %10.3fs %10.2es %6.1f%%' % (
+                stats['component'], stats['method'], stats['calls'],
+                stats['wall_time'], stats['mean_time'],
+                100. * stats['fraction'])
+            if report['memory_traced']:
+                line += ' %10.1fMB' % (stats['peak_alloc_bytes'] / 1e6)
+            lines.append(line)
+        lines.append('Total wall time: %.3f s (%.3f s outside recorded calls)'
+                     % (report['wall_time'], report['unaccounted_time']))
+        if 'import_times' in report:
+            import_times = report['import_times']
+            lines.append('Components imported: %s (%.3f s)' % (
+                ', '.join(sorted(import_times)) or 'none',
+                sum(import_times.values())))
+        return '\n'.join(lines)
+
+    def finish(self, import_times=None):
+        """Write the report, if there is a report file, and summarize it.
+
+        Parameters
+        ----------
+        import_times : dict, optional
+            Import time of every component, to include in the report.
+
+        Returns
+        -------
+        str
+            The breakdown as a printable table.
+        """
+        report = self.report(import_times=import_times)
+        if self._report_path is not None:
+            with open(self._report_path, 'w') as fp:
+                json.dump(report, fp, indent=2)
+        return self.summary(report)
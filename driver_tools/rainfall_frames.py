@@ -0,0 +1,229 @@
+#! /usr/bin/env python
+"""
+rainfall_frames.py: spatially varying rainfall, streamed from disk.
+
+Radar rainfall comes as a sequence of gridded frames, each giving the
+rainfall intensity at every node at one time. A multi-day event on a large
+basin is far too big to hold in memory, so the frames are stored as
+
+*  ``<name>.rain``, the frames as raw, little-endian binary values, one
+   after the other, each in landlab node order (bottom row first), and
+*  ``<name>.rain.json``, a sidecar header with the grid shape, the data
+   type, and the time of every frame,
+
+in the same way as the binary DEMs of :mod:`dem_io`. :class:`RainfallFrames`
+memory-maps the file and, given a model time, interpolates linearly between
+the two frames on either side of it. Only those two frames are ever copied
+out of the map; as the model time moves on, the later frame is reused as the
+earlier one and the next frame is read. Before the first frame and after the
+last, the intensity is zero.
+
+The intensities are in m/s, like ``OverlandFlow.rainfall_intensity``, which
+may be set to the array returned by :meth:`RainfallFrames.intensity_at`.
+
+To convert a sequence of ESRI ASCII rasters, one per frame, run (from the
+top of the repository)::
+
+    $ python -m driver_tools.rainfall_frames storm.rain --interval 300 \\
+          frame_*.asc
+
+The rasters are read one at a time, so they never all have to fit in memory
+either.
+"""
+from __future__ import print_function
+
+import os
+import json
+
+import numpy as np
+
+from .dem_io import read_esri_ascii_header
+
+
+class RainfallFrameWriter(object):
+    """
+    Write rainfall frames to disk, one at a time.
+
+    Parameters
+    ----------
+    path : str
+        The binary file to write; the header goes to the same name plus
+        ``.json`` when the writer is closed.
+    shape : tuple of int
+        Number of rows and columns of the grid.
+    dtype : str, optional
+        Data type of the binary values.
+    """
+
+    def __init__(self, path, shape, dtype='<f4'):
+        self._path = path
+        self._shape = (int(shape[0]), int(shape[1]))
+        self._dtype = np.dtype(dtype)
+        self._times = []
+        self._fp = open(path + '.tmp', 'wb')
+
+    def add_frame(self, time, intensity):
+        """Append the intensity at every node (in m/s) at *time*."""
+        if self._times and time <= self._times[-1]:
+            raise ValueError('frame times must increase')
+        intensity = np.asarray(intensity, dtype=self._dtype).reshape(-1)
+        if intensity.size != self._shape[0] * self._shape[1]:
+            raise ValueError('expected %d values, found %d' %
+                             (self._shape[0] * self._shape[1],
+                              intensity.size))
+        intensity.tofile(self._fp)
+        self._times.append(float(time))
+
+    def close(self):
+        """Finish the file and write its header."""
+        self._fp.close()
+        meta = {'nrows': self._shape[0],
+                'ncols': self._shape[1],
+                'dtype': self._dtype.str,
+                'times': self._times}
+        with open(self._path + '.tmp.json', 'w') as fp:
+            json.dump(meta, fp, indent=2)
+        os.rename(self._path + '.tmp', self._path)
+        os.rename(self._path + '.tmp.json', self._path + '.json')
+
+
+def convert_esri_ascii_frames(asc_paths, times, path, scale=1.,
+                              dtype='<f4'):
+    """Convert a sequence of ESRI ASCII rasters to a rainfall frame file.
+
+    Parameters
+    ----------
+    asc_paths : sequence of str
+        One ESRI ASCII raster per frame.
+    times : sequence of float
+        Time of every frame, in s.
+    path : str
+        The binary file to write.
+    scale : float, optional
+        Factor converting the raster values to m/s (for instance, 1 / 3.6e6
+        for rasters in mm/hr).
+    dtype : str, optional
+        Data type of the binary values.
+
+    Returns
+    -------
+    str
+        Path to the rainfall frame file.
+    """
+    writer = None
+    for (asc_path, time) in zip(asc_paths, times):
+        with open(asc_path, 'r') as fp:
+            (header, first_line) = read_esri_ascii_header(fp)
+            values = np.array((first_line + fp.read()).split(), dtype=float)
+        (nrows, ncols) = (int(header['nrows']), int(header['ncols']))
+        if 'nodata_value' in header:
+            values[values == header['nodata_value']] = 0.
+        values = np.flipud(values.reshape((nrows, ncols))) * scale
+        if writer is None:
+            writer = RainfallFrameWriter(path, (nrows, ncols), dtype=dtype)
+        writer.add_frame(time, values)
+    writer.close()
+    return path
+
+
+class RainfallFrames(object):
+    """
+    Rainfall intensity at every node, interpolated between frames on disk.
+
+    Parameters
+    ----------
+    path : str
+        A rainfall frame file.
+    """
+
+    def __init__(self, path):
+        with open(path + '.json', 'r') as fp:
+            meta = json.load(fp)
+        self._times = np.array(meta['times'], dtype=float)
+        n_nodes = meta['nrows'] * meta['ncols']
+        self._frames = np.memmap(path, dtype=np.dtype(meta['dtype']),
+                                 mode='r', shape=(len(self._times), n_nodes))
+        self._zero = np.zeros(n_nodes)
+        self._index = None
+        self._before = None
+        self._after = None
+
+    @property
+    def times(self):
+        """Time of every frame."""
+        return self._times
+
+    @property
+    def end_time(self):
+        """Time of the last frame, after which no rain falls."""
+        return self._times[-1]
+
+    def _load_pair(self, index):
+        """Copy frames *index* and *index* + 1 out of the map."""
+        if self._index is not None and index == self._index + 1:
+            self._before = self._after
+        else:
+            self._before = np.array(self._frames[index], dtype=float)
+        self._after = np.array(self._frames[index + 1], dtype=float)
+        self._index = index
+
+    def intensity_at(self, time, out=None):
+        """Rainfall intensity at every node at *time*.
+
+        Parameters
+        ----------
+        time : float
+            Model time.
+        out : ndarray, optional
+            Array to write the intensities to.
+
+        Returns
+        -------
+        ndarray
+            The intensity at every node.
+        """
+        if out is None:
+            out = np.empty_like(self._zero)
+        times = self._times
+        if time < times[0] or time > times[-1] or len(times) == 1:
+            if len(times) == 1 and time == times[0]:
+                out[:] = self._frames[0]
+            else:
+                out[:] = self._zero
+            return out
+
+        index = min(np.searchsorted(times, time, side='right') - 1,
+                    len(times) - 2)
+        if index != self._index:
+            self._load_pair(index)
+        weight = (time - times[index]) / (times[index + 1] - times[index])
+        np.multiply(self._after, weight, out=out)
+        out += (1. - weight) * self._before
+        return out
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Convert ESRI ASCII rainfall rasters to a frame file')
+    parser.add_argument('output', help='Rainfall frame file to write')
+    parser.add_argument('files', nargs='+',
+                        help='ESRI ASCII rasters, one per frame, in order')
+    parser.add_argument('--interval', type=float, required=True,
+                        help='Time between frames, in s')
+    parser.add_argument('--start', type=float, default=0.,
+                        help='Time of the first frame, in s')
+    parser.add_argument('--scale', type=float, default=1.,
+                        help='Factor converting raster values to m/s')
+
+    args = parser.parse_args()
+
+    times = args.start + args.interval * np.arange(len(args.files))
+    convert_esri_ascii_frames(args.files, times, args.output,
+                              scale=args.scale)
+    print('Wrote', args.output)
+
+
+if __name__ == '__main__':
+    main()
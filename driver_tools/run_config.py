@@ -0,0 +1,138 @@
+#! /usr/env/python
+"""
+run_config.py: how a driver is run, on screen or headless.
+
+Every driver used to import pylab (or matplotlib, or CAPlotter) when it was
+imported, and to draw and ``show()`` its results when it was done. That costs
+seconds of startup, and needs a display, which batch nodes do not have. A
+:class:`RunConfig` holds the settings every driver is run with, read from
+the environment:
+
+``LANDLAB_DRIVERS_HEADLESS``
+    Set to anything but ``0`` to run headless: the driver never imports a
+    plotting module, and saves the arrays it would have plotted with
+    :meth:`RunConfig.dump` instead.
+``LANDLAB_DRIVERS_OUTPUT``
+    Directory the arrays are saved to; ``output`` by default.
+``LANDLAB_DRIVERS_PROFILE`` and ``LANDLAB_DRIVERS_PROFILE_MEMORY``
+    The profiling report and memory tracing of :meth:`RunConfig.profiler`
+    (see profiling.py).
+
+Drivers read their configuration before they import landlab, so that, when
+headless, anything that does import matplotlib gets its non-interactive
+Agg backend rather than looking for a display::
+
+    $ LANDLAB_DRIVERS_HEADLESS=1 python drive_perron.py
+
+Each dump is an uncompressed ``.npz`` file, ``<output>/<name>.npz``, that
+loads back with ``numpy.load``. The CellLab-CTS drivers get their plotter
+from :meth:`RunConfig.ca_plotter`, which, headless, is a stand-in that
+draws nothing and dumps the final node states when it is finalized.
+"""
+from __future__ import print_function
+
+import os
+
+import numpy as np
+
+from .profiling import Profiler
+from .components import components
+
+
+def _flag(name):
+    return os.environ.get(name, '0') not in ('', '0')
+
+
+class _HeadlessCAPlotter(object):
+
+    """Takes the place of CAPlotter in a headless run."""
+
+    def __init__(self, ca, name, config):
+        self._ca = ca
+        self._name = name
+        self._config = config
+
+    def update_plot(self):
+        pass
+
+    def finalize(self):
+        self._config.dump(self._name, node_state=self._ca.node_state)
+
+
+class RunConfig(object):
+    """
+    Settings a driver is run with.
+
+    Parameters
+    ----------
+    headless : bool, optional
+        Skip plotting, and dump the plotted arrays instead.
+    output_dir : str, optional
+        Directory for the dumps.
+    profile_path : str, optional
+        File for the profiling report, if any.
+    trace_memory : bool, optional
+        Have the profiler record allocations too.
+    """
+
+    def __init__(self, headless=False, output_dir='output', profile_path=None,
+                 trace_memory=False):
+        self.headless = bool(headless)
+        self.output_dir = output_dir
+        self.profile_path = profile_path
+        self.trace_memory = bool(trace_memory)
+        if self.headless:
+            os.environ.setdefault('MPLBACKEND', 'Agg')
+
+    @classmethod
+    def from_environment(cls):
+        """The configuration set by the environment variables."""
+        return cls(headless=_flag('LANDLAB_DRIVERS_HEADLESS'),
+                   output_dir=os.environ.get('LANDLAB_DRIVERS_OUTPUT',
+                                             'output'),
+                   profile_path=os.environ.get('LANDLAB_DRIVERS_PROFILE'),
+                   trace_memory=_flag('LANDLAB_DRIVERS_PROFILE_MEMORY'))
+
+    def profiler(self):
+        """A :class:`~driver_tools.profiling.Profiler` for the run."""
+        return Profiler(report_path=self.profile_path,
+                        trace_memory=self.trace_memory)
+
+    def ca_plotter(self, ca, name, **kwds):
+        """A CAPlotter for a CellLab-CTS model, unless headless.
+
+        Parameters
+        ----------
+        ca : CellLabCTSModel
+            The model.
+        name : str
+            Name of the dump of the final node states, when headless.
+        kwds : keywords
+            Passed on to CAPlotter.
+        """
+        if self.headless:
+            return _HeadlessCAPlotter(ca, name, self)
+        return components.create('CAPlotter', ca, **kwds)
+
+    def dump(self, name, **arrays):
+        """Save arrays, in place of plotting them.
+
+        Parameters
+        ----------
+        name : str
+            Name of the dump; the arrays are saved to
+            ``<output_dir>/<name>.npz``.
+        arrays : array_like
+            The arrays, by name.
+
+        Returns
+        -------
+        str
+            Path to the dump.
+        """
+        if not os.path.isdir(self.output_dir):
+            os.makedirs(self.output_dir)
+        path = os.path.join(self.output_dir, name + '.npz')
+        np.savez(path, **arrays)
+        print('Saved', ', '.join(sorted(arrays)), 'to', path)
+        return path
@@ -0,0 +1,90 @@
+"""
+ActiveDomainOverlandFlow against landlab's OverlandFlow on the test basins.
+
+A one-hour storm of the drivers' intensity is routed across each basin by
+both solvers, for three hours. The outlet hydrographs must agree to within
+
+*  1% of the OverlandFlow peak discharge at every time,
+*  1% in the peak discharge itself, and
+*  1% in the volume of water that has left through the outlet.
+"""
+import os
+
+import numpy as np
+import pytest
+
+pytest.importorskip('landlab')
+
+from driver_tools.basins import (set_up_basin, outlet_gauge,
+                                 LONG_BASIN_OUTLET, SQUARE_BASIN_OUTLET)
+from driver_tools.gauges import GaugeIndex
+from driver_tools.active_domain_flow import ActiveDomainOverlandFlow
+
+BASIN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                         os.pardir, os.pardir, 'component_drivers',
+                         'overland_flow')
+BASINS = [('Long_TestBasin_Outlet50.asc', LONG_BASIN_OUTLET),
+          ('Square_TestBasin_Outlet100.asc', SQUARE_BASIN_OUTLET)]
+
+STORM_INTENSITY = 4.07222e-7
+STORM_DURATION = 3600.
+RUN_TIME = 3. * 3600.
+
+
+def _basin(dem_name, outlet):
+    from landlab.io import read_esri_ascii
+
+    (rmg, z) = read_esri_ascii(os.path.join(BASIN_DIR, dem_name))
+    set_up_basin(rmg, z, [outlet])
+    gauges = GaugeIndex(rmg, [outlet_gauge(outlet, rmg.dx)])
+    return (rmg, gauges.element('outlet'))
+
+
+def _hydrograph(rmg, of, outlet_link):
+    """Time and outlet discharge at every step of a storm."""
+    (times, discharge) = ([], [])
+    elapsed_time = 1.
+    while elapsed_time < RUN_TIME:
+        if elapsed_time < STORM_DURATION:
+            of.rainfall_intensity = STORM_INTENSITY
+        else:
+            of.rainfall_intensity = 0.
+        of.overland_flow()
+        times.append(elapsed_time)
+        discharge.append(abs(of.q[outlet_link]) * rmg.dx)
+        elapsed_time += of.dt
+    return (np.array(times), np.array(discharge))
+
+
+@pytest.mark.parametrize(('dem_name', 'outlet'), BASINS)
+def test_matches_overland_flow(dem_name, outlet):
+    from landlab.components.overland_flow.generate_overland_flow_deAlmeida \
+        import OverlandFlow
+
+    (rmg, outlet_link) = _basin(dem_name, outlet)
+    (time_full, q_full) = _hydrograph(
+        rmg, OverlandFlow(rmg, use_fixed_links=True), outlet_link)
+
+    (rmg, outlet_link) = _basin(dem_name, outlet)
+    (time_wet, q_wet) = _hydrograph(
+        rmg, ActiveDomainOverlandFlow(rmg, wet_depth=0.0001), outlet_link)
+
+    peak = np.amax(q_full)
+    assert peak > 0.
+    assert np.amax(np.abs(np.interp(time_full, time_wet, q_wet) - q_full)) \
+        <= 0.01 * peak
+    assert abs(np.amax(q_wet) - peak) <= 0.01 * peak
+    volume_full = np.sum(q_full[:-1] * np.diff(time_full))
+    volume_wet = np.sum(q_wet[:-1] * np.diff(time_wet))
+    assert abs(volume_wet - volume_full) <= 0.01 * volume_full
+
+
+def test_discharge_is_grid_field():
+    (rmg, _) = _basin(*BASINS[1])
+    of = ActiveDomainOverlandFlow(rmg)
+    of.rainfall_intensity = STORM_INTENSITY
+    for _ in range(10):
+        of.overland_flow()
+    assert of.q is rmg.at_link['water_discharge']
+    assert of.h is rmg.at_node['water_depth']
+    assert np.any(rmg.at_link['water_discharge'] != 0.)
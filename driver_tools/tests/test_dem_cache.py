@@ -0,0 +1,146 @@
+"""
+DEM cache keys must change whenever the setup function does, least recently
+used entries must be evicted first, and a grid restored from the cache must
+be the one that was stored.
+"""
+import os
+
+import numpy as np
+import pytest
+
+from driver_tools.dem_cache import DEMCache
+
+SETUP = '''
+def set_up(grid, z, outlet_node):
+    grid.status_at_node[outlet_node] = %d
+'''
+
+
+def _setup(source, filename='<string>'):
+    namespace = {}
+    exec(compile(source, filename, 'exec'), namespace)
+    return namespace['set_up']
+
+
+def _cache_and_dem(tmpdir):
+    dem = tmpdir.join('dem.asc')
+    dem.write('ncols 2\nnrows 2\nxllcorner 0\nyllcorner 0\ncellsize 1\n'
+              '1 2\n3 4\n')
+    return (DEMCache(cache_dir=str(tmpdir.join('cache'))), str(dem))
+
+
+def test_key_follows_setup_source(tmpdir):
+    (cache, dem) = _cache_and_dem(tmpdir)
+    keys = []
+    for (name, status) in (('a.py', 1), ('b.py', 1), ('c.py', 4)):
+        path = tmpdir.join(name)
+        path.write(SETUP % status)
+        keys.append(cache.key(dem, _setup(SETUP % status, str(path)),
+                              {'outlet_node': 0}))
+    assert keys[0] == keys[1]
+    assert keys[0] != keys[2]
+
+
+def test_key_follows_setup_code_without_source(tmpdir):
+    (cache, dem) = _cache_and_dem(tmpdir)
+    (open_outlet, closed_outlet) = (_setup(SETUP % 1), _setup(SETUP % 4))
+    assert open_outlet.__name__ == closed_outlet.__name__
+    assert (cache.key(dem, open_outlet, {'outlet_node': 0}) ==
+            cache.key(dem, _setup(SETUP % 1), {'outlet_node': 0}))
+    assert (cache.key(dem, open_outlet, {'outlet_node': 0}) !=
+            cache.key(dem, closed_outlet, {'outlet_node': 0}))
+
+
+def test_key_follows_options(tmpdir):
+    (cache, dem) = _cache_and_dem(tmpdir)
+    set_up = _setup(SETUP % 1)
+    assert (cache.key(dem, set_up, {'outlet_node': 0}) !=
+            cache.key(dem, set_up, {'outlet_node': 1}))
+
+
+def _entry(cache_dir, name, n_bytes, mtime):
+    path = cache_dir.mkdir(name)
+    path.join('values.npy').write(b'x' * n_bytes, mode='wb')
+    os.utime(str(path), (mtime, mtime))
+    return path
+
+
+def _entries(cache_dir):
+    return sorted(path.basename for path in cache_dir.listdir()
+                  if path.isdir())
+
+
+@pytest.mark.parametrize(('max_bytes', 'kept'),
+                         [(300, ['a', 'b', 'c']), (250, ['b', 'c']),
+                          (200, ['b', 'c']), (199, ['c']), (10, ['c'])])
+def test_evict_least_recently_used_first(tmpdir, max_bytes, kept):
+    cache_dir = tmpdir.join('cache')
+    cache = DEMCache(cache_dir=str(cache_dir), max_bytes=max_bytes)
+    _entry(cache_dir, 'b', 100, 2000.)
+    _entry(cache_dir, 'c', 100, 3000.)
+    _entry(cache_dir, 'a', 100, 1000.)
+    cache._evict()
+    assert _entries(cache_dir) == kept
+
+
+def test_evict_keeps_last_entry(tmpdir):
+    cache_dir = tmpdir.join('cache')
+    cache = DEMCache(cache_dir=str(cache_dir), max_bytes=10)
+    _entry(cache_dir, 'only', 1000, 1000.)
+    cache._evict()
+    assert _entries(cache_dir) == ['only']
+
+
+def test_evict_skips_partial_entries_and_hash_index(tmpdir):
+    (cache, dem) = _cache_and_dem(tmpdir)
+    cache_dir = tmpdir.join('cache')
+    cache.file_hash(dem)
+    _entry(cache_dir, 'partial.tmp', 1000, 500.)
+    _entry(cache_dir, 'a', 100, 1000.)
+    _entry(cache_dir, 'b', 100, 2000.)
+    cache._max_bytes = 150
+    cache._evict()
+    assert _entries(cache_dir) == ['b', 'partial.tmp']
+    assert cache_dir.join('file_hashes.json').isfile()
+
+
+def set_up_test_dem(grid, z, outlet_node):
+    grid.at_node['topographic__elevation'] = z
+    grid.add_zeros('link', 'water_discharge')
+    grid.at_node['water_depth'] = np.full(grid.number_of_nodes, 0.5)
+    grid.set_closed_boundaries_at_grid_edges(True, True, True, True)
+    grid.status_at_node[outlet_node] = 1
+    set_up_test_dem.calls += 1
+
+
+set_up_test_dem.calls = 0
+
+
+def test_store_and_restore(tmpdir):
+    pytest.importorskip('landlab')
+
+    dem = tmpdir.join('dem.asc')
+    dem.write('ncols 4\nnrows 3\nxllcorner 0\nyllcorner 0\ncellsize 2\n'
+              '1 2 3 4\n5 6 7 8\n9 10 11 12\n')
+    cache = DEMCache(cache_dir=str(tmpdir.join('cache')))
+    calls = set_up_test_dem.calls
+    (stored, z) = cache.load(str(dem), set_up_test_dem, outlet_node=1)
+    (restored, z_restored) = cache.load(str(dem), set_up_test_dem,
+                                        outlet_node=1)
+
+    assert set_up_test_dem.calls == calls + 1
+    assert restored is not stored
+    assert restored.shape == stored.shape
+    assert restored.dx == stored.dx
+    np.testing.assert_array_equal(z_restored, z)
+    for group in ('node', 'link'):
+        (at_stored, at_restored) = (getattr(stored, 'at_' + group),
+                                    getattr(restored, 'at_' + group))
+        assert sorted(at_restored.keys()) == sorted(at_stored.keys())
+        for name in at_stored.keys():
+            np.testing.assert_array_equal(at_restored[name], at_stored[name])
+    np.testing.assert_array_equal(restored.status_at_node,
+                                  stored.status_at_node)
+    np.testing.assert_array_equal(restored.status_at_link,
+                                  stored.status_at_link)
+    assert restored.status_at_node[1] == 1
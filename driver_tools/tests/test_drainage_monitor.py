@@ -0,0 +1,57 @@
+import numpy as np
+
+from driver_tools.drainage_monitor import DrainageMonitor
+
+
+class _Grid(object):
+
+    """The little of a raster grid that DrainageMonitor reads."""
+
+    def __init__(self, n_core_nodes, dx=1.):
+        self.core_nodes = np.arange(n_core_nodes)
+        self.number_of_core_nodes = n_core_nodes
+        self.dx = dx
+
+
+def _run(monitor, depth_at, n_steps, dt=1.):
+    """Step the monitor through a run, returning when it stopped."""
+    outflow = 0.
+    for step in range(1, n_steps + 1):
+        time = step * dt
+        (depth, discharge) = depth_at(time)
+        outflow += discharge * dt
+        if monitor.update(time, dt, 0., depth, outflow):
+            return time
+    return None
+
+
+def test_drains_despite_film():
+    grid = _Grid(100)
+    film = 0.00005
+
+    def depth_at(time):
+        # A flood that recedes onto a film the solver never drains
+        depth = film + 0.01 * np.exp(-time / 20.) * np.ones(100)
+        return (depth, 10. * np.exp(-time / 20.))
+
+    with_film = DrainageMonitor(grid, 50., check_every=1)
+    assert _run(with_film, depth_at, 2000) is None
+    assert with_film.stored_volume > 1.e-3 * with_film.peak_storage
+
+    monitor = DrainageMonitor(grid, 50., check_every=1, dry_depth=0.0001)
+    stop_time = _run(monitor, depth_at, 2000)
+    assert stop_time is not None and 50. <= stop_time < 2000.
+    assert monitor.drained
+    assert monitor.draining_volume <= 1.e-3 * monitor.peak_storage
+    assert film * 100. <= monitor.stored_volume < 2. * film * 100.
+
+
+def test_dry_storm_drains_once_rain_stops():
+    grid = _Grid(100)
+
+    def depth_at(time):
+        return (np.full(100, 0.00005), 0.)
+
+    monitor = DrainageMonitor(grid, 50., check_every=10, dry_depth=0.0001)
+    assert _run(monitor, depth_at, 2000) == 50.
+    assert monitor.peak_storage == 0.
@@ -0,0 +1,74 @@
+"""
+Gauges and outlets declared by coordinates must resolve to the nearest
+nodes and link midpoints, and an outlet gauge to the link from its outlet
+into the basin.
+"""
+import os
+
+import numpy as np
+import pytest
+
+from driver_tools.gauges import GaugeIndex, nearest_nodes
+from driver_tools.basins import (outlet_gauge, LONG_BASIN_OUTLET,
+                                 SQUARE_BASIN_OUTLET)
+
+
+class _Grid(object):
+
+    """Node coordinates and links of a raster grid."""
+
+    def __init__(self, shape, dx):
+        (n_rows, n_cols) = shape
+        nodes = np.arange(n_rows * n_cols).reshape(shape)
+        self.dx = dx
+        self.node_x = dx * np.tile(np.arange(n_cols), n_rows).astype(float)
+        self.node_y = dx * np.repeat(np.arange(n_rows), n_cols).astype(float)
+        self.node_at_link_tail = np.concatenate((nodes[:, :-1].reshape(-1),
+                                                 nodes[:-1].reshape(-1)))
+        self.node_at_link_head = np.concatenate((nodes[:, 1:].reshape(-1),
+                                                 nodes[1:].reshape(-1)))
+
+
+def test_nearest_nodes():
+    grid = _Grid((4, 5), 30.)
+    points = [(0., 0.), (31., 29.), (119., 89.), (70., 10.)]
+    np.testing.assert_array_equal(nearest_nodes(grid, points),
+                                  [0, 6, 19, 2])
+    assert len(nearest_nodes(grid, [])) == 0
+
+
+def test_node_gauges_use_nearest_nodes():
+    grid = _Grid((4, 5), 30.)
+    points = [(31., 29.), (119., 89.)]
+    gauges = GaugeIndex(grid, [('a', 'node') + points[0],
+                               ('b', 'node') + points[1]])
+    np.testing.assert_array_equal(gauges.nodes, nearest_nodes(grid, points))
+
+
+def test_outlet_gauge_is_link_into_basin():
+    grid = _Grid((4, 5), 30.)
+    outlet = (60., 0.)
+    gauges = GaugeIndex(grid, [outlet_gauge(outlet, grid.dx)])
+    link = gauges.element('outlet')
+    (node,) = nearest_nodes(grid, [outlet])
+    assert grid.node_at_link_tail[link] == node
+    assert grid.node_at_link_head[link] == node + 5
+
+
+@pytest.mark.parametrize(('dem_name', 'outlet', 'outlet_node'), [
+    ('Long_TestBasin_Outlet50.asc', LONG_BASIN_OUTLET, 50),
+    ('Square_TestBasin_Outlet100.asc', SQUARE_BASIN_OUTLET, 100)])
+def test_basin_outlets(dem_name, outlet, outlet_node):
+    pytest.importorskip('landlab')
+    from landlab.io import read_esri_ascii
+    from driver_tools.basins import set_up_basin
+
+    (rmg, z) = read_esri_ascii(os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir,
+        'component_drivers', 'overland_flow', dem_name))
+    set_up_basin(rmg, z, [outlet])
+    assert rmg.status_at_node[outlet_node] == 1
+    link = GaugeIndex(rmg, [outlet_gauge(outlet, rmg.dx)]).element('outlet')
+    assert rmg.node_at_link_tail[link] == outlet_node
+    assert (rmg.node_at_link_head[link] ==
+            outlet_node + rmg.number_of_node_columns)
@@ -0,0 +1,87 @@
+"""
+HydrographRecorder: the record, its integrals and peaks, kept in memory,
+written to disk, or not kept at all.
+"""
+import numpy as np
+import pytest
+
+from driver_tools.hydrograph import HydrographRecorder, read_hydrograph
+
+LINKS = [3, 1]
+NODES = [0]
+
+
+def _series(n_steps=100, seed=0):
+    rng = np.random.RandomState(seed)
+    times = np.cumsum(rng.rand(n_steps))
+    link_values = rng.randn(n_steps, 5)
+    node_values = rng.rand(n_steps, 4)
+    return (times, link_values, node_values)
+
+
+def _record(recorder, series):
+    for (time, at_link, at_node) in zip(*series):
+        recorder.record(time, link_values=at_link, node_values=at_node)
+    return recorder
+
+
+def _expected(series):
+    (times, link_values, node_values) = series
+    values = np.column_stack((link_values[:, LINKS], node_values[:, NODES]))
+    return np.column_stack((times, values))
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 8192])
+def test_record_in_memory(chunk_size):
+    series = _series()
+    recorder = _record(HydrographRecorder(links=LINKS, nodes=NODES,
+                                          chunk_size=chunk_size), series)
+    assert recorder.number_of_samples == len(series[0])
+    np.testing.assert_array_equal(recorder.read(), _expected(series))
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 8192])
+def test_record_on_disk(tmpdir, chunk_size):
+    series = _series()
+    path = str(tmpdir.join('outlet.hydrograph'))
+    recorder = _record(HydrographRecorder(links=LINKS, nodes=NODES,
+                                          output_path=path,
+                                          chunk_size=chunk_size), series)
+    np.testing.assert_array_equal(recorder.read(), _expected(series))
+    np.testing.assert_array_equal(read_hydrograph(path), _expected(series))
+    assert len(recorder._buffer) == chunk_size
+
+
+def test_integrals_and_peaks():
+    series = _series()
+    expected = _expected(series)
+    for keep_record in (True, False):
+        recorder = _record(HydrographRecorder(
+            links=LINKS, nodes=NODES, names=['a', 'b', 'c'],
+            keep_record=keep_record), series)
+        for (column, name) in enumerate(['a', 'b', 'c'], 1):
+            values = np.abs(expected[:, column])
+            integral = np.sum(0.5 * np.diff(expected[:, 0]) *
+                              (values[1:] + values[:-1]))
+            assert np.isclose(recorder.integral(name), integral)
+            peak = np.argmax(values)
+            assert recorder.peak(name) == (expected[peak, 0], values[peak])
+        assert recorder.integral_at_link(1) == recorder.integral('b')
+        assert recorder.integral_at_node(0) == recorder.integral('c')
+
+
+def test_keeps_no_record():
+    series = _series(n_steps=1000)
+    recorder = _record(HydrographRecorder(links=LINKS, nodes=NODES,
+                                          keep_record=False), series)
+    assert recorder.number_of_samples == 1000
+    assert len(recorder._buffer) == 1
+    with pytest.raises(ValueError):
+        recorder.read()
+
+
+def test_peak_of_zero_series():
+    recorder = HydrographRecorder(links=[0], names=['outlet'])
+    for time in (1., 2., 3.):
+        recorder.record(time, link_values=np.zeros(1))
+    assert recorder.peak('outlet') == (1., 0.)
@@ -0,0 +1,55 @@
+"""
+The threaded accumulation must be bitwise identical to the serial walk of
+the stack.
+"""
+import numpy as np
+import pytest
+
+from driver_tools.parallel_accumulation import (
+    AccumulationSchedule, accumulate_serial,
+    find_drainage_area_and_discharge)
+
+
+def _network(n_nodes=20000, n_bases=30, seed=0):
+    """Receivers and stack of a random drainage network."""
+    rng = np.random.RandomState(seed)
+    # In a random order, every node drains to one before it
+    receivers = np.arange(n_nodes)
+    for node in range(n_bases, n_nodes):
+        receivers[node] = rng.randint(max(node - 50, 0), node)
+    labels = rng.permutation(n_nodes)
+    relabeled = np.empty(n_nodes, dtype=int)
+    relabeled[labels] = labels[receivers]
+    return (relabeled, labels, rng)
+
+
+@pytest.mark.parametrize('n_threads', [1, 2, 4, 7])
+def test_matches_serial_walk(n_threads):
+    (receivers, stack, rng) = _network()
+    area = rng.uniform(50., 150., len(receivers))
+    runoff = rng.uniform(0.1, 2., len(receivers))
+
+    (drainage_area, discharge) = find_drainage_area_and_discharge(
+        receivers, stack, node_cell_area=area, runoff=runoff,
+        n_threads=n_threads)
+
+    np.testing.assert_array_equal(
+        drainage_area, accumulate_serial(receivers, stack, area))
+    np.testing.assert_array_equal(
+        discharge, accumulate_serial(receivers, stack, area * runoff))
+
+
+def test_threaded_batches_match_serial_walk():
+    (receivers, stack, rng) = _network()
+    weights = rng.uniform(0., 1., (len(receivers), 2))
+    schedule = AccumulationSchedule(receivers, stack)
+
+    serial = schedule.accumulate(weights)
+    # Small chunks, so that most batches go to the thread pool
+    threaded = schedule.accumulate(weights, n_threads=4, min_chunk=16)
+
+    np.testing.assert_array_equal(threaded, serial)
+    for column in range(2):
+        np.testing.assert_array_equal(
+            threaded[:, column],
+            accumulate_serial(receivers, stack, weights[:, column]))
@@ -0,0 +1,109 @@
+"""
+Rainfall frames written to disk must read back as written, and be
+interpolated linearly between frames, with no rain outside them.
+"""
+import numpy as np
+import pytest
+
+from driver_tools.rainfall_frames import (RainfallFrameWriter, RainfallFrames,
+                                          convert_esri_ascii_frames)
+
+SHAPE = (3, 4)
+TIMES = (100., 400., 500.)
+
+
+def _frames(tmpdir, dtype='<f8'):
+    rng = np.random.RandomState(0)
+    frames = rng.rand(len(TIMES), SHAPE[0] * SHAPE[1])
+    path = str(tmpdir.join('storm.rain'))
+    writer = RainfallFrameWriter(path, SHAPE, dtype=dtype)
+    for (time, frame) in zip(TIMES, frames):
+        writer.add_frame(time, frame.reshape(SHAPE))
+    writer.close()
+    return (path, frames)
+
+
+def test_round_trip(tmpdir):
+    (path, frames) = _frames(tmpdir)
+    assert not tmpdir.join('storm.rain.tmp').check()
+    rainfall = RainfallFrames(path)
+    np.testing.assert_array_equal(rainfall.times, TIMES)
+    for (time, frame) in zip(TIMES, frames):
+        np.testing.assert_array_equal(rainfall.intensity_at(time), frame)
+
+
+def test_round_trip_single_precision(tmpdir):
+    (path, frames) = _frames(tmpdir, dtype='<f4')
+    rainfall = RainfallFrames(path)
+    for (time, frame) in zip(TIMES, frames):
+        np.testing.assert_array_equal(rainfall.intensity_at(time),
+                                      frame.astype(np.float32))
+
+
+def test_interpolates_between_frames(tmpdir):
+    (path, frames) = _frames(tmpdir)
+    rainfall = RainfallFrames(path)
+    out = np.empty(SHAPE[0] * SHAPE[1])
+    # Forward through both intervals, then back to the first
+    for time in (100., 175., 250., 399., 400., 450., 499., 130.):
+        index = 0 if time < 400. else 1
+        weight = (time - TIMES[index]) / (TIMES[index + 1] - TIMES[index])
+        expected = (1. - weight) * frames[index] + weight * frames[index + 1]
+        assert rainfall.intensity_at(time, out=out) is out
+        np.testing.assert_allclose(out, expected, rtol=1e-14)
+
+
+def test_no_rain_outside_frames(tmpdir):
+    (path, _) = _frames(tmpdir)
+    rainfall = RainfallFrames(path)
+    for time in (0., 99.9, 500.1, 1.e6):
+        np.testing.assert_array_equal(rainfall.intensity_at(time), 0.)
+
+
+def test_end_time(tmpdir):
+    (path, frames) = _frames(tmpdir)
+    rainfall = RainfallFrames(path)
+    assert rainfall.end_time == TIMES[-1]
+    np.testing.assert_array_equal(rainfall.intensity_at(rainfall.end_time),
+                                  frames[-1])
+
+
+def test_single_frame(tmpdir):
+    path = str(tmpdir.join('burst.rain'))
+    writer = RainfallFrameWriter(path, SHAPE)
+    writer.add_frame(10., np.full(SHAPE, 2.))
+    writer.close()
+    rainfall = RainfallFrames(path)
+    assert rainfall.end_time == 10.
+    np.testing.assert_array_equal(rainfall.intensity_at(10.), 2.)
+    np.testing.assert_array_equal(rainfall.intensity_at(10.5), 0.)
+
+
+def test_writer_checks_frames(tmpdir):
+    writer = RainfallFrameWriter(str(tmpdir.join('bad.rain')), SHAPE)
+    writer.add_frame(10., np.zeros(SHAPE))
+    with pytest.raises(ValueError):
+        writer.add_frame(10., np.zeros(SHAPE))
+    with pytest.raises(ValueError):
+        writer.add_frame(20., np.zeros(SHAPE[0] * SHAPE[1] - 1))
+    writer.close()
+
+
+def test_convert_esri_ascii_frames(tmpdir):
+    header = ('ncols 2\nnrows 2\nxllcorner 0\nyllcorner 0\ncellsize 1\n'
+              'NODATA_value -9999\n')
+    asc_paths = []
+    for (i, rows) in enumerate(('1 2\n3 4\n', '-9999 6\n7 8\n')):
+        asc_path = tmpdir.join('frame_%d.asc' % i)
+        asc_path.write(header + rows)
+        asc_paths.append(str(asc_path))
+
+    path = convert_esri_ascii_frames(asc_paths, [0., 60.],
+                                     str(tmpdir.join('storm.rain')),
+                                     scale=0.5, dtype='<f8')
+    rainfall = RainfallFrames(path)
+    # Bottom row first, nodata as no rain, scaled
+    np.testing.assert_array_equal(rainfall.intensity_at(0.),
+                                  [1.5, 2., 0.5, 1.])
+    np.testing.assert_array_equal(rainfall.intensity_at(60.),
+                                  [3.5, 4., 0., 3.])
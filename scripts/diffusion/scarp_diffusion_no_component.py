@@ -1,8 +1,17 @@
 #Import statements so that you will have access to the necessary functions
 import numpy
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir, os.pardir))
+from driver_tools.run_config import RunConfig
+
+#Read the run configuration (headless or not, see driver_tools/run_config.py)
+#before importing landlab
+config = RunConfig.from_environment()
+
 from landlab import RasterModelGrid
-from landlab.plot.imshow import imshow_node_grid
-from pylab import show, figure
 
 #Create a raster grid with 25 rows, 40 columns, and cell spacing of 10 m
 mg = RasterModelGrid(25, 40, 10.0)
@@ -19,9 +28,12 @@ fault_y = 50.0 + 0.25*mg.node_x
 upthrown_nodes = numpy.where(mg.node_y>fault_y)
 z[upthrown_nodes] += 10.0 + 0.01*mg.node_x[upthrown_nodes]
 
-#Illustrate the grid
-imshow_node_grid(mg, z, cmap='jet', grid_units=['m','m'])
-show()
+#Illustrate the grid (unless running headless, with nothing to show it on)
+if not config.headless:
+    from landlab.plot.imshow import imshow_node_grid
+    from pylab import show, figure
+    imshow_node_grid(mg, z, cmap='jet', grid_units=['m','m'])
+    show()
 
 #Define paramaters
 kd = 0.01   # 0.01 m2 per year
@@ -41,7 +53,10 @@ for i in range(25):
  	dzdt = -dqsdx
  	z[interior_nodes] += dzdt[interior_nodes]*dt
 
-#Plot new landscape
-figure()
-imshow_node_grid(mg, z, cmap='jet', grid_units=['m','m'])
-show()
+#Plot new landscape, or save it if headless
+if config.headless:
+    config.dump('scarp_diffusion_no_component', elevation=mg.node_vector_to_raster(z))
+else:
+    figure()
+    imshow_node_grid(mg, z, cmap='jet', grid_units=['m','m'])
+    show()
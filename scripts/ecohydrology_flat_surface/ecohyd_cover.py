@@ -0,0 +1,116 @@
+"""
+ecohyd_cover.py: cover of every plant functional type (PFT) through a run.
+
+The cover time series of a run used to be built by looping over its yearly
+PFT maps and masking each map once per PFT. :func:`pft_counts` counts every
+PFT of every map with ``np.bincount`` over the whole (years x cells) array
+instead, a few million values at a time. :class:`CoverAccumulator` keeps
+the counts as the run goes, one small row per year, so the cover time
+series is available without keeping the yearly maps at all.
+"""
+import numpy as np
+
+from ecohyd_records import ChunkedRecord
+
+GRASS = 0
+SHRUB = 1
+TREE = 2
+BARE = 3
+SHRUBSEEDLING = 4
+TREESEEDLING = 5
+
+#: PFT names, in the order of their codes.
+PFT_NAMES = ('grass', 'shrub', 'tree', 'bare', 'shrub_seedling',
+             'tree_seedling')
+
+
+def pft_counts(veg_maps, chunk_size=4 * 1024 ** 2):
+    """Number of cells of every PFT in every map.
+
+    Parameters
+    ----------
+    veg_maps : array_like of int
+        PFT maps, of shape (number of maps, number of cells); may be a
+        memory map.
+    chunk_size : int, optional
+        Number of values counted at a time, which bounds the memory used.
+
+    Returns
+    -------
+    ndarray
+        Array of shape (number of maps, number of PFTs).
+    """
+    (n_maps, n_cells) = np.shape(veg_maps)
+    n_pft = len(PFT_NAMES)
+    counts = np.empty((n_maps, n_pft), dtype=int)
+    step = max(chunk_size // max(n_cells, 1), 1)
+    for start in range(0, n_maps, step):
+        maps = np.asarray(veg_maps[start:start + step], dtype=int)
+        offset = (np.arange(len(maps)) * n_pft).reshape((-1, 1))
+        counts[start:start + len(maps)] = np.bincount(
+            (maps + offset).reshape(-1),
+            minlength=len(maps) * n_pft).reshape((-1, n_pft))
+    return counts
+
+
+def cover_percent(counts):
+    """Percent of the area covered by grass, shrubs and trees.
+
+    Seedlings count towards the cover of their PFT.
+
+    Parameters
+    ----------
+    counts : ndarray
+        Number of cells of every PFT, as returned by :func:`pft_counts`.
+
+    Returns
+    -------
+    tuple of ndarray
+        Grass, shrub and tree cover, in percent.
+    """
+    counts = np.asarray(counts, dtype=float)
+    percent = 100. * counts / counts.sum(axis=-1, keepdims=True)
+    return (percent[..., GRASS],
+            percent[..., SHRUB] + percent[..., SHRUBSEEDLING],
+            percent[..., TREE] + percent[..., TREESEEDLING])
+
+
+class CoverAccumulator(object):
+    """Counts of every PFT, a map at a time.
+
+    Parameters
+    ----------
+    path : str, optional
+        File to write the counts to, as a record of
+        :class:`~ecohyd_records.ChunkedRecord`; by default they are kept in
+        memory.
+    """
+
+    def __init__(self, path=None):
+        self._record = ChunkedRecord(len(PFT_NAMES), dtype='<i8', path=path,
+                                     chunk_bytes=64 * 1024,
+                                     columns=PFT_NAMES)
+
+    @property
+    def number_of_maps(self):
+        """Number of maps counted so far."""
+        return self._record.number_of_rows
+
+    def append(self, veg_type):
+        """Count the PFTs of a map."""
+        self._record.append(np.bincount(np.asarray(veg_type).reshape(-1),
+                                        minlength=len(PFT_NAMES)))
+
+    def close(self):
+        """Write out whatever is still held in memory."""
+        self._record.close()
+
+    @property
+    def counts(self):
+        """Counts of every map so far, of shape (maps, PFTs)."""
+        return self._record.read()
+
+    def fractions(self):
+        """Fraction of cells of every PFT in every map so far."""
+        counts = np.asarray(self.counts, dtype=float)
+        return counts / counts.sum(axis=1, keepdims=True)
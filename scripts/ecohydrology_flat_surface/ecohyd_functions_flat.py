@@ -1,21 +1,33 @@
 # Authors: Sai Nudurupati & Erkan Istanbulluoglu, 21May15
 # Edited: 15Jul16 - to conform to Landlab version 1.
+import os
+import sys
+import json
+import hashlib
+
 import numpy as np
-import matplotlib as mpl
-import matplotlib.pyplot as plt
 
 from landlab import load_params
-from landlab.plot import imshow_grid
-from landlab.components import (PrecipitationDistribution, Radiation,
-                                PotentialEvapotranspiration, SoilMoisture,
-                                Vegetation, VegCA)
 
-GRASS = 0
-SHRUB = 1
-TREE = 2
-BARE = 3
-SHRUBSEEDLING = 4
-TREESEEDLING = 5
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir, os.pardir))
+from driver_tools.components import components
+
+from ecohyd_cover import (GRASS, SHRUB, TREE, BARE, SHRUBSEEDLING,
+                          TREESEEDLING, pft_counts, cover_percent)
+from ecohyd_records import ChunkedRecord
+from ecohyd_storms import SeasonalStorms
+from ecohyd_vegca import VegCAKernel
+
+#: Where PET and radiation lookup tables are cached; override with the
+#: LANDLAB_DRIVERS_CACHE variable.
+PET_CACHE_DIR = os.path.join(os.environ.get(
+    'LANDLAB_DRIVERS_CACHE', os.path.join(os.path.expanduser('~'), '.cache',
+                                          'landlab_drivers')), 'pet')
+
+# Inputs the PET and radiation lookup tables depend on
+PET_KEYS = ('PET_method', 'MeanTmaxF_grass', 'MeanTmaxF_shrub',
+            'MeanTmaxF_tree', 'DeltaD')
 
 
 def compose_veg_grid(grid, percent_bare=0.4, percent_grass=0.2,
@@ -35,7 +47,7 @@ def compose_veg_grid(grid, percent_bare=0.4, percent_grass=0.2,
     return veg_grid
 
 
-def initialize(data, grid, grid1):
+def initialize(data, grid, grid1, seed=None):
     """Initialize random plant type field.
 
     Plant types are defined as the following:
@@ -46,6 +58,10 @@ def initialize(data, grid, grid1):
     *  BARE = 3
     *  SHRUBSEEDLING = 4
     *  TREESEEDLING = 5
+
+    Storms of both seasons are drawn by a :class:`SeasonalStorms`, seeded
+    with *seed*, and the PFTs are updated by a
+    :class:`~ecohyd_vegca.VegCAKernel`.
     """
     grid1.at_cell['vegetation__plant_functional_type'] = compose_veg_grid(
         grid1, percent_bare=data['percent_bare_initial'],
@@ -59,16 +75,10 @@ def initialize(data, grid, grid1):
                                                       1700.)
     grid.at_node['topographic__elevation'] = np.full(grid.number_of_nodes,
                                                      1700.)
-    precip_dry = PrecipitationDistribution(
-        mean_storm_duration=data['mean_storm_dry'],
-        mean_interstorm_duration=data['mean_interstorm_dry'],
-        mean_storm_depth=data['mean_storm_depth_dry'])
-    precip_wet = PrecipitationDistribution(
-        mean_storm_duration=data['mean_storm_wet'],
-        mean_interstorm_duration=data['mean_interstorm_wet'],
-        mean_storm_depth=data['mean_storm_depth_wet'])
-
-    radiation = Radiation(grid)
+    precip = SeasonalStorms(data, seed=seed)
+
+    radiation = components.create('Radiation', grid)
+    PotentialEvapotranspiration = components.get('PotentialEvapotranspiration')
     pet_tree = PotentialEvapotranspiration(grid, method=data['PET_method'],
                                            MeanTmaxF=data['MeanTmaxF_tree'],
                                            delta_d=data['DeltaD'])
@@ -78,9 +88,11 @@ def initialize(data, grid, grid1):
     pet_grass = PotentialEvapotranspiration(grid, method=data['PET_method'],
                                             MeanTmaxF=data['MeanTmaxF_grass'],
                                             delta_d=data['DeltaD'])
-    soil_moisture = SoilMoisture(grid, **data) # Soil Moisture object
-    vegetation = Vegetation(grid, **data) # Vegetation object
-    vegca = VegCA(grid1, **data) # Cellular automaton object
+    soil_moisture = components.create('SoilMoisture', grid,
+                                      **data) # Soil Moisture object
+    vegetation = components.create('Vegetation', grid,
+                                   **data) # Vegetation object
+    vegca = VegCAKernel(grid1, **data) # Cellular automaton object
 
     # Initializing inputs for Soil Moisture object
     grid.at_cell['vegetation__live_leaf_area_index'] = (
@@ -88,30 +100,87 @@ def initialize(data, grid, grid1):
     grid.at_cell['soil_moisture__initial_saturation_fraction'] = (
         0.59 * np.ones(grid.number_of_cells))
 
-    return (precip_dry, precip_wet, radiation, pet_tree, pet_shrub,
-            pet_grass, soil_moisture, vegetation, vegca)
+    return (precip, radiation, pet_tree, pet_shrub, pet_grass,
+            soil_moisture, vegetation, vegca)
 
 
-def empty_arrays(n, grid, grid1):
-    precip = np.empty(n) # Record precipitation
-    inter_storm_dt = np.empty(n) # Record inter storm duration
-    storm_dt = np.empty(n) # Record storm duration
-    time_elapsed = np.empty(n) # To record time elapsed from the start of simulation
+def create_records(sim, grid1, output_dir=None):
+    """Create the records of storms and of yearly PFT maps.
 
-    # Cumulative Water Stress
-    veg_type = np.empty([n / 55, grid1.number_of_cells], dtype=int)
+    Each storm is recorded as (precipitation, storm duration, inter storm
+    duration, time elapsed from the start of simulation). If *output_dir* is
+    given, both records are written to files there as the run goes, so
+    memory use stays fixed however long the run; otherwise they are kept in
+    memory.
+    """
+    if output_dir is not None:
+        storms_path = os.path.join(output_dir, sim + '_Storms.bin')
+        veg_path = os.path.join(output_dir, sim + '_VegType.bin')
+    else:
+        storms_path = veg_path = None
+    storms = ChunkedRecord(4, path=storms_path,
+                           columns=('P', 'Tr', 'Tb', 'CurrentTime'))
+    # PFTs are 0 to 5, so a byte per cell is enough
+    veg_maps = ChunkedRecord(grid1.number_of_cells, dtype='i1', path=veg_path)
+    return (storms, veg_maps)
+
+
+def empty_arrays(grid):
     daily_pet = np.zeros([365, grid.number_of_cells])
     rad_factor = np.empty([365, grid.number_of_cells])
     EP30 = np.empty([365, grid.number_of_cells])
 
     # 30 day average PET to determine season
     pet_threshold = 0  # Initializing pet_threshold to ETThresholddown
-    return (precip, inter_storm_dt, storm_dt, time_elapsed, veg_type,
-            daily_pet, rad_factor, EP30, pet_threshold)
+    return (daily_pet, rad_factor, EP30, pet_threshold)
+
+
+def running_mean_30day(daily_pet, out=None):
+    """Mean of the 30 days before every day of the year.
+
+    The mean for day 0 is the value on day 0 itself; until 30 days have
+    passed, it is over the days so far.
+    """
+    if out is None:
+        out = np.empty_like(daily_pet)
+    cumulative = np.zeros((len(daily_pet) + 1,) + daily_pet.shape[1:])
+    np.cumsum(daily_pet, axis=0, out=cumulative[1:])
+    days = np.arange(1, len(daily_pet))
+    start = np.maximum(days - 30, 0)
+    out[1:] = ((cumulative[days] - cumulative[start]) /
+               (days - start).reshape((-1,) + (1,) * (daily_pet.ndim - 1)))
+    out[0] = daily_pet[0]
+    return out
+
+
+def pet_lookup_path(data, grid, cache_dir=None):
+    """File that caches the PET lookup tables for the inputs *data*."""
+    key = dict((name, data[name]) for name in PET_KEYS)
+    key['number_of_cells'] = int(grid.number_of_cells)
+    sha = hashlib.sha1(json.dumps(key, sort_keys=True).encode('utf-8'))
+    return os.path.join(cache_dir or PET_CACHE_DIR,
+                        'pet_' + sha.hexdigest() + '.npz')
 
 
 def create_pet_lookup(radiation, pet_tree, pet_shrub, pet_grass, daily_pet,
-                      rad_factor, EP30, grid):
+                      rad_factor, EP30, grid, data=None, cache_dir=None):
+    """Fill the daily PET, radiation factor and 30-day mean PET tables.
+
+    If the run inputs, *data*, are given, the tables are cached on disk,
+    keyed by the inputs they depend on (see ``PET_KEYS``), and later runs
+    with the same inputs load them instead of rebuilding them.
+    """
+    path = None
+    if data is not None:
+        path = pet_lookup_path(data, grid, cache_dir=cache_dir)
+        if os.path.isfile(path):
+            with np.load(path) as tables:
+                daily_pet[:] = tables['daily_pet']
+                rad_factor[:] = tables['rad_factor']
+                EP30[:] = tables['EP30']
+            grid.at_cell['radiation__ratio_to_flat_surface'] = rad_factor[-1]
+            return
+
     for i in range(0, 365):
         pet_tree.update(float(i) / 365.25)
         pet_shrub.update(float(i) / 365.25)
@@ -122,27 +191,177 @@ def create_pet_lookup(radiation, pet_tree, pet_shrub, pet_grass, daily_pet,
         radiation.update(float(i) / 365.25)
         rad_factor[i] = grid.at_cell['radiation__ratio_to_flat_surface']
 
-        if i < 30:
-            if i == 0:
-                EP30[0] = daily_pet[0]
+    running_mean_30day(daily_pet, out=EP30)
+
+    if path is not None:
+        if not os.path.isdir(os.path.dirname(path)):
+            try:
+                os.makedirs(os.path.dirname(path))
+            except OSError:
+                pass
+        # Written under a temporary name, so that runs going on at the
+        # same time never load a partial file
+        tmp_path = '%s.%d.tmp' % (path, os.getpid())
+        with open(tmp_path, 'wb') as fp:
+            np.savez(fp, daily_pet=daily_pet, rad_factor=rad_factor,
+                     EP30=EP30)
+        os.rename(tmp_path, path)
+
+
+def run_simulation(data, grid, grid1, n_years, storms, veg_maps, seed=None,
+                   verbose=True, cover=None, profiler=None):
+    """Run the storm loop for *n_years* years.
+
+    *grid* holds one cell of each plant type for the ecohydrologic
+    simulations, and *grid1* the spatially distributed PFTs updated by the
+    cellular automaton once a year. Every storm is appended to *storms* and
+    every yearly PFT map (and the final one) to *veg_maps*, as made by
+    :func:`create_records`. *veg_maps* may be None if the maps are not
+    needed; a :class:`~ecohyd_cover.CoverAccumulator` passed as *cover*
+    still counts the PFTs of every map.
+
+    If *seed* is given it seeds the storms, and NumPy's global random state
+    used for the initial PFTs and by the cellular automaton, so that a run
+    can be repeated.
+
+    A :class:`~driver_tools.profiling.Profiler` passed as *profiler* records
+    the updates of the soil moisture, vegetation and cellular automaton
+    components.
+
+    Returns
+    -------
+    int
+        Number of years simulated.
+    """
+    if seed is not None:
+        np.random.seed(seed)
+    (storms_generator, radiation, pet_tree, pet_shrub, pet_grass,
+     soil_moisture, vegetation, vegca) = initialize(data, grid, grid1,
+                                                    seed=seed)
+    if profiler is not None:
+        profiler.wrap(soil_moisture, 'update')
+        profiler.wrap(vegetation, 'update')
+        profiler.wrap(vegca, 'update')
+
+    (daily_pet, rad_factor, EP30, pet_threshold) = empty_arrays(grid)
+
+    # The lookup tables are cached on disk, keyed by the PET inputs in data
+    create_pet_lookup(radiation, pet_tree, pet_shrub, pet_grass, daily_pet,
+                      rad_factor, EP30, grid, data=data)
+
+    # Represent current time in years
+    current_time = 0 # Start from first day of Jan
+
+    # declaring few variables that will be used in the storm loop
+    time_check = 0. # Buffer to store current_time at previous storm
+    yrs = 0 # Keep track of number of years passed
+    water_stress = 0. # Buffer for Water Stress
+    Tg = 270 # Growing season in days
+
+    # Run storm Loop
+    while yrs < n_years:
+        # Calculate Day of Year (DOY)
+        julian = int((current_time % 1.) * 365.)
+
+        # Generate seasonal storms, drawn a batch at a time
+        # Wet Season - Jul to Sep - NA Monsoon
+        (precip, storm_dt,
+         inter_storm_dt) = storms_generator.next_storm(julian)
+
+        # Spatially distribute PET and its 30-day-mean (analogous to degree
+        # day)
+        grid.at_cell['surface__potential_evapotranspiration_rate'] = (
+            daily_pet[julian])
+        grid.at_cell['surface__potential_evapotranspiration_30day_mean'] = (
+            EP30[julian])
+
+        # Assign spatial rainfall data
+        grid.at_cell['rainfall__daily_depth'] = np.full(grid.number_of_cells,
+                                                        precip)
+
+        # Update soil moisture component
+        current_time = soil_moisture.update(current_time, Tr=storm_dt,
+                                            Tb=inter_storm_dt)
+
+        # Decide whether its growing season or not
+        if julian != 364:
+            if EP30[julian + 1, 0] > EP30[julian, 0]:
+                pet_threshold = 1
+                # 1 corresponds to ETThresholdup (begin growing season)
             else:
-                EP30[i] = np.mean(daily_pet[:i], axis=0)
-        else:
-            EP30[i] = np.mean(daily_pet[i - 30:i], axis=0)
+                pet_threshold = 0
+                # 0 corresponds to ETThresholddown (end growing season)
+
+        # Update vegetation component
+        vegetation.update(PETThreshold_switch=pet_threshold,
+                          Tb=inter_storm_dt, Tr=storm_dt)
+
+        # Update yearly cumulative water stress data
+        water_stress += (grid.at_cell['vegetation__water_stress'] *
+                         inter_storm_dt / 24.)
+
+        # Record the storm and the time elapsed
+        storms.append((precip, storm_dt, inter_storm_dt, current_time))
+
+        # Update spatial PFTs with Cellular Automata rules
+        if (current_time - time_check) >= 1.:
+            if verbose and yrs % 100 == 0:
+                print 'Elapsed time = ', yrs, ' years'
+            veg_type = grid1.at_cell['vegetation__plant_functional_type']
+            if veg_maps is not None:
+                veg_maps.append(veg_type)
+            if cover is not None:
+                cover.append(veg_type)
+            WS_ = water_stress[veg_type]
+            grid1.at_cell['vegetation__cumulative_water_stress'] = WS_ / Tg
+            vegca.update()
+            time_check = current_time
+            water_stress = 0
+            yrs += 1
+
+    veg_type = grid1.at_cell['vegetation__plant_functional_type']
+    if veg_maps is not None:
+        veg_maps.append(veg_type)
+    if cover is not None:
+        cover.append(veg_type)
+    return yrs
 
 
-def save(sim, inter_storm_dt, storm_dt, precip, veg_type, yrs,
-         walltime, time_elapsed):
-    np.save(sim + '_Tb', inter_storm_dt)
-    np.save(sim + '_Tr', storm_dt)
-    np.save(sim + '_P', precip)
-    np.save(sim + '_VegType', veg_type)
+def save(sim, storms, veg_maps, yrs, walltime, cover=None):
+    """Save the records kept in memory, and the run statistics.
+
+    Records written to files as the run went (see :func:`create_records`)
+    are already saved, and are left where they are. The yearly PFT counts of
+    a :class:`~ecohyd_cover.CoverAccumulator`, *cover*, are saved as well.
+    """
+    storms.close()
+    veg_maps.close()
+    if storms.path is None:
+        (precip, storm_dt, inter_storm_dt, time_elapsed) = storms.read().T
+        np.save(sim + '_Tb', inter_storm_dt)
+        np.save(sim + '_Tr', storm_dt)
+        np.save(sim + '_P', precip)
+        np.save(sim + '_CurrentTime', time_elapsed)
+    if veg_maps.path is None:
+        np.save(sim + '_VegType', veg_maps.read())
+    if cover is not None:
+        np.save(sim + '_PFTCounts', cover.counts)
     np.save(sim + '_Years', yrs)
     np.save(sim + '_Time_Consumed_minutes', walltime)
-    np.save(sim + '_CurrentTime', time_elapsed)
 
 
-def plot(sim, grid, veg_type, yrs, yr_step=10):
+def plot(sim, grid, veg_type, yrs, yr_step=10, counts=None):
+    """Plot PFT maps every *yr_step* years, and the cover time series.
+
+    *counts* are the yearly PFT counts of a
+    :class:`~ecohyd_cover.CoverAccumulator`; if not given, they are counted
+    from *veg_type*. Matplotlib is only imported here, so that runs that do
+    not plot never load it.
+    """
+    import matplotlib as mpl
+    import matplotlib.pyplot as plt
+    from landlab.plot import imshow_grid
+
     pic = 0
     years = range(0, yrs)
     cmap = mpl.colors.ListedColormap(
@@ -167,19 +386,9 @@ def plot(sim, grid, veg_type, yrs, yr_step=10):
         plt.yticks(fontsize=14, weight='bold')
         plt.savefig(sim + '_' + filename)
 
-    grass_cov = np.empty(yrs)
-    shrub_cov = np.empty(yrs)
-    tree_cov = np.empty(yrs)
-    grid_size = float(veg_type.shape[1])
-
-    for x in range(0, yrs):
-        grass_cov[x] = (veg_type[x][veg_type[x] == GRASS].size / grid_size) * 100
-        shrub_cov[x] = ((veg_type[x][veg_type[x] == SHRUB].size / grid_size) *
-                        100 + (veg_type[x][veg_type[x] == SHRUBSEEDLING].size /
-                        grid_size) * 100)
-        tree_cov[x] = ((veg_type[x][veg_type[x] == TREE].size / grid_size) *
-                       100 + (veg_type[x][veg_type[x] == TREESEEDLING].size /
-                       grid_size) * 100)
+    if counts is None:
+        counts = pft_counts(veg_type[:yrs])
+    (grass_cov, shrub_cov, tree_cov) = cover_percent(counts[:yrs])
 
     pic += 1
     plt.figure(pic, figsize=(10, 8))
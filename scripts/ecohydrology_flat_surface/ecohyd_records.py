@@ -0,0 +1,103 @@
+"""
+ecohyd_records.py: chunked, append-only records for long ecohydrology runs.
+
+Per-storm records and yearly plant functional type (PFT) maps grow with the
+length of a run, and a long run has hundreds of thousands of storms.
+:class:`ChunkedRecord` collects rows of a fixed width in a small buffer and,
+if it has a file, appends the buffer to that file whenever it fills up, so
+memory use stays fixed however many years are simulated. Without a file it
+keeps every row in memory, growing as needed.
+
+A record on disk is a raw, little-endian binary file of rows, with a JSON
+sidecar (the same name plus ``.json``) giving the number of columns, their
+names and the data type. :func:`read_record` memory-maps it back.
+"""
+import os
+import json
+
+import numpy as np
+
+
+class ChunkedRecord(object):
+    """Rows of a fixed width, written to disk a chunk at a time.
+
+    Parameters
+    ----------
+    n_columns : int
+        Number of values in a row.
+    dtype : str, optional
+        Data type of the values.
+    path : str, optional
+        File to append the rows to. If not given, all rows are kept in
+        memory.
+    chunk_bytes : int, optional
+        Size of the buffer, in bytes; it always holds at least one row.
+    columns : sequence of str, optional
+        Names of the columns, saved in the sidecar.
+    """
+
+    def __init__(self, n_columns, dtype='<f8', path=None,
+                 chunk_bytes=8 * 1024 ** 2, columns=None):
+        self._dtype = np.dtype(dtype)
+        n_rows = max(chunk_bytes // (self._dtype.itemsize * n_columns), 1)
+        self._buffer = np.empty((n_rows, n_columns), dtype=self._dtype)
+        self._n_buffered = 0
+        self._n_written = 0
+        self._path = path
+        if path is not None:
+            with open(path + '.json', 'w') as fp:
+                json.dump({'n_columns': n_columns,
+                           'columns': list(columns or []),
+                           'dtype': self._dtype.str}, fp, indent=2)
+            open(path, 'wb').close()
+
+    @property
+    def path(self):
+        """The file the rows are written to, or None if kept in memory."""
+        return self._path
+
+    @property
+    def number_of_rows(self):
+        """Number of rows appended so far."""
+        return self._n_written + self._n_buffered
+
+    def append(self, row):
+        """Append a row of values."""
+        if self._n_buffered == len(self._buffer):
+            if self._path is not None:
+                self._flush()
+            else:
+                self._buffer = np.concatenate(
+                    (self._buffer, np.empty_like(self._buffer)))
+        self._buffer[self._n_buffered] = row
+        self._n_buffered += 1
+
+    def _flush(self):
+        with open(self._path, 'ab') as fp:
+            self._buffer[:self._n_buffered].tofile(fp)
+        self._n_written += self._n_buffered
+        self._n_buffered = 0
+
+    def close(self):
+        """Write out whatever is still held in memory."""
+        if self._path is not None and self._n_buffered > 0:
+            self._flush()
+
+    def read(self):
+        """All the rows; a read-only memory map if the record has a file."""
+        if self._path is None:
+            return self._buffer[:self._n_buffered]
+        self.close()
+        return read_record(self._path)
+
+
+def read_record(path):
+    """Memory-map a record written by :class:`ChunkedRecord`."""
+    with open(path + '.json', 'r') as fp:
+        meta = json.load(fp)
+    dtype = np.dtype(meta['dtype'])
+    n_columns = meta['n_columns']
+    n_rows = os.path.getsize(path) // (dtype.itemsize * n_columns)
+    if n_rows == 0:
+        return np.empty((0, n_columns), dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r', shape=(n_rows, n_columns))
@@ -0,0 +1,123 @@
+"""
+ecohyd_storms.py: seasonal storms drawn in batches.
+
+The storm loop of run_driver.py used to call ``PrecipitationDistribution
+.update()`` for every storm, for either the wet (monsoon) or the dry season.
+:class:`SeasonalStorms` draws the storms of each season from the same
+distributions, but a batch at a time, as NumPy arrays:
+
+*  storm durations and interstorm durations are exponentially distributed
+   around their means, and
+*  storm depths are gamma distributed, with a shape parameter of the storm
+   duration over the mean storm duration and a scale parameter of the mean
+   storm depth, so that longer storms are deeper.
+
+A batch holds about a year's worth of storms for its season, so the storm
+loop only pays for a handful of array draws per simulated year. Each season
+has its own random stream, seeded from a single seed, so a run is
+reproducible and the storms of one season do not depend on how many storms
+the other season used.
+"""
+import numpy as np
+
+
+class StormStream(object):
+    """Storms of one season, drawn in batches.
+
+    Parameters
+    ----------
+    mean_storm_duration : float
+        Mean storm duration (hours).
+    mean_interstorm_duration : float
+        Mean interstorm duration (hours).
+    mean_storm_depth : float
+        Mean storm depth (mm).
+    batch_size : int
+        Number of storms drawn at a time.
+    random_state : numpy.random.RandomState
+        The stream's source of random numbers.
+    """
+
+    def __init__(self, mean_storm_duration, mean_interstorm_duration,
+                 mean_storm_depth, batch_size, random_state):
+        self.mean_storm_duration = mean_storm_duration
+        self.mean_interstorm_duration = mean_interstorm_duration
+        self.mean_storm_depth = mean_storm_depth
+        self._batch_size = max(int(batch_size), 1)
+        self._random = random_state
+        self._next = self._batch_size
+        self._storms = None
+
+    def draw(self, n_storms):
+        """Draw *n_storms* storms.
+
+        Returns
+        -------
+        ndarray
+            Array of shape (n_storms, 3): the depth, duration and interstorm
+            duration of every storm.
+        """
+        storms = np.empty((n_storms, 3))
+        storms[:, 1] = self._random.exponential(self.mean_storm_duration,
+                                                n_storms)
+        storms[:, 2] = self._random.exponential(self.mean_interstorm_duration,
+                                                n_storms)
+        storms[:, 0] = self._random.gamma(
+            storms[:, 1] / self.mean_storm_duration, self.mean_storm_depth)
+        return storms
+
+    def next_storm(self):
+        """The next storm, as (depth, duration, interstorm duration)."""
+        if self._next == self._batch_size:
+            self._storms = self.draw(self._batch_size).tolist()
+            self._next = 0
+        storm = self._storms[self._next]
+        self._next += 1
+        return storm
+
+
+class SeasonalStorms(object):
+    """Wet and dry season storms, from the storm parameters of a run.
+
+    Parameters
+    ----------
+    data : dict
+        Run inputs, with the mean storm parameters of both seasons and the
+        days of the year the monsoon starts and ends.
+    seed : int, optional
+        Seed for the random streams.
+    """
+
+    def __init__(self, data, seed=None):
+        self._start = data['doy__start_of_monsoon']
+        self._end = data['doy__end_of_monsoon']
+        fraction_wet = (self._end - self._start) / 365.
+        if seed is None:
+            (random_wet, random_dry) = (np.random.RandomState(),
+                                        np.random.RandomState())
+        else:
+            (random_wet, random_dry) = (np.random.RandomState([seed, 0]),
+                                        np.random.RandomState([seed, 1]))
+
+        self.wet = StormStream(
+            data['mean_storm_wet'], data['mean_interstorm_wet'],
+            data['mean_storm_depth_wet'],
+            8760 * fraction_wet / (data['mean_interstorm_wet'] +
+                                   data['mean_storm_wet']),
+            random_wet)
+        self.dry = StormStream(
+            data['mean_storm_dry'], data['mean_interstorm_dry'],
+            data['mean_storm_depth_dry'],
+            8760 * (1 - fraction_wet) / (data['mean_interstorm_dry'] +
+                                         data['mean_storm_dry']),
+            random_dry)
+
+    def is_wet_season(self, julian):
+        """Whether day of the year *julian* is in the monsoon."""
+        return self._start <= julian <= self._end
+
+    def next_storm(self, julian):
+        """Next storm on day *julian*: (depth, duration, interstorm)."""
+        if self.is_wet_season(julian):
+            return self.wet.next_storm()
+        return self.dry.next_storm()
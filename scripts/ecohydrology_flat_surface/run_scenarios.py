@@ -0,0 +1,198 @@
+"""
+run_scenarios.py: climate scenarios for the vegetation cellular automaton.
+
+Runs the model of run_driver.py once for every member of a scenario file,
+on a pool of worker processes, and collects the yearly cover fraction of
+every plant functional type (PFT) of every member into one dataset.
+
+A scenario file is a YAML file naming the base inputs and, for every member,
+the inputs it changes (see scenarios_example.yaml)::
+
+    base: inputs_vegetation_ca.yaml
+    n_years: 500
+    seed: 0
+    members:
+      control: {}
+      early_monsoon:
+        doy__start_of_monsoon: 160
+        doy__end_of_monsoon: 251
+
+Every member has its own random streams, seeded from the scenario seed and
+the member's name, so a member draws the same storms and PFT changes
+however many members there are and whichever worker runs it.
+
+Each member writes its records to ``<output>/<member>/`` and, once it is
+done, a ``member.json`` with its inputs. Running the same scenario file
+again skips the members that are done, so an interrupted study resumes
+where it stopped. The dataset, ``<output>/scenarios.npz``, holds
+
+*  ``members``, the member names, in alphabetical order,
+*  ``cover``, the fraction of cells of each PFT at the start of every year
+   (and at the end of the run), of shape (members, years + 1, PFTs), and
+*  ``pft``, the PFT names, in the order of the last axis of ``cover``.
+
+Example::
+
+    $ python run_scenarios.py scenarios_example.yaml --n-procs 8
+"""
+from __future__ import print_function
+
+import os
+import json
+import time
+import hashlib
+import multiprocessing
+
+import numpy as np
+
+from landlab import RasterModelGrid, load_params
+from ecohyd_functions_flat import create_records, run_simulation
+from ecohyd_cover import PFT_NAMES, CoverAccumulator
+
+
+def member_seed(seed, name):
+    """Seed of the member called *name* of a scenario seeded with *seed*."""
+    sha = hashlib.sha1(('%s:%s' % (seed, name)).encode('utf-8'))
+    return int(sha.hexdigest()[:8], 16)
+
+
+def read_scenarios(filename):
+    """Read a scenario file, with the base inputs of every member applied.
+
+    Returns
+    -------
+    dict
+        The scenario, with ``members`` mapping every member name to its
+        complete inputs.
+    """
+    scenario = load_params(filename)
+    base_path = os.path.join(os.path.dirname(os.path.abspath(filename)),
+                             scenario['base'])
+    base = load_params(base_path)
+
+    members = {}
+    for (name, overrides) in (scenario.get('members') or {}).items():
+        overrides = overrides or {}
+        unknown = sorted(set(overrides) - set(base))
+        if unknown:
+            raise KeyError('%s: unknown inputs %s' %
+                           (name, ', '.join(unknown)))
+        data = dict(base)
+        data.update(overrides)
+        members[str(name)] = {'data': data, 'overrides': overrides}
+
+    return {'members': members,
+            'n_years': int(scenario.get('n_years', 500)),
+            'seed': scenario.get('seed', 0),
+            'grid_shape': tuple(scenario.get('grid_shape', (100, 100)))}
+
+
+def _is_done(member_dir, meta):
+    try:
+        with open(os.path.join(member_dir, 'member.json'), 'r') as fp:
+            done = json.load(fp)
+    except (IOError, OSError, ValueError):
+        return False
+    return all(done.get(key) == value for (key, value) in meta.items())
+
+
+def _run_member(args):
+    """Run one member, unless it is done already."""
+    (name, data, meta, member_dir) = args
+    if _is_done(member_dir, meta):
+        return (name, False)
+    if not os.path.isdir(member_dir):
+        os.makedirs(member_dir)
+
+    (n_rows, n_cols) = meta['grid_shape']
+    grid1 = RasterModelGrid((n_rows, n_cols), spacing=(5., 5.))
+    grid = RasterModelGrid((5, 4), spacing=(5., 5.))
+
+    (storms, veg_maps) = create_records('veg', grid1, output_dir=member_dir)
+    cover = CoverAccumulator()
+    start_time = time.time()
+    yrs = run_simulation(data, grid, grid1, meta['n_years'], storms,
+                         veg_maps, seed=meta['seed'], verbose=False,
+                         cover=cover)
+    storms.close()
+    veg_maps.close()
+    np.save(os.path.join(member_dir, 'cover.npy'), cover.fractions())
+
+    done = dict(meta)
+    done.update({'years': yrs, 'walltime': time.time() - start_time})
+    with open(os.path.join(member_dir, 'member.json.tmp'), 'w') as fp:
+        json.dump(done, fp, indent=2)
+    os.rename(os.path.join(member_dir, 'member.json.tmp'),
+              os.path.join(member_dir, 'member.json'))
+    return (name, True)
+
+
+def run_scenarios(filename, output_dir='scenarios', n_procs=1):
+    """Run every member of a scenario file that is not done already.
+
+    Parameters
+    ----------
+    filename : str
+        The scenario file.
+    output_dir : str, optional
+        Where the members write their records, and the dataset is saved.
+    n_procs : int, optional
+        Number of worker processes.
+
+    Returns
+    -------
+    str
+        Path to the dataset.
+    """
+    scenario = read_scenarios(filename)
+    output_dir = os.path.abspath(output_dir)
+    if not os.path.isdir(output_dir):
+        os.makedirs(output_dir)
+
+    names = sorted(scenario['members'])
+    jobs = []
+    for name in names:
+        member = scenario['members'][name]
+        meta = {'overrides': member['overrides'],
+                'n_years': scenario['n_years'],
+                'seed': member_seed(scenario['seed'], name),
+                'grid_shape': list(scenario['grid_shape'])}
+        jobs.append((name, member['data'], meta,
+                     os.path.join(output_dir, name)))
+
+    pool = multiprocessing.Pool(n_procs)
+    try:
+        for (name, ran) in pool.imap_unordered(_run_member, jobs):
+            print('Completed member' if ran else 'Already done:', name)
+    finally:
+        pool.close()
+        pool.join()
+
+    cover = np.array([np.load(os.path.join(output_dir, name, 'cover.npy'))
+                      for name in names])
+    path = os.path.join(output_dir, 'scenarios.npz')
+    np.savez(path, members=np.array(names), cover=cover,
+             pft=np.array(PFT_NAMES))
+    return path
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Run climate scenarios of the vegetation CA model')
+    parser.add_argument('scenarios', help='Scenario file (YAML)')
+    parser.add_argument('--output', default='scenarios',
+                        help='Directory for the members and the dataset')
+    parser.add_argument('--n-procs', type=int, default=1,
+                        help='Number of processors to use')
+
+    args = parser.parse_args()
+
+    path = run_scenarios(args.scenarios, output_dir=args.output,
+                         n_procs=args.n_procs)
+    print('Wrote', path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+VegCAKernel against landlab's VegCA: with the same random state, both must
+give the same plant functional types and ages, year after year.
+"""
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir))
+
+from ecohyd_vegca import (VegCAKernel, looped_neighbor_table, _FIRST_RING,
+                          _SECOND_RING)
+
+
+def test_looped_neighbor_table():
+    (n_rows, n_cols) = (5, 7)
+    for offsets in (_FIRST_RING, _SECOND_RING):
+        table = looped_neighbor_table((n_rows, n_cols), offsets)
+        for cell in range(n_rows * n_cols):
+            (row, col) = divmod(cell, n_cols)
+            expected = [((row + d_row) % n_rows) * n_cols +
+                        (col + d_col) % n_cols for (d_row, d_col) in offsets]
+            assert list(table[:, cell]) == expected
+
+
+def _grid(pft, shape):
+    from landlab import RasterModelGrid
+
+    grid = RasterModelGrid((shape[0] + 2, shape[1] + 2), spacing=(5., 5.))
+    grid.at_cell['vegetation__plant_functional_type'] = pft.copy()
+    grid.at_cell['vegetation__cumulative_water_stress'] = np.zeros(
+        grid.number_of_cells)
+    return grid
+
+
+def _run(component, pft, water_stress, shape, seed):
+    """PFTs and ages of every year of a run."""
+    grid = _grid(pft, shape)
+    np.random.seed(seed)
+    vegca = component(grid)
+    (pfts, ages) = ([], [])
+    for cum_ws in water_stress:
+        grid.at_cell['vegetation__cumulative_water_stress'][:] = cum_ws
+        vegca.update()
+        pfts.append(np.array(grid.at_cell[
+            'vegetation__plant_functional_type']))
+        ages.append(np.array(grid.at_cell['plant__age']))
+    return (np.array(pfts), np.array(ages))
+
+
+@pytest.mark.parametrize('seed', [0, 1])
+def test_matches_vegca(seed):
+    pytest.importorskip('landlab')
+    from landlab.components import VegCA
+
+    shape = (30, 40)
+    rng = np.random.RandomState(seed)
+    pft = rng.randint(0, 6, shape[0] * shape[1])
+    water_stress = rng.rand(60, shape[0] * shape[1])
+
+    (pfts, ages) = _run(VegCA, pft, water_stress, shape, seed)
+    (kernel_pfts, kernel_ages) = _run(VegCAKernel, pft, water_stress, shape,
+                                      seed)
+
+    assert len(np.unique(pfts[-1])) > 1
+    np.testing.assert_array_equal(kernel_pfts, pfts)
+    np.testing.assert_array_equal(kernel_ages, ages)
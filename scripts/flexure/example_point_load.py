@@ -1,5 +1,16 @@
 #! /usr/bin/env python
 
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir, os.pardir))
+from driver_tools.run_config import RunConfig
+
+# Read the run configuration (headless or not, see driver_tools/run_config.py)
+# before importing landlab
+config = RunConfig.from_environment()
+
 from landlab.components.flexure import FlexureComponent
 from landlab import RasterModelGrid
 
@@ -25,8 +36,12 @@ def main():
 
     flex.update()
 
-    grid.imshow('node', 'lithosphere__elevation', symmetric_cbar=True,
-                show=True) 
+    if config.headless:
+        config.dump('example_point_load', lithosphere__elevation=grid.at_node[
+            'lithosphere__elevation'].reshape(grid.shape))
+    else:
+        grid.imshow('node', 'lithosphere__elevation', symmetric_cbar=True,
+                    show=True)
 
 
 if __name__ == '__main__':
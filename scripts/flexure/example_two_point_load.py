@@ -2,9 +2,19 @@
 
 import numpy as np
 
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir, os.pardir))
+from driver_tools.run_config import RunConfig
+
+# Read the run configuration (headless or not, see driver_tools/run_config.py)
+# before importing landlab
+config = RunConfig.from_environment()
+
 from landlab.components.flexure import FlexureComponent
 from landlab import RasterModelGrid
-from landlab.plot import imshow_field
 
 
 SHAPE = (100, 100)
@@ -47,8 +57,13 @@ def main():
 
     flex.update()
 
-    grid.imshow('node', 'lithosphere__elevation', symmetric_cbar=False,
-                show=True) 
+    if config.headless:
+        config.dump('example_two_point_load',
+                    lithosphere__elevation=grid.at_node[
+                        'lithosphere__elevation'].reshape(grid.shape))
+    else:
+        grid.imshow('node', 'lithosphere__elevation', symmetric_cbar=False,
+                    show=True)
 
 
 if __name__ == '__main__':